@@ -0,0 +1,123 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from .database import Database, AsyncDatabase
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
+
+
+class ThreadPoolDatabase(AsyncDatabase):
+    """ An ``AsyncDatabase`` that runs the calls to a synchronous
+    ``Database`` in a thread pool, so that they do not block the event loop.
+
+    The calls run one at a time, in the order they are made, in a single
+    worker thread by default (as ``SQLiteDB`` requires). Transactions are
+    exclusive: while a task has a transaction open, the calls of other
+    tasks wait until it is committed or rolled back, so that they are
+    never part of it.
+
+    Args:
+        db (Database): The synchronous database.
+        executor (concurrent.futures.Executor, optional): The executor in
+            which calls run, which must run one call at a time. Defaults to
+            None, a thread pool with a single thread, shut down by
+            ``close``.
+    """
+
+    def __init__(self, db, executor=None):
+        assert isinstance(db, Database)
+        self.db = db
+        self.executor = executor
+        self.own_executor = executor is None
+
+        # The lock held by the task with an open transaction (made on
+        # first use in the event loop), and that task.
+        self.lock = None
+        self.owner = None
+
+    def close(self):
+        ''' Shuts down the thread pool made by this database, if any. The
+            synchronous database is not closed. '''
+        if self.own_executor and self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def _call(self, fn, *args):
+        ''' Runs a call to the synchronous database. '''
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args))
+
+    async def _run(self, fn, *args):
+        ''' Runs a call to the synchronous database, once no other task has
+            a transaction open. '''
+        owner = self.owner
+        if owner is not None and owner is not asyncio.current_task():
+            # Wait for the transaction to end. The call is made before
+            # yielding again, so it runs before any later transaction.
+            async with self._get_lock():
+                pass
+        return await self._call(fn, *args)
+
+    def _get_lock(self):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        return self.lock
+
+    @asynccontextmanager
+    async def transaction(self):
+        task = asyncio.current_task()
+        if self.owner is task:
+            # Only the outermost transaction commits.
+            yield self
+            return
+
+        async with self._get_lock():
+            self.owner = task
+            try:
+                await self._call(self.db.begin)
+                try:
+                    yield self
+                except BaseException:
+                    await self._call(self.db.rollback)
+                    raise
+                await self._call(self.db.commit)
+            finally:
+                self.owner = None
+
+    async def get(self, prefix, key):
+        return await self._run(self.db.get, prefix, key)
+
+    async def try_get(self, prefix, key):
+        return await self._run(self.db.try_get, prefix, key)
+
+    async def put(self, prefix, key, val):
+        return await self._run(self.db.put, prefix, key, val)
+
+    async def delete(self, prefix, key):
+        return await self._run(self.db.delete, prefix, key)
+
+    async def isin(self, prefix, key):
+        return await self._run(self.db.isin, prefix, key)
+
+    async def getkeys(self, prefix):
+        return await self._run(self.db.getkeys, prefix)
+
+    async def count(self, prefix):
+        return await self._run(self.db.count, prefix)
+
+    async def get_many(self, prefix, keys):
+        return await self._run(self.db.get_many, prefix, list(keys))
+
+    async def put_many(self, prefix, items):
+        return await self._run(self.db.put_many, prefix, list(items))
+
+    async def delete_many(self, prefix, keys):
+        return await self._run(self.db.delete_many, prefix, list(keys))
+
+    async def contains_many(self, prefix, keys):
+        return await self._run(self.db.contains_many, prefix, list(keys))
@@ -4,12 +4,18 @@
 from .business import BusinessNotAuthorized
 from .libra_address import LibraAddress
 from .utils import get_unique_string
+from .errors import OffChainErrorCode, OffChainProtocolError
+from .flow_control import InFlightWindow
+from .retransmit import RetransmitScheduler
+from .protocol_messages import CommandRequestObject
 
 import aiohttp, os
 from aiohttp import web
 from aiohttp.client_exceptions import ClientError
+from collections import deque, namedtuple
 import asyncio
 import logging
+import time
 
 
 logger = logging.getLogger(name='libra_off_chain_api.asyncnet')
@@ -17,11 +23,83 @@ logger = logging.getLogger(name='libra_off_chain_api.asyncnet')
 
 X_REQUEST_ID_KEY = "X-REQUEST-ID"
 
+# The response header with which a VASP advertises its batch end point.
+X_BATCH_KEY = "X-OFFCHAIN-BATCH"
+
+# The default max size in bytes of the body of a request or response: 1 MiB,
+# as the default `client_max_size` of aiohttp applications.
+DEFAULT_MAX_BODY_SIZE = 1024 * 1024
+
 
 class NetworkException(Exception):
     pass
 
 
+""" The configuration of the HTTP client connection pool to each peer VASP.
+All times are in seconds, and None disables the corresponding limit. """
+PoolConfig = namedtuple('PoolConfig', [
+    'limit_per_peer',     # Max number of connections open to each peer
+    'keepalive_timeout',  # Time idle connections are kept open
+    'dns_ttl',            # Time DNS lookups are cached
+    'connect_timeout',    # Time to establish a connection
+    'read_timeout',       # Time to wait for data from the peer
+    'total_timeout',      # Time for a whole request and response
+], defaults=[16, 30.0, 300, 5.0, 30.0, None])
+
+
+""" The statistics of the connection pool to a peer VASP. """
+PoolStats = namedtuple('PoolStats', [
+    'open',     # Number of open connections (used or idle)
+    'idle',     # Number of open connections available for a new request
+    'waiting',  # Number of requests waiting for a connection or window slot
+])
+
+
+""" The configuration of the batching of requests to each peer VASP. """
+BatchConfig = namedtuple('BatchConfig', [
+    'linger',    # Time in seconds a request waits for others to batch with
+    'max_size',  # Max number of requests in a batch
+], defaults=[0.002, 32])
+
+
+""" The bytes exchanged with a peer VASP. """
+ByteStats = namedtuple('ByteStats', [
+    'requests',  # Number of requests sent to or received from the peer
+    'received',  # Number of body bytes received from the peer
+    'sent',      # Number of body bytes sent to the peer
+])
+
+
+async def read_body(stream, content_length, max_size):
+    """ Reads the body of an HTTP request or response as bytes, and
+    rejects it as soon as it is known to exceed the max size.
+
+    Args:
+        stream (aiohttp.StreamReader): The stream of the body.
+        content_length (int): The Content-Length of the body, or None.
+        max_size (int): The max size of the body in bytes.
+
+    Raises:
+        aiohttp.web.HTTPRequestEntityTooLarge: If the body is too large.
+
+    Returns:
+        bytes: The body.
+    """
+    if content_length is not None and content_length > max_size:
+        raise web.HTTPRequestEntityTooLarge(
+            max_size=max_size, actual_size=content_length)
+
+    chunks = []
+    size = 0
+    async for chunk in stream.iter_any():
+        size += len(chunk)
+        if size > max_size:
+            raise web.HTTPRequestEntityTooLarge(
+                max_size=max_size, actual_size=size)
+        chunks.append(chunk)
+    return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+
 def get_headers(request_or_response):
     """Obtain request headers (case-insensitive)
     Args:
@@ -34,19 +112,192 @@ def get_headers(request_or_response):
     return {k.upper(): v for k, v in request_or_response.headers.items()}
 
 
+class PoolTracker:
+    """ Tracks the connection pool of the client session to a peer VASP,
+    through the public tracing hooks of aiohttp.
+
+    A request uses the connection it gets from the pool until its response
+    is read, and then returns it to the pool, where it is idle until it is
+    reused, unless the request failed or the peer closes it. As aiohttp,
+    the tracker reuses the idle connections in the order they were
+    returned, and drops them all when a request makes a new connection
+    (which it only does when none could be reused), or once they are idle
+    for longer than the keepalive timeout. The connections that the peer
+    closes while idle are counted until then.
+
+    Args:
+        keepalive_timeout (float): The time in seconds idle connections are
+            kept open, or None if they are kept open until closed.
+        clock (callable, optional): The monotonic clock, in seconds.
+            Defaults to ``time.monotonic``.
+    """
+
+    def __init__(self, keepalive_timeout, clock=time.monotonic):
+        self.keepalive_timeout = keepalive_timeout
+        self.clock = clock
+        self.in_use = 0
+        self.waiting = 0
+
+        # The times at which the idle connections were returned, oldest first.
+        self.idle = deque()
+
+        self.trace_config = aiohttp.TraceConfig()
+        hooks = self.trace_config
+        hooks.on_connection_queued_start.append(self.on_queued_start)
+        hooks.on_connection_queued_end.append(self.on_queued_end)
+        hooks.on_connection_create_start.append(self.on_create_start)
+        hooks.on_connection_create_end.append(self.on_acquired)
+        hooks.on_connection_reuseconn.append(self.on_reuse)
+        hooks.on_request_end.append(self.on_request_end)
+        hooks.on_request_exception.append(self.on_request_exception)
+
+    def _expire(self):
+        if self.keepalive_timeout is None:
+            return
+        deadline = self.clock() - self.keepalive_timeout
+        while self.idle and self.idle[0] < deadline:
+            self.idle.popleft()
+
+    async def on_queued_start(self, session, ctx, params):
+        ctx.queued = True
+        self.waiting += 1
+
+    async def on_queued_end(self, session, ctx, params):
+        if getattr(ctx, 'queued', False):
+            ctx.queued = False
+            self.waiting -= 1
+
+    async def on_create_start(self, session, ctx, params):
+        # No idle connection could be reused.
+        self.idle.clear()
+
+    async def on_reuse(self, session, ctx, params):
+        self._expire()
+        if self.idle:
+            self.idle.popleft()
+        await self.on_acquired(session, ctx, params)
+
+    async def on_acquired(self, session, ctx, params):
+        ctx.acquired = True
+        self.in_use += 1
+
+    async def on_request_end(self, session, ctx, params):
+        if not getattr(ctx, 'acquired', False):
+            return
+        ctx.acquired = False
+        response = params.response
+        reusable = response.headers.get('Connection', '').lower() != 'close'
+        connection = response.connection
+        if connection is None:
+            # The response was read at once, and the connection returned.
+            self._release(reusable)
+        else:
+            connection.add_callback(lambda: self._release(reusable))
+
+    async def on_request_exception(self, session, ctx, params):
+        # A request whose wait is interrupted also ends here.
+        await self.on_queued_end(session, ctx, params)
+        if getattr(ctx, 'acquired', False):
+            ctx.acquired = False
+            self._release(False)
+
+    def _release(self, reusable):
+        self.in_use -= 1
+        if reusable:
+            self.idle.append(self.clock())
+
+    def stats(self, window_waiting=0):
+        ''' Returns the statistics of the pool.
+
+        Args:
+            window_waiting (int, optional): The number of requests waiting
+                for a slot in the window of requests in flight to the peer,
+                counted as waiting. Defaults to 0.
+
+        Returns:
+            PoolStats: The statistics.
+        '''
+        self._expire()
+        idle = len(self.idle)
+        return PoolStats(
+            self.in_use + idle, idle, self.waiting + window_waiting)
+
+
 class Aionet:
     """A network client and server using aiohttp. Initialize
     the network system with a OffChainVASP instance.
 
+    Requests to each peer VASP are sent through a separate HTTP client
+    session, whose pool of persistent connections is set by a PoolConfig.
+    The number of requests in flight to each peer is bounded by an
+    InFlightWindow, which adapts to the congestion of the peer: requests
+    beyond the window wait for a slot before being sent.
+
+    With a BatchConfig, the VASP also serves a batch end point, and sends
+    the requests it sequences for a peer that advertises its own batch end
+    point (with the X_BATCH_KEY response header) in batches: a request
+    waits up to `linger` seconds for others to the same peer, and up to
+    `max_size` requests are then signed, sent and verified together, in
+    one slot of the window.
+
+    Requests without a response are retransmitted by a RetransmitScheduler,
+    started with the watchdog, when they are due.
+
+    The bodies of requests and responses are read as they stream in, up to
+    `max_body_size` bytes: larger requests are rejected with 413 Payload
+    Too Large before they are read in full. The bytes read are verified
+    and parsed as they are, and counted for each peer (see ByteStats).
+
     Args:
         vasp (OffChainVASP): The  OffChainVASP instance.
+        pool_config (PoolConfig, optional): The configuration of the
+            connection pool to each peer. Defaults to PoolConfig().
+        window_config (WindowConfig, optional): The configuration of the
+            window of requests in flight to each peer. Defaults to
+            WindowConfig().
+        batch_config (BatchConfig, optional): The configuration of the
+            batching of requests. Defaults to None, no batching.
+        retransmit_config (RetransmitConfig, optional): The configuration
+            of the retransmission of requests. Defaults to
+            RetransmitConfig().
+        max_body_size (int, optional): The max size in bytes of the body of
+            a request or response. Defaults to DEFAULT_MAX_BODY_SIZE.
     """
 
-    def __init__(self, vasp):
+    def __init__(self, vasp, pool_config=None, window_config=None,
+                 batch_config=None, retransmit_config=None,
+                 max_body_size=DEFAULT_MAX_BODY_SIZE):
         self.vasp = vasp
-
-        # For the moment hold one session per VASP.
-        self.session = None
+        self.max_body_size = max_body_size
+
+        # Count the bytes exchanged with each peer VASP.
+        # Map: peer address str -> [requests, received, sent]
+        self.byte_counters = {}
+
+        # Hold one client session per peer VASP, and track its pool.
+        # Map: peer address str -> aiohttp.ClientSession
+        self.sessions = {}
+        # Map: peer address str -> PoolTracker
+        self.pool_trackers = {}
+        self.pool_config = pool_config if pool_config else PoolConfig()
+
+        # Hold one window of requests in flight per peer VASP.
+        # Map: peer address str -> InFlightWindow
+        self.windows = {}
+        self.window_config = window_config
+
+        # The batching of requests, and the peers with a batch end point.
+        self.batch_config = batch_config
+        self.batch_peers = set()
+
+        # The requests waiting to be sent in a batch, and the timers to
+        # send them. Map: peer address str -> list of (request, future)
+        self.batches = {}
+        self.batch_timers = {}
+
+        # The retransmission of requests without a response.
+        self.retransmit = RetransmitScheduler(
+            self.vasp, self.send_request, retransmit_config)
         self.app = web.Application()
 
         # Register routes.
@@ -54,23 +305,41 @@ class Aionet:
         self.app.add_routes([web.post(route, self.handle_request)])
         logger.debug(f'Register route {route}')
 
+        if self.batch_config is not None:
+            route = self.get_url('/', '{other_addr}', batch=True)
+            self.app.add_routes([web.post(route, self.handle_batch_request)])
+            logger.debug(f'Register route {route}')
+
         # The watchdog process variables.
         self.watchdog_period = 10.0  # seconds
         self.watchdog_task_obj = None  # Store the task here to cancel.
 
     async def close(self):
-        ''' Close the open Http client session and the network object. '''
-        if self.session is not None:
-            session = self.session
-            self.session = None
+        ''' Close the open Http client sessions and the network object. '''
+        sessions = list(self.sessions.values())
+        self.sessions = {}
+        self.pool_trackers = {}
+        for session in sessions:
             await session.close()
 
+        for timer in self.batch_timers.values():
+            timer.cancel()
+        self.batch_timers = {}
+        batches = list(self.batches.values())
+        self.batches = {}
+        for batch in batches:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(NetworkException('Network closed'))
+
         if self.watchdog_task_obj is not None:
             self.watchdog_task_obj.cancel()
+        await self.retransmit.close()
 
     def schedule_watchdog(self, loop, period=10.0):
-        """ Creates and schedues the watchdog periodic process.
-        It logs basic statistics for all channels and retransmits.
+        """ Creates and schedues the watchdog periodic process, which
+        logs basic statistics for all channels, and starts retransmitting
+        the requests without a response.
 
         Args:
             loop (asyncio.AbstractEventLoopPolicy): The event loop.
@@ -79,9 +348,10 @@ class Aionet:
         """
         self.watchdog_period = period
         self.watchdog_task_obj = loop.create_task(self.watchdog_task())
+        self.retransmit.start(loop)
 
     async def watchdog_task(self):
-        ''' Provides a priodic debug view of pending requests and replies. '''
+        ''' Provides a priodic view of pending requests and replies. '''
         logger.info('Start Network Watchdog.')
         try:
             while True:
@@ -89,32 +359,15 @@ class Aionet:
                     channel = self.vasp.channel_store[k]
 
                     role = ['Client', 'Server'][channel.is_server()]
-                    waiting = channel.is_server() \
-                        and channel.would_retransmit()
                     me = channel.get_my_address()
                     other = channel.get_other_address()
-
-                    # Retransmit a few of the requests here.
-                    messages = await channel.package_retransmit(number=100)
-                    for message in messages:
-                        logger.info(
-                            f'Attempt to re-transmit messages {message}.'
-                        )
-                        try:
-                            await self.send_request(other, message.content)
-                        except NetworkException as e:
-                            logger.debug(
-                                f'Attempt to re-transmit message {message} '
-                                f'failed with error: {str(e)}'
-                            )
-
-                    len_my = len(channel.my_pending_requests)
                     logger.info(
-                        f'''
-                        Channel: {me.as_str()} [{role}] <-> {other.as_str()}
-                        Queues: my: {len_my} (Wait: {waiting})
-                        Retransmit: {channel.would_retransmit()}'''
+                        f'Channel: {me.as_str()} [{role}] <-> {other.as_str()} '
+                        f'pending={channel.pending_retransmit_number()} '
+                        f'{self.get_window(other).stats()} '
+                        f'{self.get_byte_stats(other)}'
                     )
+                logger.info(f'{self.retransmit.stats()}')
                 await asyncio.sleep(self.watchdog_period)
         except asyncio.CancelledError:
             pass
@@ -123,7 +376,104 @@ class Aionet:
         finally:
             logger.info('Stop Network Watchdog')
 
-    def get_url(self, base_url, other_addr_str, other_is_server=False):
+    def get_session(self, other_addr):
+        ''' Returns the HTTP client session used to send requests to
+            the other VASP, making it on first use.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+
+        Returns:
+            aiohttp.ClientSession: The client session.
+        '''
+        other_addr_str = other_addr.as_str()
+        session = self.sessions.get(other_addr_str)
+        if session is None:
+            config = self.pool_config
+            connector = aiohttp.TCPConnector(
+                limit=config.limit_per_peer or 0,
+                keepalive_timeout=config.keepalive_timeout,
+                use_dns_cache=config.dns_ttl != 0,
+                ttl_dns_cache=config.dns_ttl,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=config.total_timeout,
+                sock_connect=config.connect_timeout,
+                sock_read=config.read_timeout,
+            )
+            tracker = PoolTracker(config.keepalive_timeout)
+            session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout,
+                trace_configs=[tracker.trace_config])
+            self.sessions[other_addr_str] = session
+            self.pool_trackers[other_addr_str] = tracker
+            logger.debug(f'New client session for {other_addr_str}')
+        return session
+
+    def get_pool_stats(self, other_addr):
+        ''' Returns the statistics of the connection pool to a VASP.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+
+        Returns:
+            PoolStats: The statistics, all zero if no session was made.
+            The requests waiting for a slot in the window of requests in
+            flight to the VASP are counted as waiting.
+        '''
+        other_addr_str = other_addr.as_str()
+        session = self.sessions.get(other_addr_str)
+        if session is None or session.closed:
+            return PoolStats(0, 0, 0)
+
+        window = self.windows.get(other_addr_str)
+        window_waiting = window.stats().waiting if window is not None else 0
+        return self.pool_trackers[other_addr_str].stats(window_waiting)
+
+    def get_window(self, other_addr):
+        ''' Returns the window of requests in flight to the other VASP.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+
+        Returns:
+            InFlightWindow: The window.
+        '''
+        other_addr_str = other_addr.as_str()
+        window = self.windows.get(other_addr_str)
+        if window is None:
+            window = InFlightWindow(self.window_config)
+            self.windows[other_addr_str] = window
+        return window
+
+    def get_byte_stats(self, other_addr):
+        ''' Returns the bytes exchanged with a VASP.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+
+        Returns:
+            ByteStats: The statistics, all zero if nothing was exchanged.
+        '''
+        counters = self.byte_counters.get(other_addr.as_str())
+        if counters is None:
+            return ByteStats(0, 0, 0)
+        return ByteStats(*counters)
+
+    def _count_bytes(self, other_addr, received, sent):
+        other_addr_str = other_addr.as_str()
+        counters = self.byte_counters.get(other_addr_str)
+        if counters is None:
+            counters = self.byte_counters[other_addr_str] = [0, 0, 0]
+        counters[0] += 1
+        counters[1] += received
+        counters[2] += sent
+        logger.debug(
+            f'Exchanged with {other_addr_str}: '
+            f'{received} bytes received, {sent} bytes sent')
+
+    def get_url(self, base_url, other_addr_str, other_is_server=False,
+                batch=False):
         """Composes the URL for the Off-chain API VASP end point.
 
         Args:
@@ -131,6 +481,8 @@ class Aionet:
             other_addr_str (str): The address of the other VASP as a string.
             other_is_server (bool, optional): Whether the other VASP is the
                 server. Defaults to False.
+            batch (bool, optional): Whether to compose the URL of the
+                batch end point. Defaults to False.
 
         Returns:
             str: The complete URL for the Off-chain API VASP end point
@@ -141,26 +493,27 @@ class Aionet:
         else:
             server = self.vasp.get_vasp_address().as_str()
             client = other_addr_str
-        url = f'v1/{server}/{client}/command'
+        end_point = 'batch' if batch else 'command'
+        url = f'v1/{server}/{client}/{end_point}'
         full_url = '/'.join([base_url.rstrip('/'), url])
         return full_url
 
 
-    async def handle_request(self, request):
-        """ Main Http server handler for incomming OffChainAPI requests.
+    def batching_to(self, other_addr):
+        ''' Returns whether requests to the other VASP are sent in batches.
 
         Args:
-            request (aiohttp.web.Request): The request from the other VASP.
-
-        Raises:
-            aiohttp.web.HTTPUnauthorized: An exception for 401 Unauthorized.
-            aiohttp.web.HTTPForbidden: An exception for 403 Forbidden.
-            aiohttp.web.HTTPBadRequest: An exception for 400 Bad Request.
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
 
         Returns:
-            aiohttp.web.Response: A JWS signed response.
-        """
+            bool: True if both VASPs batch requests, otherwise False.
+        '''
+        return self.batch_config is not None and \
+            other_addr.as_str() in self.batch_peers
 
+    async def _get_request_channel(self, request):
+        ''' Checks the headers of a request from another VASP, and returns
+            its address, channel and the response headers. '''
         other_addr = LibraAddress.from_encoded_str(request.match_info['other_addr'])
         logger.debug(f'Request Received from {other_addr.as_str()}')
         request_headers = get_headers(request)
@@ -172,6 +525,9 @@ class Aionet:
             )
         x_request_id = request_headers[X_REQUEST_ID_KEY]
         response_headers = {X_REQUEST_ID_KEY: x_request_id}
+        if self.batch_config is not None:
+            # Advertise the batch end point.
+            response_headers[X_BATCH_KEY] = '1'
 
         # Try to get a channel with the other VASP.
         try:
@@ -181,57 +537,126 @@ class Aionet:
             logger.debug(f'Not Authorized', exc_info=True)
             raise web.HTTPUnauthorized(headers=response_headers)
 
+        return other_addr, channel, response_headers
+
+    async def handle_request(self, request):
+        """ Main Http server handler for incomming OffChainAPI requests.
+
+        Args:
+            request (aiohttp.web.Request): The request from the other VASP.
+
+        Raises:
+            aiohttp.web.HTTPUnauthorized: An exception for 401 Unauthorized.
+            aiohttp.web.HTTPForbidden: An exception for 403 Forbidden.
+            aiohttp.web.HTTPBadRequest: An exception for 400 Bad Request.
+            aiohttp.web.HTTPRequestEntityTooLarge: An exception for 413
+                Payload Too Large.
+
+        Returns:
+            aiohttp.web.Response: A JWS signed response.
+        """
+        other_addr, channel, response_headers = \
+            await self._get_request_channel(request)
+
         # Perform the request, send back the reponse.
-        request_text = await request.text()
+        request_body = await read_body(
+            request.content, request.content_length, self.max_body_size)
 
         logger.debug(f'Data Received from {other_addr.as_str()}.')
-        response = await channel.parse_handle_request(request_text)
+        response = await channel.parse_handle_request(request_body)
 
         # Return an error code upon an error
         status = 200 if not response.raw.is_failure() else 400
 
         # Send back the response.
         logger.debug(f'Sending back response to {other_addr.as_str()}.')
+        self._count_bytes(other_addr, len(request_body), len(response.content))
         return web.Response(status=status, text=response.content, headers=response_headers)
 
-
-
-    async def send_request(self, other_addr, request_text):
-        """ Uses an Http client to send an OffChainAPI request to another VASP.
+    async def handle_batch_request(self, request):
+        """ Http server handler for incomming batches of OffChainAPI requests.
 
         Args:
-            other_addr (LibraAddress): The LibraAddress of the other VASP.
-            request_text (dict): a JWS signed request,
-                ready to be sent across the network.
+            request (aiohttp.web.Request): The request from the other VASP.
 
         Raises:
-            NetworkException: [description]
+            aiohttp.web.HTTPUnauthorized: An exception for 401 Unauthorized.
+            aiohttp.web.HTTPBadRequest: An exception for 400 Bad Request.
+            aiohttp.web.HTTPRequestEntityTooLarge: An exception for 413
+                Payload Too Large.
+
+        Returns:
+            aiohttp.web.Response: A JWS signed batch of responses, or a JWS
+            signed error response if the batch is invalid.
         """
+        other_addr, channel, response_headers = \
+            await self._get_request_channel(request)
 
-        logger.debug(f'Connect to {other_addr.as_str()}')
+        request_body = await read_body(
+            request.content, request.content_length, self.max_body_size)
 
-        # Initialize the client.
-        if self.session is None:
-            self.session = aiohttp.ClientSession()
+        logger.debug(f'Batch Received from {other_addr.as_str()}.')
+        response = await channel.parse_handle_request_batch(request_body)
 
-        # Try to get a channel with the other VASP.
-        channel = self.vasp.get_channel(other_addr)
+        # A single response is an error with the batch itself.
+        status = 200 if isinstance(response.raw, list) else 400
 
-        # Get the URLs
-        base_url = self.vasp.info_context.get_peer_base_url(other_addr)
-        url = self.get_url(base_url, other_addr.as_str(), other_is_server=True)
+        logger.debug(f'Sending back responses to {other_addr.as_str()}.')
+        self._count_bytes(other_addr, len(request_body), len(response.content))
+        return web.Response(status=status, text=response.content, headers=response_headers)
+
+    async def _post(self, other_addr, url, data, parse, batch=False):
+        ''' Posts a request to the other VASP, within a slot of its window,
+            and returns the parsed response.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+            url (str): The URL of the end point.
+            data (str or bytes): The JWS signed request.
+            parse (coroutine function): Parses and handles the response
+                bytes, and returns a tuple of the result and whether it
+                signals congestion.
+            batch (bool, optional): Whether this is a batch of requests.
+                Defaults to False.
+
+        Raises:
+            NetworkException: If the request could not be sent, or the
+                response is larger than `max_body_size`.
+
+        Returns:
+            The result of `parse`, or None if the other VASP does not
+            (any more) serve the batch end point.
+        '''
+        # Get the client session to the other VASP.
+        session = self.get_session(other_addr)
         logger.debug(f'Sending post request to {url}')
 
+        # JWS compact serializations are ASCII.
+        if isinstance(data, str):
+            data = data.encode('ascii')
+
         # Add a custom request header
         request_headers = {X_REQUEST_ID_KEY: get_unique_string()}
 
+        # Wait for a slot in the window of requests in flight.
+        window = self.get_window(other_addr)
+        await window.acquire()
+        start = time.monotonic()
+        latency = None
+        congested = False
+
         try:
-            async with self.session.post(
+            async with session.post(
                     url,
-                    data=request_text,
+                    data=data,
                     headers=request_headers
             ) as response:
                 response_headers = get_headers(response)
+                if batch and response.status == 404:
+                    # The other VASP does not serve the batch end point.
+                    self.batch_peers.discard(other_addr.as_str())
+                    return None
+
                 # Check the header is correct
                 if X_REQUEST_ID_KEY not in response_headers or \
                         response_headers[X_REQUEST_ID_KEY] != request_headers[X_REQUEST_ID_KEY]:
@@ -239,23 +664,187 @@ class Aionet:
                         f'Incorrect {X_REQUEST_ID_KEY} response header:', response_headers
                     )
 
-                response_text = await response.text()
-                # Check that there are no low-level HTTP errors.
-                if response.status != 200 :
+                # Note whether the other VASP serves the batch end point.
+                if X_BATCH_KEY in response_headers:
+                    self.batch_peers.add(other_addr.as_str())
+                else:
+                    self.batch_peers.discard(other_addr.as_str())
+
+                try:
+                    response_body = await read_body(
+                        response.content, response.content_length,
+                        self.max_body_size)
+                except web.HTTPRequestEntityTooLarge as e:
+                    raise NetworkException(
+                        f'Response from {url} too large: {e.text}')
+                latency = time.monotonic() - start
+                self._count_bytes(other_addr, len(response_body), len(data))
+
+                logger.debug(f'Raw response: {response_body}')
+
+                # Failed commands, and protocol errors such as a request
+                # to wait, come back signed with status 400: parse them
+                # as any other response, so that a wait signals congestion.
+                try:
+                    res, congested = await parse(response_body)
+                except OffChainProtocolError:
+                    raise
+                except Exception as e:
+                    if response.status == 200:
+                        raise
+                    # A low-level HTTP error.
+                    response_text = response_body.decode('utf-8', 'replace')
                     err_msg = f'Received status {response.status}: {response_text}'
-                    raise Exception(err_msg)
-
-                logger.debug(f'Raw response: {response_text}')
-
-                # Wait in case the requests are sent out of order.
-                res = await channel.parse_handle_response(response_text)
+                    raise Exception(err_msg) from e
                 logger.debug(f'Response parsed with status: {res}')
 
                 return res
 
         except ClientError as e:
             logger.debug(f'ClientError {type(e)}: {e}')
+            congested = True
+            raise NetworkException(e)
+        except asyncio.TimeoutError as e:
+            logger.debug(f'Timeout sending request to {url}')
+            congested = True
             raise NetworkException(e)
+        except OffChainProtocolError as e:
+            # The other VASP asks us to wait.
+            congested = e.protocol_error.code == OffChainErrorCode.wait
+            raise
+        finally:
+            window.release(latency, congested)
+
+    async def send_request(self, other_addr, request_text):
+        """ Uses an Http client to send an OffChainAPI request to another VASP.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+            request_text (str or CommandRequestObject): a JWS signed request,
+                ready to be sent across the network, or a sequenced request
+                (as returned by `sequence_command`) to be signed and sent,
+                in a batch if the other VASP accepts batches.
+
+        Raises:
+            NetworkException: [description]
+        """
+
+        logger.debug(f'Connect to {other_addr.as_str()}')
+
+        # Try to get a channel with the other VASP.
+        channel = self.vasp.get_channel(other_addr)
+
+        if isinstance(request_text, CommandRequestObject):
+            if self.batching_to(other_addr):
+                return await self._submit_to_batch(other_addr, request_text)
+            request = await channel.package_request(request_text)
+            request_text = request.content
+
+        # Get the URLs
+        base_url = self.vasp.info_context.get_peer_base_url(other_addr)
+        url = self.get_url(base_url, other_addr.as_str(), other_is_server=True)
+
+        async def parse(response_body):
+            # Wait in case the requests are sent out of order.
+            res = await channel.parse_handle_response(response_body)
+            return res, False
+
+        return await self._post(other_addr, url, request_text, parse)
+
+    async def send_request_batch(self, other_addr, requests):
+        """ Sends a batch of sequenced requests to another VASP, in one
+        signed Http request. If the other VASP does not serve the batch end
+        point the requests are sent one by one.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+            requests (list of CommandRequestObject): The sequenced requests.
+
+        Raises:
+            NetworkException: If the batch could not be sent.
+
+        Returns:
+            list: For each request, whether the command was a success or
+            not, or the exception raised while handling its response.
+        """
+        channel = self.vasp.get_channel(other_addr)
+        base_url = self.vasp.info_context.get_peer_base_url(other_addr)
+        url = self.get_url(
+            base_url, other_addr.as_str(), other_is_server=True, batch=True)
+
+        message = await channel.package_request_batch(requests)
+
+        async def parse(response_body):
+            results = await channel.parse_handle_response_batch(response_body)
+            congested = any(
+                isinstance(res, OffChainProtocolError) and
+                res.protocol_error.code == OffChainErrorCode.wait
+                for res in results)
+            return results, congested
+
+        logger.debug(
+            f'Sending batch of {len(requests)} requests '
+            f'to {other_addr.as_str()}')
+        results = await self._post(
+            other_addr, url, message.content, parse, batch=True)
+        if results is not None:
+            return results
+
+        logger.debug(f'No batch end point at {other_addr.as_str()}')
+        results = []
+        for request in requests:
+            try:
+                results += [await self.send_request(
+                    other_addr, (await channel.package_request(request)).content)]
+            except Exception as e:
+                results += [e]
+        return results
+
+    async def _submit_to_batch(self, other_addr, request):
+        ''' Adds a request to the next batch to the other VASP, and
+            returns its result once the batch is sent. '''
+        other_addr_str = other_addr.as_str()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        batch = self.batches.setdefault(other_addr_str, [])
+        batch += [(request, fut)]
+        if len(batch) >= self.batch_config.max_size:
+            self._flush_batch(other_addr)
+        elif len(batch) == 1:
+            self.batch_timers[other_addr_str] = loop.call_later(
+                self.batch_config.linger, self._flush_batch, other_addr)
+
+        return await fut
+
+    def _flush_batch(self, other_addr):
+        ''' Sends the requests waiting for a batch to the other VASP. '''
+        other_addr_str = other_addr.as_str()
+        timer = self.batch_timers.pop(other_addr_str, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.batches.pop(other_addr_str, None)
+        if batch:
+            asyncio.get_running_loop().create_task(
+                self._send_batch(other_addr, batch))
+
+    async def _send_batch(self, other_addr, batch):
+        requests = [request for request, _ in batch]
+        try:
+            results = await self.send_request_batch(other_addr, requests)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for (_, fut), res in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(res, Exception):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
 
     async def sequence_command(self, other_addr, command):
         ''' Sequences a new command to the local queue, ready to be
@@ -265,14 +854,18 @@ class Aionet:
             command (ProtocolCommand) : A ProtocolCommand instance.
 
             Returns:
-                str: str of the net message
+                str: str of the net message, or the CommandRequestObject
+                if it is to be signed in a batch by `send_request`.
         '''
 
         channel = self.vasp.get_channel(other_addr)
-        request = channel.sequence_command_local(command)
-        request = await channel.package_request(request)
-        request = request.content
-        return request
+        request = await channel.sequence_command_local_async(command)
+        if self.batching_to(other_addr):
+            self.retransmit.schedule(other_addr, request.cid)
+            return request
+        message = await channel.package_request(request)
+        self.retransmit.schedule(other_addr, request.cid)
+        return message.content
 
     def get_runner(self):
         ''' Gets an object to that needs to be run in an
@@ -10,7 +10,7 @@
 
 """Reference implementation for Bech32 encoding of Libra Blockchain addresses and sub-addresses."""
 
-from typing import Iterable, List, Optional, Tuple
+from typing import Iterable, List, Optional, Tuple, Union
 
 
 LBR = "lbr"  # lbr for mainnet
@@ -31,6 +31,19 @@ __LIBRA_BECH32_SIZE = 50  # in characters
 
 LIBRA_ZERO_SUBADDRESS = b"\0" * __LIBRA_SUBADDRESS_SIZE
 
+# Precomputed tables:
+# * the value of each character of the Bech32 alphabet,
+__BECH32_CHARSET_REV = {c: i for i, c in enumerate(__BECH32_CHARSET)}
+# * the xor of the generators of the checksum selected by the 5 top bits
+#   of the checksum state, for each value of these bits.
+__BECH32_GENERATOR = [0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3]
+__BECH32_POLYMOD_TABLE = [0] * 32
+for __top in range(32):
+    for __i in range(5):
+        if (__top >> __i) & 1:
+            __BECH32_POLYMOD_TABLE[__top] ^= __BECH32_GENERATOR[__i]
+del __top, __i
+
 
 class Bech32Error(Exception):
     """ Represents an error when creating a Libra address. """
@@ -72,13 +85,26 @@ def bech32_address_encode(
     )
     total_bytes = address_bytes + subaddress_final_bytes
 
-    five_bit_data = __convertbits(total_bytes, 8, 5, True)
-    # check base conversion
-    if five_bit_data is None:
-        raise Bech32Error("Error converting bytes to base32")
+    five_bit_data = __bytes_to_five_bits(total_bytes)
     return __bech32_encode(hrp, [encoding_version] + five_bit_data)
 
 
+def bech32_address_encode_many(
+    hrp: str, addresses: Iterable[Tuple[bytes, Optional[bytes]]]
+) -> List[str]:
+    """Encode many Libra addresses (and sub-addresses) with the same HRP.
+    Args:
+        hrp: Bech32 human readable part (lbr, plb or tlb)
+        addresses: (address, sub-address or None) pairs of bytes
+    Returns:
+        The list of Bech32 encoded addresses, in order.
+    """
+    return [
+        bech32_address_encode(hrp, address_bytes, subaddress_bytes)
+        for address_bytes, subaddress_bytes in addresses
+    ]
+
+
 def bech32_address_decode(
     bech32: str, expected_hrp: Optional[str] = None
 ) -> Tuple[str, int, bytes, bytes]:
@@ -99,13 +125,14 @@ def bech32_address_decode(
         )
 
     # do not allow mixed case per BIP 171
-    if bech32 != bech32.lower() and bech32 != bech32.upper():
+    lower = bech32.lower()
+    if bech32 != lower and bech32 != bech32.upper():
         raise Bech32Error(f"Mixed case Bech32 addresses are not allowed, got: {bech32}")
-    bech32 = bech32.lower()
+    bech32 = lower
 
     # check hrp
     hrp = bech32[:3]
-    if hrp not in __LIBRA_HRP:
+    if hrp not in __BECH32_HRP_STATE:
         raise Bech32Error(
             f'Wrong Libra address Bech32 human readable part (prefix): expected "{LBR}" '
             f'for mainnet, "{PLB}" for pre-mainnet and "{TLB}" for testnet, but got "{bech32[:3]}"'
@@ -121,13 +148,14 @@ def bech32_address_decode(
     if bech32[3] != __BECH32_SEPARATOR:
         raise Bech32Error(f"Non-expected Bech32 separator: {bech32[3]}")
 
-    # check characters after separator in Bech32 alphabet
-    if not all(x in __BECH32_CHARSET for x in bech32[4:]):
+    # check characters after separator in Bech32 alphabet, and get their values
+    try:
+        data = [__BECH32_CHARSET_REV[x] for x in bech32[4:]]
+    except KeyError:
         raise Bech32Error(f"Invalid Bech32 characters detected: {bech32}")
-    hrp = bech32[:3]
 
     # version is defined by the index of the Bech32 character after separator
-    address_version = __BECH32_CHARSET.find(bech32[4])
+    address_version = data[0]
     # check valid version
     if address_version != __LIBRA_BECH32_VERSION:
         raise Bech32Error(
@@ -135,15 +163,11 @@ def bech32_address_decode(
             f"but received {address_version}"
         )
 
-    # we've already checked that all characters are in the correct alphabet,
-    # thus, this will always succeed
-    data = [__BECH32_CHARSET.find(x) for x in bech32[5:]]
-
     # check Bech32 checksum
-    if not __bech32_verify_checksum(hrp, [address_version] + data):
+    if __bech32_polymod(data, __BECH32_HRP_STATE[hrp]) != 1:
         raise Bech32Error(f"Bech32 checksum validation failed: {bech32}")
 
-    decoded_data = __convertbits(data[:-__BECH32_CHECKSUM_CHAR_SIZE], 5, 8, False)
+    decoded_data = __five_bits_to_bytes(data[1:-__BECH32_CHECKSUM_CHAR_SIZE])
     # check base conversion
     if decoded_data is None:
         raise Bech32Error("Error converting bytes from base32")
@@ -158,69 +182,88 @@ def bech32_address_decode(
     return (
         hrp,
         address_version,
-        bytes(decoded_data[:__LIBRA_ADDRESS_SIZE]),
-        bytes(decoded_data[-__LIBRA_SUBADDRESS_SIZE:]),
+        decoded_data[:__LIBRA_ADDRESS_SIZE],
+        decoded_data[-__LIBRA_SUBADDRESS_SIZE:],
     )
 
 
-def __bech32_polymod(values: Iterable[int]) -> int:
-    """Internal function that computes the Bech32 checksum."""
-    generator = [0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3]
-    chk = 1
+def bech32_address_decode_many(
+    bech32s: Iterable[str],
+    expected_hrp: Optional[str] = None,
+    raise_errors: bool = True,
+) -> List[Union[Tuple[str, int, bytes, bytes], Bech32Error]]:
+    """
+    Validate and split many Bech32 Libra addresses (see `bech32_address_decode`).
+    Args:
+        bech32s: Bech32 encoded addresses
+        expected_hrp: expected Bech32 human readable part (lbr, plb or tlb)
+        raise_errors: if True (the default) the first invalid address raises
+            a Bech32Error, otherwise its Bech32Error is returned in its place.
+    Returns:
+        The list of decoded (hrp, version, address, subaddress) tuples, in order.
+    """
+    if raise_errors:
+        return [bech32_address_decode(bech32, expected_hrp) for bech32 in bech32s]
+
+    results = []
+    for bech32 in bech32s:
+        try:
+            results.append(bech32_address_decode(bech32, expected_hrp))
+        except Bech32Error as e:
+            results.append(e)
+    return results
+
+
+def __bech32_polymod(values: Iterable[int], chk: int = 1) -> int:
+    """Internal function that computes the Bech32 checksum, continuing
+    from the checksum state `chk`."""
+    table = __BECH32_POLYMOD_TABLE
     for value in values:
-        top = chk >> 25
-        chk = (chk & 0x1FFFFFF) << 5 ^ value
-        for i in range(5):
-            chk ^= generator[i] if ((top >> i) & 1) else 0
+        chk = ((chk & 0x1FFFFFF) << 5 ^ value) ^ table[chk >> 25]
     return chk
 
 
 def __bech32_hrp_expand(hrp: str) -> List[int]:
     """Expand the HRP into values for checksum computation."""
-    # TODO We could pre-compute expanded Libra's HRP.
-    # __LIBRA_MAINNET_HRP_EXPANDED = [3, 3, 3, 0, 12, 2, 18]
-    # __LIBRA_TESTNET_HRP_EXPANDED = [3, 3, 3, 0, 20, 12, 2]
     return [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp]
 
 
-def __bech32_verify_checksum(hrp: str, data: Iterable[int]) -> bool:
-    """Verify a checksum given HRP and converted data characters."""
-    return __bech32_polymod(__bech32_hrp_expand(hrp) + list(data)) == 1
+# The checksum state after the expanded HRP, for each Libra HRP.
+__BECH32_HRP_STATE = {
+    hrp: __bech32_polymod(__bech32_hrp_expand(hrp)) for hrp in __LIBRA_HRP
+}
 
 
 def __bech32_create_checksum(hrp: str, data: Iterable[int]) -> List[int]:
     """Compute the checksum values given HRP and data."""
-    values = __bech32_hrp_expand(hrp) + list(data)
-    polymod = __bech32_polymod(values + [0, 0, 0, 0, 0, 0]) ^ 1
+    polymod = __bech32_polymod(data, __BECH32_HRP_STATE[hrp])
+    polymod = __bech32_polymod((0, 0, 0, 0, 0, 0), polymod) ^ 1
     return [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
 
 
-def __bech32_encode(hrp: str, data: Iterable[int]) -> str:
+def __bech32_encode(hrp: str, data: List[int]) -> str:
     """Compute a Bech32 string given HRP and data values."""
-    combined = list(data) + __bech32_create_checksum(hrp, data)
-    return hrp + __BECH32_SEPARATOR + "".join([__BECH32_CHARSET[d] for d in combined])
+    combined = data + __bech32_create_checksum(hrp, data)
+    charset = __BECH32_CHARSET
+    return hrp + __BECH32_SEPARATOR + "".join([charset[d] for d in combined])
+
+
+def __bytes_to_five_bits(data: bytes) -> List[int]:
+    """Convert bytes to 5 bit values, padding the last value with zero bits."""
+    bits = 8 * len(data)
+    pad = -bits % 5
+    acc = int.from_bytes(data, "big") << pad
+    return [(acc >> shift) & 31 for shift in range(bits + pad - 5, -1, -5)]
 
 
-def __convertbits(
-    data: Iterable[int], from_bits: int, to_bits: int, pad: bool
-) -> Optional[List[int]]:
-    """General power-of-2 base conversion."""
+def __five_bits_to_bytes(data: List[int]) -> Optional[bytes]:
+    """Convert 5 bit values to bytes. Return None if the values leave 5 or
+    more bits, or any non-zero bits, as padding."""
     acc = 0
-    bits = 0
-    ret = []
-    maxv = (1 << to_bits) - 1
-    max_acc = (1 << (from_bits + to_bits - 1)) - 1
     for value in data:
-        if value < 0 or (value >> from_bits):
-            return None
-        acc = ((acc << from_bits) | value) & max_acc
-        bits += from_bits
-        while bits >= to_bits:
-            bits -= to_bits
-            ret.append((acc >> bits) & maxv)
-    if pad:
-        if bits:
-            ret.append((acc << (to_bits - bits)) & maxv)
-    elif bits >= from_bits or ((acc << (to_bits - bits)) & maxv):
+        acc = (acc << 5) | value
+    bits = 5 * len(data)
+    pad = bits % 8
+    if pad >= 5 or acc & ((1 << pad) - 1):
         return None
-    return ret
+    return (acc >> pad).to_bytes(bits // 8, "big")
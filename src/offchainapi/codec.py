@@ -0,0 +1,149 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+''' The JSON codec used to serialize messages and stored objects.
+
+The fastest available backend is selected at import time, in the order of
+``BACKENDS``: ``orjson``, ``ujson`` and finally the standard library
+``json`` module, which is always available. Use the module functions,
+through the module, so that a backend selected later with ``set_backend``
+is used everywhere:
+
+    from . import codec
+    data = codec.dumps(obj)
+    obj = codec.loads(data)
+
+All backends produce compact JSON (without whitespace) that any of them
+can parse, but not necessarily byte-identical output. When a fast backend
+cannot encode an object (eg. integers beyond 64 bits, or non string keys)
+the standard library encoder is used instead. The backends still differ
+on some objects: ``orjson`` encodes ``datetime`` and ``UUID`` objects and
+writes NaN as ``null``, where the standard library raises ``TypeError``
+and writes ``NaN``. Use ``check_serializable`` to validate data the same
+way whatever the backend.
+'''
+
+import json as _json
+import logging
+
+logger = logging.getLogger(name='libra_off_chain_api.codec')
+
+
+# The backends, from the fastest to the slowest.
+BACKENDS = ('orjson', 'ujson', 'json')
+
+
+def _json_dumps(obj):
+    return _json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def _json_dumps_bytes(obj):
+    return _json_dumps(obj).encode('utf-8')
+
+
+def _make_orjson():
+    import orjson
+
+    def dumps_bytes(obj):
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            return _json_dumps_bytes(obj)
+
+    def dumps(obj):
+        return dumps_bytes(obj).decode('utf-8')
+
+    return dumps, dumps_bytes, orjson.loads, orjson.loads
+
+
+def _make_ujson():
+    import ujson
+
+    def dumps(obj):
+        try:
+            return ujson.dumps(
+                obj, ensure_ascii=False, escape_forward_slashes=False)
+        except (TypeError, OverflowError):
+            return _json_dumps(obj)
+
+    def dumps_bytes(obj):
+        return dumps(obj).encode('utf-8')
+
+    return dumps, dumps_bytes, ujson.loads, ujson.loads
+
+
+def _make_json():
+    return _json_dumps, _json_dumps_bytes, _json.loads, _json.loads
+
+
+_FACTORIES = {
+    'orjson': _make_orjson,
+    'ujson': _make_ujson,
+    'json': _make_json,
+}
+
+
+def check_serializable(obj):
+    ''' Checks that an object is standard JSON, accepted by all backends.
+
+        Raises:
+            TypeError: If the object is not JSON serializable.
+            ValueError: If the object contains NaN or infinite floats.
+    '''
+    _json.dumps(obj, allow_nan=False)
+
+
+def available_backends():
+    ''' Returns the names of the backends that can be used here, from the
+        fastest to the slowest. '''
+    available = []
+    for name in BACKENDS:
+        try:
+            _FACTORIES[name]()
+        except ImportError:
+            continue
+        available += [name]
+    return available
+
+
+def set_backend(name=None):
+    ''' Selects the backend used by the module functions.
+
+        Args:
+            name (str, optional): One of ``BACKENDS``. Defaults to None,
+                the fastest available backend.
+
+        Returns:
+            str: The name of the selected backend.
+
+        Raises:
+            ValueError: If the backend is unknown.
+            ImportError: If the backend is not installed.
+    '''
+    global backend, dumps, dumps_bytes, loads, loads_bytes
+
+    if name is None:
+        name = available_backends()[0]
+    if name not in _FACTORIES:
+        raise ValueError(
+            f'Unknown JSON backend {name}, expected '
+            f'one of: {", ".join(BACKENDS)}'
+        )
+
+    dumps, dumps_bytes, loads, loads_bytes = _FACTORIES[name]()
+    backend = name
+    logger.debug(f'Using JSON backend {name}')
+    return name
+
+
+# The name of the selected backend.
+backend = None
+
+# The functions of the selected backend:
+#   * dumps(obj): returns the JSON serialization of obj as a str.
+#   * dumps_bytes(obj): returns the JSON serialization of obj as UTF-8 bytes.
+#   * loads(data): parses a JSON str (or bytes) and returns the object.
+#   * loads_bytes(data): parses JSON UTF-8 bytes (or a str).
+dumps = dumps_bytes = loads = loads_bytes = None
+
+set_backend()
@@ -7,7 +7,8 @@
 from .protocol import OffChainVASP
 from .payment_logic import PaymentProcessor
 from .storage import StorableFactory
-from .asyncnet import Aionet, NetworkException
+from .asyncnet import Aionet, NetworkException, DEFAULT_MAX_BODY_SIZE
+from .protocol_messages import CommandRequestObject
 
 import asyncio
 import logging
@@ -19,6 +20,24 @@ class VASPPaymentTimeout(Exception):
     pass
 
 
+def make_event_loop(use_uvloop=True):
+    ''' Returns a new asyncio event loop: a uvloop event loop if
+        `use_uvloop` is True and uvloop is installed, and otherwise the
+        default event loop.
+
+        Parameters:
+            use_uvloop (bool, optional): Whether to use uvloop when
+                available. Defaults to True.
+    '''
+    if use_uvloop:
+        try:
+            import uvloop
+            return uvloop.new_event_loop()
+        except ImportError:
+            logger.debug('uvloop is not available, using the default loop.')
+    return asyncio.new_event_loop()
+
+
 class Vasp:
     ''' Creates a VASP with the standard networking and storage backend.
 
@@ -31,13 +50,44 @@ class Vasp:
         info_context (VASPInfo) : The information context for the VASP
             implementing the VASPInfo interface.
         database (*) : A persistent key value store to be used
-            by the storage systems as a backend.
+            by the storage systems as a backend: a ``Database``, or an
+            ``AsyncDatabase`` whose calls do not block the event loop.
+            The payment getters then return coroutines: use their
+            ``_async`` versions.
+        key_cache_ttl (float) : The time in seconds the compliance keys
+            returned by the info context are cached for. Defaults to 300.
+        response_cache_size (int) : The number of signed responses to
+            committed requests kept per channel, to answer duplicate
+            requests cheaply. Defaults to 1024.
+        crypto_executor (concurrent.futures.Executor) : The thread or process
+            pool in which messages are signed and verified, off the event
+            loop. Defaults to None, on the event loop.
+        pool_config (PoolConfig) : The configuration of the HTTP connection
+            pool to each other VASP. Defaults to PoolConfig().
+        window_config (WindowConfig) : The configuration of the window of
+            requests in flight to each other VASP. Defaults to
+            WindowConfig().
+        batch_config (BatchConfig) : The configuration of the batching of
+            requests to other VASPs that also batch requests. Defaults to
+            None, no batching.
+        retransmit_config (RetransmitConfig) : The configuration of the
+            retransmission of requests without a response. Defaults to
+            RetransmitConfig().
+        max_body_size (int) : The max size in bytes of the body of a
+            request or response. Defaults to DEFAULT_MAX_BODY_SIZE (1 MiB).
+        loop_factory (callable) : Returns the event loop of the VASP when
+            none is set with `set_loop`. Defaults to `make_event_loop`,
+            which uses uvloop when available.
 
     Returns a VASP object.
     '''
 
     def __init__(self, my_addr, host, port, business_context,
-                 info_context, database):
+                 info_context, database, key_cache_ttl=300,
+                 response_cache_size=1024, crypto_executor=None,
+                 pool_config=None, window_config=None, batch_config=None,
+                 retransmit_config=None, max_body_size=DEFAULT_MAX_BODY_SIZE,
+                 loop_factory=make_event_loop):
 
         # Initiaize all VASP related objects.
         self.my_addr = my_addr              # Our Address.
@@ -54,10 +104,16 @@ class Vasp:
 
         # Make root OffChainVasp Object.
         self.vasp = OffChainVASP(
-            self.my_addr, self.pp, self.store, self.info_context
+            self.my_addr, self.pp, self.store, self.info_context,
+            key_cache_ttl=key_cache_ttl,
+            response_cache_size=response_cache_size,
+            crypto_executor=crypto_executor
         )
         # Make default aiohttp based network.
-        self.net_handler = Aionet(self.vasp)
+        self.net_handler = Aionet(
+            self.vasp, pool_config=pool_config, window_config=window_config,
+            batch_config=batch_config, retransmit_config=retransmit_config,
+            max_body_size=max_body_size)
         self.pp.set_network(self.net_handler) # Set handler for processor.
 
         # Initialize later those ...
@@ -66,11 +122,21 @@ class Vasp:
         self.loop = None
         self.runner = None
         self.all_started_future = None
+        self.loop_factory = loop_factory
+        # Whether the VASP runs its loop, or is embedded in a running one.
+        self.owns_loop = False
 
 
-    def set_loop(self, loop):
-        ''' Set the asyncio event loop associated with this VASP.'''
+    def set_loop(self, loop=None):
+        ''' Set the asyncio event loop associated with this VASP.
+
+        Parameters:
+            loop (asyncio.AbstractEventLoop, optional): The event loop.
+                Defaults to None, a new loop made by the loop factory.
+        '''
         if self.loop is None:
+            if loop is None:
+                loop = self.loop_factory()
             self.loop = loop
             self.all_started_future = self.loop.create_future()
 
@@ -83,9 +149,13 @@ class Vasp:
     def start_services(self, *, watch_period=10.0):
         ''' Registers services with the even loop provided.
 
+        If the event loop is not running, the services are started before
+        returning. If it is already running (for example when the VASP is
+        embedded in an async application) they are started in the loop,
+        and a concurrent Future is returned; await `start_services_async`
+        instead from within the loop.
+
         Parameters:
-            loop (asyncio.AbstractEventLoopPolicy): an asyncio event loop on
-                which to register services.
             watch_period (float, optional): the time (seconds) beween
                 activating the network watchdog to trigger debug info and
                 retransmits. Defaults to 10.0.
@@ -94,16 +164,43 @@ class Vasp:
         if self.loop is None:
             raise Exception('Missing event loop: set with "set_loop".')
 
+        if self.loop.is_running():
+            return asyncio.run_coroutine_threadsafe(
+                self.start_services_async(watch_period=watch_period),
+                self.loop)
+
         asyncio.set_event_loop(self.loop)
+        self.owns_loop = True
+        self.loop.run_until_complete(
+            self.start_services_async(watch_period=watch_period))
+
+    async def start_services_async(self, *, watch_period=10.0):
+        ''' Starts the services in the running event loop, which becomes
+        the loop of the VASP if none was set with `set_loop`.
+
+        Parameters:
+            watch_period (float, optional): the time (seconds) beween
+                activating the network watchdog to trigger debug info and
+                retransmits. Defaults to 10.0.
+
+        Raises:
+            RuntimeError: If another loop was set with `set_loop`.
+        '''
+        loop = asyncio.get_running_loop()
+        if self.loop is not None and self.loop is not loop:
+            raise RuntimeError(
+                'The VASP is set to run in another event loop: start it '
+                'in that loop.')
+        self.set_loop(loop)
 
         # Assign a loop  to the processor.
         self.pp.loop = self.loop
 
         # Start the http server.
         self.runner = self.net_handler.get_runner()
-        self.loop.run_until_complete(self.runner.setup())
+        await self.runner.setup()
         self.site = web.TCPSite(self.runner, self.host, self.port)
-        self.loop.run_until_complete(self.site.start())
+        await self.site.start()
 
         # Run the watchdor task to log statistics.
         self.net_handler.schedule_watchdog(self.loop, period=watch_period)
@@ -179,6 +276,10 @@ class Vasp:
         try:
             return await self.net_handler.send_request(addr, req)
         except NetworkException:
+            if isinstance(req, CommandRequestObject):
+                # The request was to be signed in a batch.
+                channel = self.vasp.get_channel(addr)
+                req = (await channel.package_request(req)).content
             return req
 
     def new_command(self, addr, cmd):
@@ -242,18 +343,34 @@ class Vasp:
                 KeyError: In case a payment with the given reference
                     does not exist.
         """
-        payment = list(self.pp.get_payment_history_by_ref_id(reference_id))
-        return payment
+        if self.store.is_async:
+            return self.pp.get_payment_history_by_ref_id(reference_id)
+        return list(self.pp.get_payment_history_by_ref_id(reference_id))
+
+    async def get_payment_by_ref_async(self, reference_id):
+        ''' The coroutine version of ``get_payment_by_ref``, which works
+            with any database. '''
+        return await self.pp.get_latest_payment_by_ref_id_async(reference_id)
+
+    async def get_payment_history_by_ref_async(self, reference_id):
+        ''' The coroutine version of ``get_payment_history_by_ref``, which
+            works with any database. '''
+        return await self.pp.get_payment_history_by_ref_id_async(reference_id)
 
     async def close_async(self):
         ''' Await this to cleanly close the network
-           and any pending commands being processed. '''
+           and any pending commands being processed. When the VASP is
+           embedded in a running loop, only its network is closed, and
+           the loop keeps running. '''
 
         # Close the network
         logger.info('Closing the network ...')
         await self.runner.cleanup()
         await self.net_handler.close()
 
+        if not self.owns_loop:
+            return
+
         # Send the cancel signal to all pending tasks
         other_tasks = []
         for T in asyncio.all_tasks():
@@ -1,13 +1,28 @@
 # Copyright (c) The Libra Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from jwcrypto.common import base64url_encode
+from jwcrypto.common import base64url_encode, base64url_decode, json_encode
 from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import \
+    Ed25519PrivateKey, Ed25519PublicKey
 from libra import txnmetadata, utils
 from jwcrypto import jwk, jws
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from base64 import urlsafe_b64decode
+import asyncio
+import binascii
 import json
 
 
+# The protected header of the compliance signatures, and its base64url
+# encoding, which starts all compact JWS messages we sign.
+JWS_HEADER = json_encode({'alg': 'EdDSA'})
+JWS_HEADER_B64 = base64url_encode(JWS_HEADER)
+JWS_HEADER_B64_BYTES = JWS_HEADER_B64.encode('ascii')
+
+
 class OffChainInvalidSignature(Exception):
     pass
 
@@ -16,6 +31,76 @@ class IncorrectInputException(Exception):
     pass
 
 
+# Signatures and verifications run in a ProcessPoolExecutor cannot use the
+# key objects, which are not picklable, but the raw bytes of the keys. The
+# key objects are then made, and cached, in the worker processes.
+
+@lru_cache(maxsize=64)
+def _private_from_bytes(raw):
+    return Ed25519PrivateKey.from_private_bytes(raw)
+
+
+@lru_cache(maxsize=64)
+def _public_from_bytes(raw):
+    return Ed25519PublicKey.from_public_bytes(raw)
+
+
+def _sign_with_bytes(raw, payload):
+    return _sign_compact(_private_from_bytes(raw), payload)
+
+
+def _verify_with_bytes(raw, signature):
+    return _verify_compact(_public_from_bytes(raw), signature)
+
+
+def _b64url_decode(data):
+    ''' Decodes base64url str or bytes, without padding. '''
+    if isinstance(data, str):
+        return base64url_decode(data)
+    if len(data) % 4 == 1:
+        raise ValueError('Invalid base64 string')
+    return urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def _sign_compact(private, payload):
+    ''' Signs a str payload with an Ed25519 private key, and returns a
+        compact JWS with the JWS_HEADER protected header. '''
+    payload_b64 = base64url_encode(payload.encode('utf-8'))
+    signing_input = f'{JWS_HEADER_B64}.{payload_b64}'
+    sig = private.sign(signing_input.encode('ascii'))
+    return f'{signing_input}.{base64url_encode(sig)}'
+
+
+def _verify_compact(public, signature):
+    ''' Verifies a compact JWS with the JWS_HEADER protected header with an
+        Ed25519 public key, and returns its payload: as bytes if the JWS
+        is bytes, and otherwise as a str. '''
+    is_bytes = isinstance(signature, bytes)
+    _, payload_b64, sig_b64 = signature.split(b'.' if is_bytes else '.')
+    try:
+        signing_input = signature[:-len(sig_b64) - 1]
+        if not is_bytes:
+            signing_input = signing_input.encode('ascii')
+        payload = _b64url_decode(payload_b64)
+        sig = _b64url_decode(sig_b64)
+    except (ValueError, binascii.Error):
+        raise OffChainInvalidSignature(signature, "Invalid Format")
+
+    try:
+        public.verify(sig, signing_input)
+    except InvalidSignature:
+        raise OffChainInvalidSignature(signature, "Invalid Signature")
+    return payload if is_bytes else _decode_payload(signature, payload)
+
+
+def _decode_payload(signature, payload):
+    ''' Decodes the UTF-8 payload of a verified JWS. '''
+    try:
+        return payload.decode("utf-8")
+    except UnicodeDecodeError:
+        raise OffChainInvalidSignature(signature, "Invalid Payload")
+
+
 
 class ComplianceKey:
 
@@ -23,11 +108,36 @@ class ComplianceKey:
         ''' Creates a compliance key from a JWK Ed25519 key. '''
         self._key = key
 
+        # The cryptography key objects, extracted on first use.
+        self._public = None
+        self._private = None
+        self._public_bytes = None
+        self._private_bytes = None
+
     def get_public(self):
-        return self._key.get_op_key('verify')
+        if self._public is None:
+            self._public = self._key.get_op_key('verify')
+        return self._public
 
     def get_private(self):
-        return self._key.get_op_key('sign')
+        if self._private is None:
+            self._private = self._key.get_op_key('sign')
+        return self._private
+
+    def get_public_bytes(self):
+        ''' Returns the 32 bytes of the Ed25519 public key. '''
+        if self._public_bytes is None:
+            self._public_bytes = self.get_public().public_bytes(
+                serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return self._public_bytes
+
+    def get_private_bytes(self):
+        ''' Returns the 32 bytes of the Ed25519 private key. '''
+        if self._private_bytes is None:
+            self._private_bytes = self.get_private().private_bytes(
+                serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                serialization.NoEncryption())
+        return self._private_bytes
 
     @staticmethod
     def generate():
@@ -71,22 +181,82 @@ class ComplianceKey:
     def export_full(self):
         return self._key.export_private()
 
-    async def sign_message(self, payload):
+    async def sign_message(self, payload, executor=None):
+        ''' Signs a str payload and returns a compact JWS with the
+            JWS_HEADER protected header. The JWS is built and signed
+            directly, and is identical to the JWS made by jwcrypto
+            (see `_jwcrypto_sign_message`).
+
+            The signature is made in the `executor` (a concurrent.futures
+            Executor) if one is given, or else on the event loop. '''
+        if executor is None:
+            return _sign_compact(self.get_private(), payload)
+
+        if isinstance(executor, ProcessPoolExecutor):
+            func = partial(_sign_with_bytes, self.get_private_bytes(), payload)
+        else:
+            func = partial(_sign_compact, self.get_private(), payload)
+        return await asyncio.get_running_loop().run_in_executor(executor, func)
+
+    async def verify_message(self, signature, executor=None):
+        ''' Verifies a compact JWS and returns its payload. A JWS with
+            the JWS_HEADER protected header is verified directly, and any
+            other JWS through jwcrypto (see `_jwcrypto_verify_message`).
+
+            The JWS may be a str, or the bytes received from the network,
+            in which case it is verified without decoding it to a str, and
+            its payload is returned as (UTF-8) bytes.
+
+            The verification is made in the `executor` (a concurrent.futures
+            Executor) if one is given, or else on the event loop.
+
+            Raises OffChainInvalidSignature if the signature is invalid
+            or malformed. '''
+        if isinstance(signature, bytes):
+            parts = signature.split(b'.')
+            if len(parts) != 3 or parts[0] != JWS_HEADER_B64_BYTES:
+                try:
+                    signature = signature.decode('ascii')
+                except UnicodeDecodeError:
+                    raise OffChainInvalidSignature(signature, "Invalid Format")
+                return self._jwcrypto_verify_message(
+                    signature, as_bytes=True)
+        else:
+            parts = signature.split('.')
+            if len(parts) != 3 or parts[0] != JWS_HEADER_B64:
+                return self._jwcrypto_verify_message(signature)
+
+        if executor is None:
+            return _verify_compact(self.get_public(), signature)
+
+        if isinstance(executor, ProcessPoolExecutor):
+            func = partial(
+                _verify_with_bytes, self.get_public_bytes(), signature)
+        else:
+            func = partial(_verify_compact, self.get_public(), signature)
+        return await asyncio.get_running_loop().run_in_executor(executor, func)
+
+    def _jwcrypto_sign_message(self, payload):
+        ''' Signs a str payload through jwcrypto. '''
         signer = jws.JWS(payload.encode('utf-8'))
-        signer.add_signature(self._key, alg='EdDSA')
+        signer.add_signature(self._key, alg=None, protected=JWS_HEADER)
         sig = signer.serialize(compact=True)
         return sig
 
-    async def verify_message(self, signature):
+    def _jwcrypto_verify_message(self, signature, as_bytes=False):
+        ''' Verifies a compact JWS through jwcrypto, and returns its payload
+            as bytes if `as_bytes` is set, and otherwise as a str. '''
         try:
             verifier = jws.JWS()
             verifier.deserialize(signature)
             verifier.verify(self._key, alg='EdDSA')
-            return verifier.payload.decode("utf-8")
         except jws.InvalidJWSSignature:
             raise OffChainInvalidSignature(signature, "Invalid Signature")
         except jws.InvalidJWSObject:
             raise OffChainInvalidSignature(signature, "Invalid Format")
+        if as_bytes:
+            return verifier.payload
+        return _decode_payload(signature, verifier.payload)
 
     def thumbprint(self):
         return self._key.thumbprint()
@@ -1,6 +1,8 @@
 # Copyright (c) The Libra Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+from contextlib import contextmanager
+
 
 class Database:
     """ The interface that underlying database should implement """
@@ -35,3 +37,135 @@ class Database:
     def count(self, prefix):
         """ Return the number of rows in db with thte given prefix """
         return NotImplementedError()  # pragma: no cover
+
+    # The bulk operations below fall back to one call per key. Backends
+    # for which each call is a round-trip should override them.
+
+    def get_many(self, prefix, keys):
+        """ Given a prefix and a list of keys, return a list of their
+        values in db, with None for the keys that do not exist """
+        return [self.try_get(prefix, key) for key in keys]
+
+    def put_many(self, prefix, items):
+        """ Store the prefix/key - value of each (key, value) pair to db """
+        for key, val in items:
+            self.put(prefix, key, val)
+
+    def delete_many(self, prefix, keys):
+        """ Remove the prefix/keys that exist from db """
+        for key in keys:
+            if self.isin(prefix, key):
+                self.delete(prefix, key)
+
+    def contains_many(self, prefix, keys):
+        """ Return a list of whether each prefix/key is in the db """
+        return [self.isin(prefix, key) for key in keys]
+
+    def begin(self):
+        """ Start a transaction: writes until the matching `commit` are
+        applied atomically. Backends that do not support transactions may
+        leave this as a no-op. """
+        pass
+
+    def commit(self):
+        """ Commit all writes since the last `begin`. """
+        pass
+
+    def rollback(self):
+        """ Discard all writes since the last `begin`, where the
+        backend supports it. """
+        pass
+
+    @contextmanager
+    def transaction(self):
+        """ A context manager grouping all writes within it into a single
+        atomic batch. It commits on exit, and rolls back if an exception
+        is raised.
+
+        Transactions may be nested: only the outermost one begins and
+        commits (or rolls back) a transaction on the backend, so that
+        a function using a transaction may be called from within another.
+        """
+        depth = getattr(self, '_transaction_depth', 0)
+        if depth == 0:
+            self.begin()
+        self._transaction_depth = depth + 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth = depth
+            if depth == 0:
+                self.rollback()
+            raise
+        else:
+            self._transaction_depth = depth
+            if depth == 0:
+                self.commit()
+
+
+class AsyncDatabase:
+    """ The interface that an asynchronous underlying database should
+    implement. It mirrors ``Database``, with coroutine methods, so that the
+    event loop keeps running while the database does I/O. """
+
+    async def get(self, prefix, key):
+        """ Given a prefix and key, return the value in db """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def try_get(self, prefix, key):
+        """
+        Given a prefix and key, return the value in db if it exists, otherwise
+        return None
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def put(self, prefix, key, val):
+        """ Store the prefix/key - value to db"""
+        raise NotImplementedError()  # pragma: no cover
+
+    async def delete(self, prefix, key):
+        """ Remove the prefix/key from db if it exists """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def isin(self, prefix, key):
+        """ Return whether the given prefix/key is in the db """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def getkeys(self, prefix):
+        """ Return the keys in db associated with the given prefix """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def count(self, prefix):
+        """ Return the number of rows in db with thte given prefix """
+        raise NotImplementedError()  # pragma: no cover
+
+    async def get_many(self, prefix, keys):
+        """ Given a prefix and a list of keys, return a list of their
+        values in db, with None for the keys that do not exist """
+        return [await self.try_get(prefix, key) for key in keys]
+
+    async def put_many(self, prefix, items):
+        """ Store the prefix/key - value of each (key, value) pair to db """
+        for key, val in items:
+            await self.put(prefix, key, val)
+
+    async def delete_many(self, prefix, keys):
+        """ Remove the prefix/keys that exist from db """
+        for key in keys:
+            if await self.isin(prefix, key):
+                await self.delete(prefix, key)
+
+    async def contains_many(self, prefix, keys):
+        """ Return a list of whether each prefix/key is in the db """
+        return [await self.isin(prefix, key) for key in keys]
+
+    def transaction(self):
+        """ An asynchronous context manager grouping all writes within it
+        into a single atomic batch. It commits on exit, and rolls back if
+        an exception is raised. Transactions may be nested, in which case
+        only the outermost one commits.
+
+        Unlike with a ``Database``, other tasks may run while a transaction
+        is open: their calls must not be part of the transaction.
+        """
+        raise NotImplementedError()  # pragma: no cover
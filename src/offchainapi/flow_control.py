@@ -0,0 +1,145 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import namedtuple, deque
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(name='libra_off_chain_api.flow_control')
+
+
+""" The configuration of the window of requests in flight to a peer VASP. """
+WindowConfig = namedtuple('WindowConfig', [
+    'initial',         # The initial size of the window
+    'minimum',         # The smallest size of the window
+    'maximum',         # The largest size of the window
+    'latency_factor',  # Latency over this many times the lowest observed
+                       # latency signals congestion
+    'decrease',        # The factor applied to the size on congestion
+], defaults=[8, 1, 128, 2.0, 0.5])
+
+
+""" The statistics of the window of requests in flight to a peer VASP. """
+WindowStats = namedtuple('WindowStats', [
+    'size',        # The current number of requests allowed in flight
+    'in_flight',   # The number of requests in flight
+    'waiting',     # The number of requests waiting for a slot
+    'congestion',  # The number of times the window decreased
+])
+
+
+class InFlightWindow:
+    """ Bounds the number of requests in flight to a peer VASP, and adapts
+    the bound to the observed congestion (AIMD).
+
+    A request must first `acquire` a slot, which waits (in FIFO order) while
+    the window is full, and then `release` it with the latency and outcome
+    of the request:
+
+        * Each request that completes without congestion increases the size
+          of the window by 1 / size, so about by one per window of requests.
+        * A request that reports congestion (such as a 'wait' protocol
+          error or a network error), or a smoothed latency above
+          `latency_factor` times the lowest latency observed, multiplies
+          the size by `decrease`, at most once per smoothed latency.
+
+    Args:
+        config (WindowConfig, optional): The configuration of the window.
+            Defaults to WindowConfig().
+        clock (callable, optional): Returns the current time in seconds.
+            Defaults to ``time.monotonic``.
+    """
+
+    def __init__(self, config=None, clock=time.monotonic):
+        self.config = config if config else WindowConfig()
+        self.clock = clock
+
+        self.size = float(self.config.initial)
+        self.in_flight = 0
+        self.waiters = deque()
+
+        # The lowest and smoothed observed latencies.
+        self.min_latency = None
+        self.smooth_latency = None
+        self.last_decrease = None
+        self.congestion = 0
+
+    def limit(self):
+        ''' Returns the number of requests allowed in flight. '''
+        return max(1, int(self.size))
+
+    def stats(self):
+        ''' Returns the WindowStats of the window. '''
+        return WindowStats(
+            self.limit(), self.in_flight, len(self.waiters), self.congestion)
+
+    async def acquire(self):
+        ''' Waits until a request may be sent, and takes its slot. '''
+        if not self.waiters and self.in_flight < self.limit():
+            self.in_flight += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # We were given a slot but will not use it.
+                self.in_flight -= 1
+                self._wake()
+            elif fut in self.waiters:
+                self.waiters.remove(fut)
+            raise
+
+    def release(self, latency=None, congested=False):
+        ''' Releases the slot of a request, and adapts the window.
+
+        Args:
+            latency (float, optional): The latency of the request in
+                seconds, if it received a response.
+            congested (bool, optional): Whether the request signaled
+                congestion. Defaults to False.
+        '''
+        self.in_flight -= 1
+
+        if latency is not None:
+            if self.min_latency is None or latency < self.min_latency:
+                self.min_latency = latency
+            if self.smooth_latency is None:
+                self.smooth_latency = latency
+            else:
+                self.smooth_latency += (latency - self.smooth_latency) / 8
+            if self.smooth_latency > \
+                    self.config.latency_factor * self.min_latency:
+                congested = True
+
+        if congested:
+            self._decrease()
+        elif latency is not None:
+            self.size = min(
+                float(self.config.maximum), self.size + 1.0 / self.size)
+
+        self._wake()
+
+    def _decrease(self):
+        now = self.clock()
+        period = self.smooth_latency or 0.0
+        if self.last_decrease is not None and \
+                now - self.last_decrease < period:
+            return
+
+        self.last_decrease = now
+        self.congestion += 1
+        self.size = max(
+            float(self.config.minimum), self.size * self.config.decrease)
+        logger.debug(f'Congestion: window decreased to {self.size:.1f}')
+
+    def _wake(self):
+        while self.waiters and self.in_flight < self.limit():
+            fut = self.waiters.popleft()
+            if fut.done():
+                continue
+            self.in_flight += 1
+            fut.set_result(None)
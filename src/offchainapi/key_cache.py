@@ -0,0 +1,106 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import time
+import logging
+
+logger = logging.getLogger(name='libra_off_chain_api.key_cache')
+
+
+class KeyCache:
+    """ Caches the compliance keys returned by a VASPInfo context, so that
+    they are not looked up (and parsed) again for every message.
+
+    The cached keys are prepared on insertion: the underlying
+    ``cryptography`` Ed25519 key object is extracted once, and reused for
+    every signature or verification with the key.
+
+    Keys expire ``ttl`` seconds after they were looked up, after which
+    they are looked up again from the VASPInfo context. Use ``invalidate``
+    to drop keys explicitly, for example when a peer rotates its key.
+
+    Args:
+        info_context (VASPInfo): The VASPInfo context returning the keys.
+        ttl (float, optional): The time in seconds a key is cached for.
+            Defaults to 300. None caches keys until they are invalidated,
+            and 0 disables caching.
+        clock (callable, optional): Returns the current time in seconds.
+            Defaults to ``time.monotonic``.
+    """
+
+    # The kinds of keys cached.
+    VERIFY = 'verify'
+    SIGN = 'sign'
+
+    def __init__(self, info_context, ttl=300, clock=time.monotonic):
+        self.info_context = info_context
+        self.ttl = ttl
+        self.clock = clock
+
+        # Map: (kind, address str) -> (key, expiry time or None)
+        self.keys = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_peer_compliance_verification_key(self, other_addr):
+        """ Returns the compliance verification key of the other VASP.
+
+        Args:
+            other_addr (str): The encoded Libra Blockchain address of
+                the other VASP.
+
+        Returns:
+            ComplianceKey: The compliance verification key of the other VASP.
+        """
+        return self._get(self.VERIFY, other_addr)
+
+    def get_my_compliance_signature_key(self, my_addr):
+        """ Returns the compliance signature (secret) key of the VASP.
+
+        Args:
+            my_addr (str): The encoded Libra Blockchain address of the VASP.
+
+        Returns:
+            ComplianceKey: The compliance key of the VASP.
+        """
+        return self._get(self.SIGN, my_addr)
+
+    def invalidate(self, addr=None):
+        """ Drops the cached keys of an address, or all cached keys.
+
+        Args:
+            addr (str, optional): The encoded Libra Blockchain address
+                whose keys to drop. Defaults to None, all keys.
+        """
+        if addr is None:
+            self.keys.clear()
+            return
+
+        for kind in (self.VERIFY, self.SIGN):
+            self.keys.pop((kind, addr), None)
+
+    def _get(self, kind, addr):
+        entry_key = (kind, addr)
+        entry = self.keys.get(entry_key)
+        if entry is not None:
+            key, expiry = entry
+            if expiry is None or self.clock() < expiry:
+                self.hits += 1
+                return key
+            del self.keys[entry_key]
+
+        self.misses += 1
+        logger.debug(f'Looking up the {kind} key of {addr}')
+        if kind == self.VERIFY:
+            key = self.info_context.get_peer_compliance_verification_key(addr)
+            key.get_public()
+        else:
+            key = self.info_context.get_my_compliance_signature_key(addr)
+            key.get_private()
+
+        if self.ttl is None:
+            self.keys[entry_key] = (key, None)
+        elif self.ttl > 0:
+            self.keys[entry_key] = (key, self.clock() + self.ttl)
+        return key
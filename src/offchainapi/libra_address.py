@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from binascii import unhexlify, hexlify
+from functools import lru_cache
 from typing import Optional
 from .bech32 import (
     bech32_address_encode,
@@ -18,6 +19,10 @@ class LibraAddressError(Exception):
     pass
 
 
+# The maximum number of addresses kept by `LibraAddress.from_encoded_str`.
+DECODE_CACHE_SIZE = 4096
+
+
 class LibraAddress:
     """
     A representation of address used in this protocol that consists of three parts:
@@ -26,6 +31,9 @@ class LibraAddress:
     3. hrp: Human Readable Part, indicating the network version:
         * "lbr" for Mainnet addresses
         * "tlb" for Testnet addresses
+
+    LibraAddress instances are immutable, which allows `from_encoded_str`
+    to return the same instance for the same encoded str.
     """
 
     @classmethod
@@ -59,7 +67,27 @@ class LibraAddress:
 
     @classmethod
     def from_encoded_str(cls, encoded_str):
-        """ Return a LibraAddress given an bech32 encoded str """
+        """ Return a LibraAddress given an bech32 encoded str.
+
+        The addresses of the last DECODE_CACHE_SIZE distinct encoded str
+        are cached, and returned without decoding them again. Use
+        `LibraAddress.cache_info()` to get the cache statistics.
+        """
+        return _decode_encoded_str(cls, encoded_str)
+
+    @staticmethod
+    def cache_info():
+        """ Return the statistics (hits, misses, maxsize, currsize) of the
+        cache of `from_encoded_str`. """
+        return _decode_encoded_str.cache_info()
+
+    @staticmethod
+    def cache_clear():
+        """ Clear the cache of `from_encoded_str`. """
+        _decode_encoded_str.cache_clear()
+
+    @classmethod
+    def _decode_encoded_str(cls, encoded_str):
         try:
             hrp, _version, onchain_address_bytes, subaddress_bytes = bech32_address_decode(encoded_str)
         except Bech32Error as e:
@@ -81,6 +109,9 @@ class LibraAddress:
         self.subaddress_bytes = subaddress_bytes
         self.hrp = hrp
 
+        # The LibraAddress without subaddress, made on first use.
+        self._onchain = None
+
     def __repr__(self):
         return (
             f"LibraAddress with onchain_address_bytes: {self.onchain_address_bytes}, "
@@ -131,7 +162,10 @@ class LibraAddress:
             without any subaddress information. """
         if self.subaddress_bytes is None:
             return self
-        return LibraAddress.from_bytes(self.hrp, self.onchain_address_bytes, None)
+        if self._onchain is None:
+            self._onchain = LibraAddress.from_bytes(
+                self.hrp, self.onchain_address_bytes, None)
+        return self._onchain
 
     def get_onchain_encoded_str(self):
         """ Return an encoded str representation of LibraAddress containing
@@ -147,3 +181,8 @@ class LibraAddress:
         if self.subaddress_bytes:
             return bytes.hex(self.subaddress_bytes)
         return None
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def _decode_encoded_str(cls, encoded_str):
+    return cls._decode_encoded_str(encoded_str)
@@ -0,0 +1,167 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from .database import Database
+from .async_db import ThreadPoolDatabase
+
+import asyncio
+
+
+# Marks keys that did not exist before a write, in the undo journal.
+_MISSING = object()
+
+
+class MemoryDB(Database):
+    """ An in-memory implementation of the ``Database`` interface.
+
+    Values are held in one dictionary per prefix, rather than a single flat
+    dictionary, so that operations on a prefix never need to scan the keys
+    stored under other prefixes:
+
+        * ``get``, ``try_get``, ``put``, ``delete``, ``isin`` and ``count``
+          are O(1).
+        * ``get_many``, ``put_many``, ``delete_many`` and ``contains_many``
+          are O(number of keys given), looking up the prefix once.
+        * ``getkeys`` is O(number of keys in the prefix).
+
+    Keys of a prefix are returned in insertion order. Overwriting an existing
+    key does not change its position.
+
+    Transactions are supported by keeping a journal of the previous values
+    of all keys written since ``begin``, which ``rollback`` restores.
+
+    Nothing is persisted: all data is lost when the process exits.
+    """
+
+    def __init__(self):
+        # Map: prefix -> (Map: key -> value)
+        self.data = {}
+
+        # The undo journal of the current transaction, if any, as a list of
+        # (prefix, key, previous value or _MISSING).
+        self.journal = None
+
+    def begin(self):
+        self.journal = []
+
+    def commit(self):
+        self.journal = None
+
+    def rollback(self):
+        journal, self.journal = self.journal, None
+        if journal is None:
+            return
+
+        for prefix, key, val in reversed(journal):
+            if val is _MISSING:
+                if self.isin(prefix, key):
+                    self.delete(prefix, key)
+            else:
+                self.put(prefix, key, val)
+
+    def get(self, prefix, key):
+        try:
+            return self.data[prefix][key]
+        except KeyError:
+            raise KeyError(key)
+
+    def try_get(self, prefix, key):
+        table = self.data.get(prefix)
+        if table is None:
+            return None
+        return table.get(key)
+
+    def put(self, prefix, key, val):
+        table = self.data.get(prefix)
+        if table is None:
+            table = self.data[prefix] = {}
+        if self.journal is not None:
+            self.journal.append((prefix, key, table.get(key, _MISSING)))
+        table[key] = val
+
+    def delete(self, prefix, key):
+        try:
+            table = self.data[prefix]
+            val = table.pop(key)
+        except KeyError:
+            raise KeyError(key)
+
+        if self.journal is not None:
+            self.journal.append((prefix, key, val))
+
+        # Do not keep empty tables around.
+        if not table:
+            del self.data[prefix]
+
+    def isin(self, prefix, key):
+        table = self.data.get(prefix)
+        return table is not None and key in table
+
+    def getkeys(self, prefix):
+        table = self.data.get(prefix)
+        if table is None:
+            return []
+        # Return a copy, so that callers may mutate the db while iterating.
+        return list(table)
+
+    def count(self, prefix):
+        table = self.data.get(prefix)
+        if table is None:
+            return 0
+        return len(table)
+
+    def get_many(self, prefix, keys):
+        table = self.data.get(prefix)
+        if table is None:
+            return [None for _ in keys]
+        return [table.get(key) for key in keys]
+
+    def put_many(self, prefix, items):
+        table = self.data.get(prefix)
+        if table is None:
+            table = self.data[prefix] = {}
+        journal = self.journal
+        for key, val in items:
+            if journal is not None:
+                journal.append((prefix, key, table.get(key, _MISSING)))
+            table[key] = val
+
+        # Do not keep empty tables around.
+        if not table:
+            del self.data[prefix]
+
+    def delete_many(self, prefix, keys):
+        table = self.data.get(prefix)
+        if table is None:
+            return
+        journal = self.journal
+        for key in keys:
+            val = table.pop(key, _MISSING)
+            if val is not _MISSING and journal is not None:
+                journal.append((prefix, key, val))
+
+        if not table:
+            del self.data[prefix]
+
+    def contains_many(self, prefix, keys):
+        table = self.data.get(prefix)
+        if table is None:
+            return [False for _ in keys]
+        return [key in table for key in keys]
+
+
+class AsyncMemoryDB(ThreadPoolDatabase):
+    """ An in-process stand-in for an asynchronous database, for tests.
+
+    It holds its data in a ``MemoryDB``, whose calls run on the event loop
+    rather than in a thread, but each call yields to the other tasks once
+    it is done, as a call to a remote database would.
+    """
+
+    def __init__(self):
+        ThreadPoolDatabase.__init__(self, MemoryDB())
+
+    async def _call(self, fn, *args):
+        result = fn(*args)
+        await asyncio.sleep(0)
+        return result
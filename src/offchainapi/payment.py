@@ -7,6 +7,7 @@ from .utils import StructureException, StructureChecker, \
 from .shared_object import SharedObject
 from .status_logic import Status
 from .libra_address import LibraAddress
+from . import codec
 
 import json
 
@@ -18,6 +19,8 @@ class KYCData(StructureChecker):
             kyc_json_blob (str): blob containing KYC data.
     """
 
+    __slots__ = ()
+
     fields = [
         ("payload_type", str, REQUIRED, WRITE_ONCE),
         ("payload_version", int, REQUIRED, WRITE_ONCE),
@@ -48,8 +51,8 @@ class KYCData(StructureChecker):
     def custom_update_checks(self, diff):
         """ Override StructureChecker. """
 
-        # Check all data is JSON serializable
-        json.dumps(diff)
+        # Check all data is standard JSON
+        codec.check_serializable(diff)
 
         types = ['individual', 'entity']
         if 'type' not in diff:
@@ -59,6 +62,8 @@ class KYCData(StructureChecker):
 
 
 class StatusObject(StructureChecker):
+    __slots__ = ()
+
     fields = [
         ('status', str, REQUIRED, UPDATABLE),
         ('abort_code', str, OPTIONAL, UPDATABLE),
@@ -110,6 +115,8 @@ class PaymentActor(StructureChecker):
             metadata (list): Arbitrary metadata.
     """
 
+    __slots__ = ()
+
     fields = [
         ('address', str, REQUIRED, WRITE_ONCE),
         ('kyc_data', KYCData, OPTIONAL, WRITE_ONCE),
@@ -186,6 +193,8 @@ class PaymentActor(StructureChecker):
 
 
 class PaymentAction(StructureChecker):
+    __slots__ = ()
+
     fields = [
         ('amount', int, REQUIRED, WRITE_ONCE),
         ('currency', str, REQUIRED, WRITE_ONCE),
@@ -231,6 +240,10 @@ class PaymentObject(SharedObject, StructureChecker, JSONSerializable):
             action (PaymentAction): The payment action.
     """
 
+    # Besides the SharedObject slots, the `__dict__` slot allows setting
+    # other attributes; the dictionary is only created when one is set.
+    __slots__ = ('version', 'previous_version', 'notes', '__dict__')
+
     fields = [
         ('sender', PaymentActor, REQUIRED, WRITE_ONCE),
         ('receiver', PaymentActor, REQUIRED, WRITE_ONCE),
@@ -281,11 +294,14 @@ class PaymentObject(SharedObject, StructureChecker, JSONSerializable):
         SharedObject.__init__(self)
         return self
 
-    def new_version(self, new_version=None, store=None):
-        """ Override SharedObject. """
-        clone = SharedObject.new_version(self, new_version, store)
-        clone.flatten()
-        return clone
+    def copy(self, store=None):
+        """ Override SharedObject.
+
+        The copy shares all sub-objects with this payment, and only copies
+        those that are accessed (see ``StructureChecker.cow_copy``), so the
+        store is not needed. The copy starts with no recorded changes.
+        """
+        return self.cow_copy()
 
     def add_recipient_signature(self, signature):
         """ Update the recipient signature.
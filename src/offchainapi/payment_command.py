@@ -88,7 +88,7 @@ class PaymentCommand(ProtocolCommand):
                 )
             dep_object = dependencies[dep]
 
-            # Need to get a deepcopy new version.
+            # Need to get a copy-on-write new version.
             updated_payment = dep_object.new_version(new_version, store=dependencies)
 
             PaymentObject.from_full_record(
@@ -12,6 +12,7 @@ from .shared_object import SharedObject
 from .status_logic import STATUS_HEIGHTS
 from .libra_address import LibraAddress, LibraAddressError
 from .utils import get_unique_string
+from .storage import maybe_await
 
 import asyncio
 import logging
@@ -32,6 +33,10 @@ logger = logging.getLogger(name='libra_off_chain_api.payment_logic')
 class PaymentProcessor(CommandProcessor):
     ''' The logic to process a payment from either side.
 
+    The storage of the processor may be asynchronous (see
+    ``StorableFactory``): then ``check_command``, ``process_command`` and
+    the methods to get payments return coroutines to be awaited.
+
     The processor checks commands as they are received from the other
     VASP. When a command from the other VASP is successful it is
     passed on to potentially lead to a further command. It is also
@@ -48,7 +53,8 @@ class PaymentProcessor(CommandProcessor):
     all been suitably processed upon a potential crash and recovery.
     '''
 
-    def __init__(self, business, storage_factory, loop=None):
+    def __init__(self, business, storage_factory, loop=None,
+                 object_cache_size=1024):
         self.business = business
 
         # Asyncio support
@@ -66,9 +72,12 @@ class PaymentProcessor(CommandProcessor):
             'reference_id_index', str, processor_dir)
 
         # This is the primary store of shared objects.
-        # It maps version numbers -> objects.
+        # It maps version numbers -> objects. Versions of objects never
+        # change once stored, so we keep the most recently used ones
+        # parsed in a cache.
         self.object_store = storage_factory.make_dict(
-            'object_store', PaymentObject, root=processor_dir)
+            'object_store', PaymentObject, root=processor_dir,
+            cache_size=object_cache_size)
 
         # Allow mapping a set of future to payment reference_id outcomes
         # Once a payment has an outcome (ready_for_settlement, abort, or command exception)
@@ -86,6 +95,17 @@ class PaymentProcessor(CommandProcessor):
         assert self.net is None
         self.net = net
 
+    async def get_dependencies_async(self, command):
+        ''' Returns a dict mapping the versions of the payments that a
+            command reads, and of the payment it writes if stored, to
+            these payments, read from storage in a single call. '''
+        versions = list(command.get_dependencies()) + \
+            list(command.get_new_object_versions())
+        payments = await maybe_await(self.object_store.get_many(versions))
+        return {
+            version: payment for version, payment in zip(versions, payments)
+            if payment is not None}
+
     # ------ Machinery for supporting async Business context ------
 
     async def process_command_failure_async(
@@ -104,7 +124,8 @@ class PaymentProcessor(CommandProcessor):
                     f' Trigger outcome.')
 
                 # try to construct a payment.
-                payment = command.get_payment(self.object_store)
+                dependencies = await self.get_dependencies_async(command)
+                payment = command.get_payment(dependencies)
                 self.set_payment_outcome_exception(
                                 payment.reference_id,
                                 PaymentProcessorRemoteError(error))
@@ -139,7 +160,8 @@ class PaymentProcessor(CommandProcessor):
             )
 
         # Update the outcome of the payment
-        payment = command.get_payment(self.object_store)
+        dependencies = await self.get_dependencies_async(command)
+        payment = command.get_payment(dependencies)
         self.set_payment_outcome(payment)
 
         # If there is no registered obligation to process there is no
@@ -215,12 +237,23 @@ class PaymentProcessor(CommandProcessor):
         # Register this future to call later.
         self.outcome_futures[reference_id] += [fut]
 
-        # Check to see if the payment is already resolved.
-        if reference_id in self.reference_id_index:
-            payment = self.get_latest_payment_by_ref_id(reference_id)
-            self.set_payment_outcome(payment)
-
-        return (await fut)
+        try:
+            # Check to see if the payment is already resolved.
+            if await maybe_await(
+                    self.reference_id_index.contains(reference_id)):
+                payment = await self.get_latest_payment_by_ref_id_async(
+                    reference_id)
+                self.set_payment_outcome(payment)
+
+            return (await fut)
+        except asyncio.CancelledError:
+            # Stop waiting, for example on timeout.
+            futures = self.outcome_futures.get(reference_id, [])
+            if fut in futures:
+                futures.remove(fut)
+                if not futures:
+                    del self.outcome_futures[reference_id]
+            raise
 
     def set_payment_outcome(self, payment):
         ''' Updates the list of futures waiting for payment outcomes
@@ -247,7 +280,8 @@ class PaymentProcessor(CommandProcessor):
 
         # Update the outcome for each of the futures.
         for fut in outcome_futures:
-            fut.set_result(payment)
+            if not fut.done():
+                fut.set_result(payment)
 
     def set_payment_outcome_exception(self, reference_id, payment_exception):
         # Check if anyone is waiting for this payment.
@@ -261,7 +295,8 @@ class PaymentProcessor(CommandProcessor):
 
         # Update the outcome for each of the futures.
         for fut in outcome_futures:
-            fut.set_exception(payment_exception)
+            if not fut.done():
+                fut.set_exception(payment_exception)
 
     # -------- Implements CommandProcessor interface ---------
 
@@ -271,8 +306,13 @@ class PaymentProcessor(CommandProcessor):
 
     def check_command(self, my_address, other_address, command):
         ''' Overrides CommandProcessor. '''
+        return self.storage_factory.resolve(
+            self.check_command_async(my_address, other_address, command))
 
-        new_payment = command.get_payment(self.object_store)
+    async def check_command_async(self, my_address, other_address, command):
+        ''' The coroutine version of ``check_command``. '''
+        dependencies = await self.get_dependencies_async(command)
+        new_payment = command.get_payment(dependencies)
 
         # Ensure that the two parties involved are in the VASP channel
         parties = set([
@@ -332,13 +372,20 @@ class PaymentProcessor(CommandProcessor):
                     )
 
                 old_version = command.get_previous_version_number()
-                old_payment = self.object_store[old_version]
+                if old_version not in dependencies:
+                    raise KeyError(old_version)
+                old_payment = dependencies[old_version]
                 self.check_new_update(old_payment, new_payment)
 
     def process_command(self, other_addr, command,
                         cid, status_success, error=None):
         ''' Overrides CommandProcessor. '''
+        return self.storage_factory.resolve(self.process_command_async(
+            other_addr, command, cid, status_success, error))
 
+    async def process_command_async(self, other_addr, command,
+                                    cid, status_success, error=None):
+        ''' The coroutine version of ``process_command``. '''
         other_str = other_addr.as_str()
 
         # Call the failure handler and exit.
@@ -350,14 +397,19 @@ class PaymentProcessor(CommandProcessor):
                 self.futs += [fut]
             return fut
 
-        # Creates new objects.
-        new_versions = command.get_new_object_versions()
-        for version in new_versions:
-            obj = command.get_object(version, self.object_store)
-            self.object_store[version] = obj
+        # Creates new objects, and updates the Index of Reference
+        # ID -> Payment, as a single atomic batch. This joins the
+        # transaction of the channel if there is one.
+        async with self.storage_factory.transaction_async():
+            dependencies = await self.get_dependencies_async(command)
+            new_versions = command.get_new_object_versions()
+            for version in new_versions:
+                obj = command.get_object(version, dependencies)
+                await maybe_await(self.object_store.put(version, obj))
+                dependencies[version] = obj
 
-        # Update the Index of Reference ID -> Payment.
-        self.store_latest_payment_by_ref_id(command)
+            await self.store_latest_payment_by_ref_id_async(
+                command, dependencies)
 
         # Spin further command processing in its own task.
         logger.debug(f'(other:{other_str}) Schedule cmd {cid}')
@@ -375,15 +427,32 @@ class PaymentProcessor(CommandProcessor):
 
     def get_latest_payment_by_ref_id(self, ref_id):
         ''' Returns the latest payment with the reference ID provided.'''
-        version = self.reference_id_index.try_get(ref_id)
+        return self.storage_factory.resolve(
+            self.get_latest_payment_by_ref_id_async(ref_id))
+
+    async def get_latest_payment_by_ref_id_async(self, ref_id):
+        ''' The coroutine version of ``get_latest_payment_by_ref_id``. '''
+        version = await maybe_await(self.reference_id_index.try_get(ref_id))
         if version is None:
             raise KeyError(ref_id)
-        return self.object_store[version]
+        payment = await maybe_await(self.object_store.try_get(version))
+        if payment is None:
+            raise KeyError(version)
+        return payment
 
     def get_payment_history_by_ref_id(self, ref_id):
         ''' Generator that returns all versions of a
             payment with a given reference ID
-            in reverse causal order (newest first). '''
+            in reverse causal order (newest first).
+
+            With an asynchronous storage, returns instead a coroutine
+            of the list of versions (see
+            ``get_payment_history_by_ref_id_async``). '''
+        if self.storage_factory.is_async:
+            return self.get_payment_history_by_ref_id_async(ref_id)
+        return self._payment_history(ref_id)
+
+    def _payment_history(self, ref_id):
         payment = self.get_latest_payment_by_ref_id(ref_id)
         yield payment
 
@@ -392,24 +461,50 @@ class PaymentProcessor(CommandProcessor):
             payment = self.object_store[p_version]
             yield payment
 
+    async def get_payment_history_by_ref_id_async(self, ref_id):
+        ''' The coroutine version of ``get_payment_history_by_ref_id``. '''
+        payment = await self.get_latest_payment_by_ref_id_async(ref_id)
+        history = [payment]
+
+        if payment.previous_version is not None:
+            p_version = payment.previous_version
+            payment = await maybe_await(self.object_store.try_get(p_version))
+            if payment is None:
+                raise KeyError(p_version)
+            history += [payment]
+        return history
+
     def store_latest_payment_by_ref_id(self, command):
         ''' Internal command to update the payment index '''
-        payment = command.get_payment(self.object_store)
+        return self.storage_factory.resolve(
+            self.store_latest_payment_by_ref_id_async(command))
+
+    async def store_latest_payment_by_ref_id_async(
+            self, command, dependencies=None):
+        ''' The coroutine version of ``store_latest_payment_by_ref_id``,
+            given optionally the dependencies of the command (see
+            ``get_dependencies_async``). '''
+        if dependencies is None:
+            dependencies = await self.get_dependencies_async(command)
+        payment = command.get_payment(dependencies)
 
         # Update the Index of Reference ID -> Payment.
         ref_id = payment.reference_id
 
         # Write the new payment to the index of payments by
         # reference ID to support they GetPaymentAPI.
-        payment_version = self.reference_id_index.try_get(ref_id)
+        payment_version = await maybe_await(
+            self.reference_id_index.try_get(ref_id))
         if payment_version:
             # We check that the previous version is present.
             # If so we update it with the new one.
             dependencies_versions = command.get_dependencies()
             if payment_version in dependencies_versions:
-                self.reference_id_index[ref_id] = payment.version
+                await maybe_await(
+                    self.reference_id_index.put(ref_id, payment.version))
         else:
-            self.reference_id_index[ref_id] = payment.version
+            await maybe_await(
+                self.reference_id_index.put(ref_id, payment.version))
 
     # ----------- END of CommandProcessor interface ---------
 
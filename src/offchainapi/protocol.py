@@ -10,11 +10,13 @@ from .errors import OffChainErrorCode
 from .utils import JSONParsingError, JSONFlag
 from .libra_address import LibraAddress
 from .crypto import OffChainInvalidSignature
+from .key_cache import KeyCache
+from .storage import maybe_await
+from . import codec
 
-import json
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from hashlib import sha256
 import logging
-from itertools import islice
 import asyncio
 
 
@@ -27,6 +29,9 @@ NetMessage = namedtuple('NetMessage',
      'raw',  # The Python CommandRequestObject or CommandResponseObject object
      ])
 
+# The key of the list of requests, or responses, in a batch.
+BATCH_KEY = 'batch'
+
 """ A struct for dependencies in object_locks """
 DepLocks = namedtuple('DepLocks', ['mising_deps', 'used_deps', 'locked_deps'])
 
@@ -50,9 +55,22 @@ class OffChainVASP:
         storage_factory (StorableFactory): The storage factory.
         info_context (VASPInfo): The information context for the VASP
                                  implementing the VASPInfo interface.
+        key_cache_ttl (float, optional): The time in seconds the compliance
+                                 keys returned by the info context are
+                                 cached for (see KeyCache). Defaults to 300.
+        response_cache_size (int, optional): The number of signed responses
+                                 to committed requests each channel keeps,
+                                 to answer duplicate requests without
+                                 parsing them. Defaults to 1024.
+        crypto_executor (concurrent.futures.Executor, optional): The executor
+                                 in which messages are signed and verified,
+                                 off the event loop. Defaults to None, on
+                                 the event loop.
     """
 
-    def __init__(self, vasp_addr, processor, storage_factory, info_context):
+    def __init__(self, vasp_addr, processor, storage_factory, info_context,
+                 key_cache_ttl=300, response_cache_size=1024,
+                 crypto_executor=None):
         logger.debug(f'Creating VASP {vasp_addr.as_str()}')
 
         assert isinstance(processor, CommandProcessor)
@@ -72,6 +90,11 @@ class OffChainVASP:
         # such as TLS certificates and keys.
         self.info_context = info_context
 
+        # The cache of the compliance keys from the info context.
+        self.key_cache = KeyCache(info_context, ttl=key_cache_ttl)
+        self.response_cache_size = response_cache_size
+        self.crypto_executor = crypto_executor
+
         # The dict of channels we already have.
         self.channel_store = {}
 
@@ -117,6 +140,15 @@ class VASPPairChannel:
     """ Represents the state of an off-chain bi-directional
         channel bewteen two VASPs.
 
+    The storage of the channel may use a synchronous ``Database`` or an
+    ``AsyncDatabase``. The methods that read and update it are coroutines
+    (such as ``handle_request_async``), and their synchronous versions
+    (such as ``handle_request``) run them to completion with a synchronous
+    database, or otherwise return them to be awaited. With an asynchronous
+    database they suspend at each storage call, so they run one at a time
+    on each channel, to keep checking and taking the locks of objects
+    atomic.
+
     Args:
         myself (LibraAddress): The Libra Blockchain address of the current VASP.
         other (LibraAddress): The Libra Blockchain address of the other VASP.
@@ -143,6 +175,9 @@ class VASPPairChannel:
         self.processor = processor
         self.vasp = vasp
         self.storage = storage
+        self.key_cache = vasp.key_cache
+        self.response_cache_size = vasp.response_cache_size
+        self.crypto_executor = vasp.crypto_executor
 
         # Check we are not making a channel with ourselves.
         if self.myself.as_str() == self.other_address_str:
@@ -178,6 +213,25 @@ class VASPPairChannel:
                 'my_pending_requests', CommandRequestObject,
                 root=other_vasp)
 
+        # The cids of the pending requests, in the order they were
+        # sequenced, with the time they are next due to be retransmitted.
+        # With an asynchronous database it is loaded on first use.
+        self.my_pending_index = self.storage.make_index(
+            'my_pending_index', root=other_vasp)
+        self.loaded = False
+        self.storage_lock = None
+        if not self.storage.is_async:
+            self.storage.resolve(self.load_async())
+
+        # The signed pending requests, to retransmit them as they are.
+        # Map: request cid -> JWS signed request
+        self.my_pending_signed = {}
+
+        # An LRU cache of the signed responses to committed requests of the
+        # other VASP, to answer the same requests again without parsing.
+        # Map: request cid -> (digest of the request, NetMessage)
+        self.committed_responses = OrderedDict()
+
         logger.debug(f'(other:{self.other_address_str}) Created VASP channel')
 
     def get_my_address(self):
@@ -194,9 +248,39 @@ class VASPPairChannel:
         """
         return self.other
 
+    async def load_async(self):
+        ''' Loads the index of pending requests, and indexes the requests
+            stored without an index. '''
+        if self.loaded:
+            return
+        if self.storage.is_async:
+            # A synchronous index is loaded when it is made.
+            await self.my_pending_index.reload()
+        if self.my_pending_index.is_empty() and \
+                not await maybe_await(self.my_pending_requests.is_empty()):
+            async with self.storage.transaction_async():
+                for cid in await maybe_await(self.my_pending_requests.keys()):
+                    await maybe_await(self.my_pending_index.add(cid))
+        self.loaded = True
+
+    async def _run_exclusive(self, fn, *args):
+        ''' Awaits a coroutine function that reads and updates the storage
+            of the channel, after any other running on the channel with
+            an asynchronous database. '''
+        if not self.storage.is_async:
+            return await fn(*args)
+
+        if self.storage_lock is None:
+            self.storage_lock = asyncio.Lock()
+        async with self.storage_lock:
+            await self.load_async()
+            return await fn(*args)
+
     async def package_request(self, request):
 
-        """ A hook to send a request to other VASP.
+        """ A hook to send a request to other VASP. Pending requests
+        are signed once, and their signed version is reused until they
+        get a response.
 
         Args:
             request (CommandRequestObject): The request object.
@@ -204,14 +288,18 @@ class VASPPairChannel:
         Returns:
             NetMessage: The message to be sent on a network.
         """
-        json_dict = request.get_json_data_dict(JSONFlag.NET)
+        json_string = self.my_pending_signed.get(request.cid)
+        if json_string is None:
+            json_dict = request.get_json_data_dict(JSONFlag.NET)
 
-        # Make signature.
-        vasp = self.vasp
-        my_key = vasp.info_context.get_my_compliance_signature_key(
-            self.get_my_address().as_str()
-        )
-        json_string = await my_key.sign_message(json.dumps(json_dict))
+            # Make signature.
+            my_key = self.key_cache.get_my_compliance_signature_key(
+                self.get_my_address().as_str()
+            )
+            json_string = await my_key.sign_message(
+                codec.dumps(json_dict), executor=self.crypto_executor)
+            if request.cid in self.my_pending_index:
+                self.my_pending_signed[request.cid] = json_string
 
         net_message = NetMessage(
             self.myself,
@@ -223,6 +311,33 @@ class VASPPairChannel:
 
         return net_message
 
+    async def package_request_batch(self, requests):
+        """ Packages several requests to the other VASP into one batch,
+        signed once.
+
+        Args:
+            requests (list of CommandRequestObject): The requests, in order.
+
+        Returns:
+            NetMessage: The message to be sent on a network.
+        """
+        struct = {
+            BATCH_KEY: [
+                request.get_json_data_dict(JSONFlag.NET)
+                for request in requests
+            ]
+        }
+
+        my_key = self.key_cache.get_my_compliance_signature_key(
+            self.get_my_address().as_str()
+        )
+        signed_batch = await my_key.sign_message(
+            codec.dumps(struct), executor=self.crypto_executor)
+
+        return NetMessage(
+            self.myself, self.other, CommandRequestObject, signed_batch, requests
+        )
+
     async def package_response(self, response):
         """ A hook to send a response to other VASP.
 
@@ -235,12 +350,12 @@ class VASPPairChannel:
         struct = response.get_json_data_dict(JSONFlag.NET)
 
         # Sign response
-        info_context = self.vasp.info_context
-        my_key = info_context.get_my_compliance_signature_key(
+        my_key = self.key_cache.get_my_compliance_signature_key(
             self.get_my_address().as_str()
         )
 
-        signed_response = await my_key.sign_message(json.dumps(struct))
+        signed_response = await my_key.sign_message(
+            codec.dumps(struct), executor=self.crypto_executor)
 
         net_message = NetMessage(
             self.myself, self.other, CommandResponseObject, signed_response, response
@@ -248,6 +363,33 @@ class VASPPairChannel:
 
         return net_message
 
+    async def package_response_batch(self, responses):
+        """ Packages the responses to a batch of requests into one batch,
+        signed once.
+
+        Args:
+            responses (list of CommandResponseObject): The responses, in order.
+
+        Returns:
+            NetMessage: The message to be sent on a network.
+        """
+        struct = {
+            BATCH_KEY: [
+                response.get_json_data_dict(JSONFlag.NET)
+                for response in responses
+            ]
+        }
+
+        my_key = self.key_cache.get_my_compliance_signature_key(
+            self.get_my_address().as_str()
+        )
+        signed_batch = await my_key.sign_message(
+            codec.dumps(struct), executor=self.crypto_executor)
+
+        return NetMessage(
+            self.myself, self.other, CommandResponseObject, signed_batch, responses
+        )
+
     def is_client(self):
         """
         Returns:
@@ -279,7 +421,7 @@ class VASPPairChannel:
          """
         return not self.is_client()
 
-    def apply_response(self, request):
+    async def apply_response(self, request):
         """Updates all structures according to the success or failure of
         a given command. The given request must also contain a response
         (not None).
@@ -292,13 +434,13 @@ class VASPPairChannel:
 
         other_addr = self.get_other_address()
 
-        self.processor.process_command(
+        await maybe_await(self.processor.process_command(
             other_addr=other_addr,
             command=request.command,
             cid=request.cid,
             status_success=request.is_success(),
             error=response.error if response.error else None
-        )
+        ))
 
     def get_dep_locks(self, request):
         """
@@ -309,9 +451,17 @@ class VASPPairChannel:
             DepLocks: a struct holding missing dependencies, used dependencies
                 and locked dependencies of the concerned request
         """
+        return self.storage.resolve(self.get_dep_locks_async(request))
+
+    async def get_dep_locks_async(self, request):
+        ''' The coroutine version of ``get_dep_locks``. '''
         depends_on_version = request.command.get_dependencies()
 
-        dep_locks = {dv: self.object_locks.try_get(str(dv)) for dv in depends_on_version}
+        dep_locks = dict(zip(
+            depends_on_version,
+            await maybe_await(self.object_locks.get_many(
+                [str(dv) for dv in depends_on_version]))
+        ))
 
         missing_deps = []
         used_deps = []
@@ -348,14 +498,23 @@ class VASPPairChannel:
             off_chain_command (PaymentCommand): The command to sequence.
 
         Returns:
-            NetMessage: The message to be sent on a network.
+            CommandRequestObject: The request to be sent on a network.
         """
+        return self.storage.resolve(
+            self.sequence_command_local_async(off_chain_command))
+
+    async def sequence_command_local_async(self, off_chain_command):
+        ''' The coroutine version of ``sequence_command_local``. '''
+        return await self._run_exclusive(
+            self._sequence_command_local, off_chain_command)
 
+    async def _sequence_command_local(self, off_chain_command):
         off_chain_command.set_origin(self.get_my_address())
         request = CommandRequestObject(off_chain_command)
 
         # Before adding locally, check the dependencies
-        missing_deps, used_deps, locked_deps = self.get_dep_locks(request)
+        missing_deps, used_deps, locked_deps = \
+            await self.get_dep_locks_async(request)
         if missing_deps:
             raise DependencyException(f'Dependencies not present: {", ".join(missing_deps)}')
 
@@ -366,23 +525,27 @@ class VASPPairChannel:
             raise DependencyException(f'Dependencies locked: {", ".join(locked_deps)}')
 
         create_versions = request.command.get_new_object_versions()
-        existing_writes = []
-        for cv in create_versions:
-            if str(cv) in self.object_locks:
-                existing_writes.append(cv)
+        existing = await maybe_await(self.object_locks.contains_many(
+            [str(cv) for cv in create_versions]))
+        existing_writes = [
+            cv for cv, exists in zip(create_versions, existing) if exists]
         if existing_writes:
             raise DependencyException(f'Object version already exists: {", ".join(existing_writes)}')
 
-        self.processor.check_command(
+        await maybe_await(self.processor.check_command(
             self.get_my_address(),
             self.get_other_address(),
-            off_chain_command)
+            off_chain_command))
 
         # Add the request to those requiring a response.
-        self.my_pending_requests[request.cid] = request
+        async with self.storage.transaction_async():
+            await maybe_await(
+                self.my_pending_requests.put(request.cid, request))
+            await maybe_await(self.my_pending_index.add(request.cid))
 
-        for dv in off_chain_command.get_dependencies():
-            self.object_locks[str(dv)] = request.cid
+            await maybe_await(self.object_locks.put_many(
+                [(str(dv), request.cid)
+                 for dv in off_chain_command.get_dependencies()]))
 
         # Send the requests outside the locks to allow
         # for an asyncronous implementation.
@@ -399,13 +562,30 @@ class VASPPairChannel:
         """
         try:
             # Check signature
-            vasp = self.vasp
-            other_key = vasp.info_context.get_peer_compliance_verification_key(
+            other_key = self.key_cache.get_peer_compliance_verification_key(
                 self.other_address_str
             )
 
-            message = await other_key.verify_message(json_command)
-            request = json.loads(message)
+            message = await other_key.verify_message(
+                json_command, executor=self.crypto_executor)
+            request = codec.loads(message)
+
+            # Answer a request already committed with the same response.
+            if isinstance(message, str):
+                message = message.encode('utf-8')
+            digest = sha256(message).digest()
+            # Responses are cached under the cid as parsed, a str.
+            cid = request.get('cid') if isinstance(request, dict) else None
+            cid = str(cid) if cid is not None else None
+            cached = self.committed_responses.get(cid)
+            if cached is not None and cached[0] == digest:
+                self.committed_responses.move_to_end(cid)
+                logger.debug(
+                    f'(other:{self.other_address_str}) '
+                    f'Handle request that alerady has a response: '
+                    f'cid #{cid}.',
+                )
+                return cached[1]
 
             # Parse the request whoever necessary.
             request = CommandRequestObject.from_json_data_dict(
@@ -417,7 +597,7 @@ class VASPPairChannel:
                 f'(other:{self.other_address_str}) '
                 f'Processing request seq #{request.cid}',
             )
-            response = self.handle_request(request)
+            response = await self.handle_request_async(request)
 
         except OffChainInvalidSignature as e:
             logger.warning(
@@ -441,8 +621,71 @@ class VASPPairChannel:
 
         # Prepare the response.
         full_response = await self.package_response(response)
+
+        # Only the responses to committed requests are final.
+        if not response.is_protocol_failure() and self.response_cache_size:
+            self.committed_responses[request.cid] = (digest, full_response)
+            self.committed_responses.move_to_end(request.cid)
+            if len(self.committed_responses) > self.response_cache_size:
+                self.committed_responses.popitem(last=False)
         return full_response
 
+    async def parse_handle_request_batch(self, json_batch):
+        """ Handles a JWS signed batch of requests, in order.
+
+        Args:
+            json_batch (str or bytes): The batch of requests signed using JWS.
+
+        Returns:
+            NetMessage: The batch of responses to be sent on a network, or
+            a single error response if the batch itself is invalid.
+        """
+        try:
+            other_key = self.key_cache.get_peer_compliance_verification_key(
+                self.other_address_str
+            )
+            message = await other_key.verify_message(
+                json_batch, executor=self.crypto_executor)
+            items = codec.loads(message)[BATCH_KEY]
+            if not isinstance(items, list):
+                raise JSONParsingError('Batch is not a list')
+
+        except OffChainInvalidSignature as e:
+            logger.warning(
+                f'(other:{self.other_address_str}) '
+                f'Signature verification failed. OffChainInvalidSignature: {e}'
+            )
+            response = make_parsing_error(f'{e}', code=OffChainErrorCode.invalid_signature)
+            return await self.package_response(response)
+
+        except (JSONParsingError, KeyError, TypeError, ValueError) as e:
+            logger.error(
+                f'(other:{self.other_address_str}) Bad batch: {e}',
+                exc_info=True,
+            )
+            return await self.package_response(make_parsing_error())
+
+        logger.debug(
+            f'(other:{self.other_address_str}) '
+            f'Processing batch of {len(items)} requests',
+        )
+        responses = []
+        for item in items:
+            try:
+                request = CommandRequestObject.from_json_data_dict(
+                    item, JSONFlag.NET
+                )
+                response = await self.handle_request_async(request)
+            except JSONParsingError as e:
+                logger.error(
+                    f'(other:{self.other_address_str}) JSONParsingError: {e}',
+                    exc_info=True,
+                )
+                response = make_parsing_error()
+            responses.append(response)
+
+        return await self.package_response_batch(responses)
+
     def handle_request(self, request):
         """ Handles a request provided as a dictionary.
 
@@ -452,6 +695,13 @@ class VASPPairChannel:
         Returns:
             CommandResponseObject: The response to the VASP's request.
         """
+        return self.storage.resolve(self.handle_request_async(request))
+
+    async def handle_request_async(self, request):
+        ''' The coroutine version of ``handle_request``. '''
+        return await self._run_exclusive(self._handle_request, request)
+
+    async def _handle_request(self, request):
         request.command.set_origin(self.other)
 
         # Keep track of object locks here.
@@ -459,13 +709,14 @@ class VASPPairChannel:
         depends_on_version = request.command.get_dependencies()
 
         # Always answer old requests.
-        previous_request = self.committed_commands.try_get(request.cid)
+        previous_request = await maybe_await(
+            self.committed_commands.try_get(request.cid))
         if previous_request:
             if previous_request.is_same_command(request):
 
                 # Invariant
-                assert all(str(cv) in self.object_locks
-                            for cv in create_versions)
+                assert all(await maybe_await(self.object_locks.contains_many(
+                    [str(cv) for cv in create_versions])))
 
                 # Re-send the response.
                 logger.debug(
@@ -488,7 +739,8 @@ class VASPPairChannel:
                 )
                 return response
 
-        missing_deps, used_deps, locked_deps = self.get_dep_locks(request)
+        missing_deps, used_deps, locked_deps = \
+            await self.get_dep_locks_async(request)
         # Check potential protocol errors and exit
         if missing_deps:
             # Some dependencies are missing but may become available later?
@@ -524,8 +776,8 @@ class VASPPairChannel:
                 my_address = self.get_my_address()
                 other_address = self.get_other_address()
 
-                self.processor.check_command(
-                    my_address, other_address, command)
+                await maybe_await(self.processor.check_command(
+                    my_address, other_address, command))
 
                 response = make_success_response(request)
             except CommandValidationError as e:
@@ -534,16 +786,19 @@ class VASPPairChannel:
                     code=e.error_code,
                     message=e.error_message)
 
-        # Write back to storage
+        # Write back to storage, in a single atomic batch along with
+        # the writes of the processor.
         request.response = response
 
-        self.committed_commands[request.cid] = request
-        self.register_dependencies(request)
-        self.apply_response(request)
+        async with self.storage.transaction_async():
+            await maybe_await(
+                self.committed_commands.put(request.cid, request))
+            await self.register_dependencies(request)
+            await self.apply_response(request)
 
         return request.response
 
-    def register_dependencies(self, request):
+    async def register_dependencies(self, request):
         ''' A helper function to register dependencies
             of a successful request.'''
 
@@ -551,25 +806,29 @@ class VASPPairChannel:
         create_versions = request.command.get_new_object_versions()
         depends_on_version = request.command.get_dependencies()
 
-        assert not any(str(cv) in self.object_locks for cv in create_versions)
+        create_keys = [str(cv) for cv in create_versions]
+        depends_keys = [str(dv) for dv in depends_on_version]
+        assert not any(await maybe_await(
+            self.object_locks.contains_many(create_keys)))
 
         if request.is_success():
-            assert all(str(v) in self.object_locks for v in depends_on_version)
+            assert all(await maybe_await(
+                self.object_locks.contains_many(depends_keys)))
 
-            for dv in depends_on_version:
-                self.object_locks[str(dv)] = LOCK_EXPIRED
-
-            for cv in create_versions:
-                self.object_locks[str(cv)] = LOCK_AVAILABLE
+            await maybe_await(self.object_locks.put_many(
+                [(dv, LOCK_EXPIRED) for dv in depends_keys] +
+                [(cv, LOCK_AVAILABLE) for cv in create_keys]))
 
             logger.debug(f'[{self.role()}] Dependency update: {depends_on_version} -> {create_versions}')
 
         else:
-            for dv in depends_on_version:
-                # The depedency may not be in the locks, since the failure
-                # may have been due to a missing dependency.
-                if str(dv) in self.object_locks and self.object_locks[str(dv)] == request.cid:
-                    self.object_locks[str(dv)] = LOCK_AVAILABLE
+            # The depedency may not be in the locks, since the failure
+            # may have been due to a missing dependency.
+            locks = await maybe_await(self.object_locks.get_many(depends_keys))
+            await maybe_await(self.object_locks.put_many(
+                [(dv, LOCK_AVAILABLE)
+                 for dv, lock in zip(depends_keys, locks)
+                 if lock == request.cid]))
             logger.debug(f'[{self.role()}] Dependency no update: {depends_on_version} -> {create_versions}')
 
 
@@ -577,23 +836,23 @@ class VASPPairChannel:
         """ Parses and handles a JWS signed response.
 
         Args:
-            response_text (str): The response signed using JWS.
+            json_response (str or bytes): The response signed using JWS.
 
         Returns:
             bool: Whether the command was a success or not
         """
         try:
-            vasp = self.vasp
-            other_key = vasp.info_context.get_peer_compliance_verification_key(
+            other_key = self.key_cache.get_peer_compliance_verification_key(
                 self.other_address_str
             )
-            message = await other_key.verify_message(json_response)
-            response = json.loads(message)
+            message = await other_key.verify_message(
+                json_response, executor=self.crypto_executor)
+            response = codec.loads(message)
             response = CommandResponseObject.from_json_data_dict(
                 response, JSONFlag.NET
             )
 
-            return self.handle_response(response)
+            return await self.handle_response_async(response)
 
         except OffChainInvalidSignature as e:
             logger.warning(
@@ -613,6 +872,47 @@ class VASPPairChannel:
             )
             raise e
 
+    async def parse_handle_response_batch(self, json_batch):
+        """ Parses and handles a JWS signed batch of responses, in order.
+
+        Args:
+            json_batch (str or bytes): The batch of responses signed using JWS.
+
+        Raises:
+            OffChainInvalidSignature: If the batch signature is invalid.
+            JSONParsingError: If the batch is malformed.
+
+        Returns:
+            list: For each response, whether the command was a success or
+            not, or the exception raised while handling it.
+        """
+        other_key = self.key_cache.get_peer_compliance_verification_key(
+            self.other_address_str
+        )
+        message = await other_key.verify_message(
+            json_batch, executor=self.crypto_executor)
+        try:
+            items = codec.loads(message)[BATCH_KEY]
+        except (KeyError, TypeError, ValueError) as e:
+            raise JSONParsingError(f'Bad batch: {e}')
+        if not isinstance(items, list):
+            raise JSONParsingError('Batch is not a list')
+
+        results = []
+        for item in items:
+            try:
+                response = CommandResponseObject.from_json_data_dict(
+                    item, JSONFlag.NET
+                )
+                results.append(await self.handle_response_async(response))
+            except (JSONParsingError, OffChainException) as e:
+                logger.warning(
+                    f'(other:{self.other_address_str}) '
+                    f'Batch response error: {e}',
+                )
+                results.append(e)
+        return results
+
     def handle_response(self, response):
         """ Handles a response provided as a dictionary.
 
@@ -626,6 +926,13 @@ class VASPPairChannel:
         Returns:
             bool: Whether the response is successfully sequenced.
         """
+        return self.storage.resolve(self.handle_response_async(response))
+
+    async def handle_response_async(self, response):
+        ''' The coroutine version of ``handle_response``. '''
+        return await self._run_exclusive(self._handle_response, response)
+
+    async def _handle_response(self, response):
         assert isinstance(response, CommandResponseObject)
 
         # Is there was a protocol error return the error.
@@ -635,7 +942,8 @@ class VASPPairChannel:
         request_cid = response.cid
 
         # If we have already processed the response.
-        request = self.committed_commands.try_get(request_cid)
+        request = await maybe_await(
+            self.committed_commands.try_get(request_cid))
         if request:
             # Check the reponse is the same and log warning otherwise.
             if request.response != response:
@@ -645,11 +953,10 @@ class VASPPairChannel:
                 excp.response1 = request.response
                 excp.response2 = response
                 raise excp
-            # This request may have concurrent modification
-            # read db to get latest status
-            return self.committed_commands[request_cid].is_success()
+            return request.is_success()
 
-        request = self.my_pending_requests.try_get(request_cid)
+        request = await maybe_await(
+            self.my_pending_requests.try_get(request_cid))
         if not request:
             raise OffChainException(
                 f'Response for unknown cid {request_cid} received.'
@@ -659,29 +966,38 @@ class VASPPairChannel:
         request.response = response
 
         # Add the next command to the common sequence.
-        self.committed_commands[request.cid] = request
-        del self.my_pending_requests[request_cid]
-        self.register_dependencies(request)
-        self.apply_response(request)
+        async with self.storage.transaction_async():
+            await maybe_await(
+                self.committed_commands.put(request.cid, request))
+            await maybe_await(self.my_pending_requests.delete(request_cid))
+            await maybe_await(self.my_pending_index.discard(request_cid))
+            await self.register_dependencies(request)
+            await self.apply_response(request)
+        self.my_pending_signed.pop(request_cid, None)
         return request.is_success()
 
     def get_retransmit(self, number=1):
         ''' Returns up to a `number` (int) of pending requests
         (CommandRequestObject)'''
-        net_messages = []
-        for next_retransmit in islice(self.my_pending_requests.keys(), number):
-            request_to_send = self.my_pending_requests[next_retransmit]
-            net_messages += [request_to_send]
-        return net_messages
+        return self.storage.resolve(self.get_retransmit_async(number))
+
+    async def get_retransmit_async(self, number=1):
+        ''' The coroutine version of ``get_retransmit``. '''
+        return await self._run_exclusive(self._get_retransmit, number)
+
+    async def _get_retransmit(self, number):
+        return await maybe_await(self.my_pending_requests.get_many(
+            self.my_pending_index.peek(number)))
 
     async def package_retransmit(self, number=1):
         """ Packages up to a `number` (int) of earlier requests without a
-        reply to send to the the  other party. Returns a list of `NetMessage`
-        instances.
+        reply to send to the the  other party, reusing their signed version.
+        Returns a list of `NetMessage` instances.
         """
         return await asyncio.gather(
             *[
-                self.package_request(m) for m in self.get_retransmit(number)
+                self.package_request(m)
+                for m in await self.get_retransmit_async(number)
             ]
         )
 
@@ -689,7 +1005,7 @@ class VASPPairChannel:
         """ Returns true if there are any pending re-transmits, namely
             requests for which the response has not yet been received.
         """
-        return not self.my_pending_requests.is_empty()
+        return not self.my_pending_index.is_empty()
 
     def pending_retransmit_number(self):
         '''
@@ -697,4 +1013,4 @@ class VASPPairChannel:
             the number of requests that are waiting to be
             retransmitted on this channel.
         '''
-        return len(self.my_pending_requests)
+        return len(self.my_pending_index)
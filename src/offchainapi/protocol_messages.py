@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from .utils import JSONSerializable, JSONParsingError, JSONFlag
+from . import codec
 from .errors import OffChainErrorCode, OffChainException, OffChainProtocolError
 
 class OffChainErrorObject(JSONSerializable):
@@ -45,8 +46,7 @@ class OffChainErrorObject(JSONSerializable):
             data_dict['message'] = self.message
 
         if __debug__:
-            import json
-            assert json.dumps(data_dict)
+            assert codec.dumps_bytes(data_dict)
         return data_dict
 
     @classmethod
@@ -211,8 +211,7 @@ class CommandResponseObject(JSONSerializable):
 
         self.add_object_type(data_dict)
         if __debug__:
-            import json
-            assert json.dumps(data_dict)
+            assert codec.dumps_bytes(data_dict)
 
         return data_dict
 
@@ -0,0 +1,268 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from .storage import maybe_await
+
+from collections import namedtuple
+from heapq import heappush, heappop
+from itertools import count
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(name='libra_off_chain_api.retransmit')
+
+
+""" The configuration of the retransmission of requests without a response.
+All times are in seconds. """
+RetransmitConfig = namedtuple('RetransmitConfig', [
+    'initial_delay',  # Time before the first retransmission of a request
+    'max_delay',      # The longest time between two retransmissions
+    'multiplier',     # The factor applied to the delay after each attempt
+    'jitter',         # The fraction of the delay that is randomized
+    'concurrency',    # Max number of retransmissions in flight to each peer
+], defaults=[2.0, 60.0, 2.0, 0.2, 8])
+
+
+""" The statistics of the retransmission of requests. """
+RetransmitStats = namedtuple('RetransmitStats', [
+    'scheduled',    # The number of requests scheduled for retransmission
+    'in_flight',    # The number of retransmissions in flight
+    'sent',         # The number of retransmissions sent
+    'failed',       # The number of retransmissions that failed
+    'signed',       # The number of requests signed for retransmission
+])
+
+
+class _Entry:
+    ''' A request scheduled for retransmission. '''
+
+    __slots__ = ('other_addr', 'cid', 'due', 'attempt', 'sending')
+
+    def __init__(self, other_addr, cid):
+        self.other_addr = other_addr  # The LibraAddress of the other VASP
+        self.cid = cid                # The cid of the request
+        self.due = None               # The time of the next retransmission
+        self.attempt = 0              # The number of retransmissions
+        self.sending = False          # Whether a retransmission is in flight
+
+
+class RetransmitScheduler:
+    """ Retransmits the requests of a VASP that have not received a
+    response, when they are due.
+
+    Requests are kept in a heap keyed by the time of their next
+    retransmission, and a single task sleeps until the earliest one is due
+    or a request is scheduled. Each retransmission of a request that
+    remains pending delays the next one exponentially, up to `max_delay`
+    and with random jitter, and at most `concurrency` retransmissions are
+    in flight to each peer VASP. The signed requests kept by the channels
+    are sent again as they are, so that they are signed at most once.
+
+    Requests are scheduled with `schedule` when they are sequenced, and
+    all the pending requests of the channels of the VASP (for example
+    those persisted before a restart) are scheduled when the scheduler
+    starts, at the next retry time recorded in the pending index of their
+    channel: at once for requests not retransmitted yet. Requests that
+    received a response are dropped when they are due.
+
+    Args:
+        vasp (OffChainVASP): The OffChainVASP whose requests to retransmit.
+        send (coroutine function): Sends a signed request to another VASP,
+            given its LibraAddress and the request.
+        config (RetransmitConfig, optional): The configuration of the
+            retransmissions. Defaults to RetransmitConfig().
+        clock (callable, optional): Returns the current time in seconds.
+            Defaults to ``time.monotonic``.
+    """
+
+    def __init__(self, vasp, send, config=None, clock=time.monotonic):
+        self.vasp = vasp
+        self.send = send
+        self.config = config if config else RetransmitConfig()
+        self.clock = clock
+
+        # Map: (peer address str, cid) -> _Entry
+        self.entries = {}
+        # Heap of (due time, sequence number, (peer address str, cid))
+        self.heap = []
+        self.sequence = count()
+
+        # Map: peer address str -> asyncio.Semaphore
+        self.semaphores = {}
+        self.wakeup = None
+        self.task = None
+        self.send_tasks = set()
+
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.signed = 0
+
+    def stats(self):
+        ''' Returns the RetransmitStats of the scheduler. '''
+        return RetransmitStats(
+            len(self.entries), self.in_flight, self.sent, self.failed,
+            self.signed)
+
+    def backoff(self, attempt):
+        ''' Returns the delay before the retransmission following a
+            number of attempts.
+
+        Args:
+            attempt (int): The number of retransmissions so far.
+
+        Returns:
+            float: The delay in seconds.
+        '''
+        config = self.config
+        delay = min(
+            config.max_delay,
+            config.initial_delay * config.multiplier ** attempt)
+        return delay * (1.0 - config.jitter * random.random())
+
+    def schedule(self, other_addr, cid, delay=None):
+        ''' Schedules the retransmission of a request.
+
+        Args:
+            other_addr (LibraAddress): The LibraAddress of the other VASP.
+            cid (str): The cid of the request.
+            delay (float, optional): The time until the retransmission.
+                Defaults to the `initial_delay` of the configuration.
+        '''
+        key = (other_addr.as_str(), cid)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = _Entry(other_addr, cid)
+            self.entries[key] = entry
+
+        if delay is None:
+            delay = self.config.initial_delay
+        self._push(key, entry, self.clock() + delay)
+
+    async def schedule_pending(self):
+        ''' Schedules all the pending requests of the channels of the VASP
+            to be retransmitted at their next retry time. '''
+        for channel in list(self.vasp.channel_store.values()):
+            if not getattr(channel, 'loaded', True):
+                await channel.load_async()
+        now = time.time()
+        for channel in list(self.vasp.channel_store.values()):
+            other_addr = channel.get_other_address()
+            index = channel.my_pending_index
+            for cid in index.keys():
+                delay = max(0.0, index.next_retry(cid) - now)
+                self.schedule(other_addr, cid, delay=delay)
+
+    def start(self, loop):
+        ''' Starts retransmitting requests in the event loop.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The event loop.
+        '''
+        self.task = loop.create_task(self.run())
+
+    async def close(self):
+        ''' Stops retransmitting requests. '''
+        tasks = list(self.send_tasks)
+        if self.task is not None:
+            tasks += [self.task]
+            self.task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self):
+        ''' Retransmits the requests when they are due, until cancelled. '''
+        logger.info('Start Retransmit Scheduler.')
+        self.wakeup = asyncio.Event()
+        await self.schedule_pending()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                now = self.clock()
+                while self.heap and self.heap[0][0] <= now:
+                    due, _, key = heappop(self.heap)
+                    entry = self.entries.get(key)
+                    if entry is None or entry.due != due or entry.sending:
+                        continue
+                    entry.sending = True
+                    task = loop.create_task(self._retransmit(key, entry))
+                    self.send_tasks.add(task)
+                    task.add_done_callback(self.send_tasks.discard)
+
+                timeout = self.heap[0][0] - now if self.heap else None
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.wakeup = None
+            logger.info('Stop Retransmit Scheduler')
+
+    def _push(self, key, entry, due):
+        entry.due = due
+        heappush(self.heap, (due, next(self.sequence), key))
+        if self.wakeup is not None and self.heap[0][2] is key:
+            self.wakeup.set()
+
+    async def _retransmit(self, key, entry):
+        channel = self.vasp.get_channel(entry.other_addr)
+        try:
+            if entry.cid not in channel.my_pending_index:
+                self.entries.pop(key, None)
+                return
+
+            semaphore = self.semaphores.get(key[0])
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.config.concurrency)
+                self.semaphores[key[0]] = semaphore
+
+            async with semaphore:
+                content = channel.my_pending_signed.get(entry.cid)
+                if content is None:
+                    request = await maybe_await(
+                        channel.my_pending_requests.try_get(entry.cid))
+                    if request is None:
+                        self.entries.pop(key, None)
+                        return
+                    content = (await channel.package_request(request)).content
+                    self.signed += 1
+
+                self.in_flight += 1
+                self.sent += 1
+                try:
+                    await self.send(entry.other_addr, content)
+                except Exception as e:
+                    self.failed += 1
+                    logger.debug(
+                        f'Attempt {entry.attempt + 1} to re-transmit request '
+                        f'{entry.cid} failed with error: {e}'
+                    )
+                finally:
+                    self.in_flight -= 1
+
+            entry.attempt += 1
+            # Check the request is still pending and record its next retry
+            # time under the lock of the channel, so that the write cannot
+            # land after a response removed the request from storage.
+            run_exclusive = getattr(channel, '_run_exclusive', None)
+            if run_exclusive is None:
+                await self._reschedule(channel, key, entry)
+            else:
+                await run_exclusive(self._reschedule, channel, key, entry)
+        finally:
+            entry.sending = False
+
+    async def _reschedule(self, channel, key, entry):
+        if entry.cid not in channel.my_pending_index:
+            self.entries.pop(key, None)
+            return
+        delay = self.backoff(entry.attempt)
+        self._push(key, entry, self.clock() + delay)
+        await maybe_await(channel.my_pending_index.set_next_retry(
+            entry.cid, time.time() + delay))
@@ -0,0 +1,493 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+""" A multi-process VASP server, whose channels are sharded across worker
+processes by the address of the other VASP. """
+
+from .core import VASPPaymentTimeout
+from .libra_address import LibraAddress, LibraAddressError
+from .asyncnet import X_REQUEST_ID_KEY, X_BATCH_KEY, get_headers
+from .utils import JSONSerializable, JSONFlag
+from .payment import PaymentObject
+
+from hashlib import sha256
+from urllib.parse import quote
+from aiohttp import web
+from aiohttp.client_exceptions import ClientError
+import aiohttp
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import secrets
+
+logger = logging.getLogger(name='libra_off_chain_api.sharded')
+
+
+# The prefix of the routes used by the front server to control workers.
+SHARD_PREFIX = '/shard'
+
+# The header with the secret shared by the front server and the workers,
+# which the control routes require.
+X_SHARD_SECRET_KEY = 'X-OFFCHAIN-SHARD-SECRET'
+
+# The headers of worker responses passed back to the other VASP.
+FORWARDED_HEADERS = (X_REQUEST_ID_KEY, X_BATCH_KEY, 'CONTENT-TYPE')
+
+# The longest time in seconds a worker waits for the outcome of a payment
+# in one control request, after which the front server asks again.
+MAX_OUTCOME_WAIT = 30.0
+
+
+def shard_of(other_addr, shards):
+    ''' Returns the shard that owns the channel with another VASP. It only
+        depends on the on-chain address of the other VASP, and is the same
+        in all processes (unlike the built-in `hash`).
+
+    Args:
+        other_addr (LibraAddress): The LibraAddress of the other VASP.
+        shards (int): The number of shards.
+
+    Returns:
+        int: The shard, between 0 and `shards` - 1.
+    '''
+    digest = sha256(other_addr.onchain_address_bytes).digest()
+    return int.from_bytes(digest[:8], 'big') % shards
+
+
+class ShardWorker:
+    """ Serves the control routes of a worker process, through which the
+    front server sends commands and looks up payments in the VASP of the
+    worker. The routes are added to the application of the VASP, and
+    reject with 403 Forbidden the requests without the secret shared with
+    the front server, in the `X_SHARD_SECRET_KEY` header.
+
+    Args:
+        vasp (Vasp): The VASP of the worker.
+        shard (int): The shard owned by the worker.
+        shards (int): The number of shards.
+        secret (str): The secret shared with the front server.
+        max_outcome_wait (float, optional): The longest time in seconds to
+            wait for the outcome of a payment in one request. Defaults to
+            MAX_OUTCOME_WAIT.
+    """
+
+    def __init__(self, vasp, shard, shards, secret,
+                 max_outcome_wait=MAX_OUTCOME_WAIT):
+        self.vasp = vasp
+        self.shard = shard
+        self.shards = shards
+        self.secret = secret.encode('utf-8')
+        self.max_outcome_wait = max_outcome_wait
+
+    def routes(self):
+        ''' Returns the control routes of the worker. '''
+        return [
+            web.get(f'{SHARD_PREFIX}/ping',
+                    self._authenticated(self.handle_ping)),
+            web.post(f'{SHARD_PREFIX}/command',
+                     self._authenticated(self.handle_command)),
+            web.get(f'{SHARD_PREFIX}/payment/{{ref}}',
+                    self._authenticated(self.handle_payment)),
+            web.get(f'{SHARD_PREFIX}/history/{{ref}}',
+                    self._authenticated(self.handle_history)),
+            web.get(f'{SHARD_PREFIX}/outcome/{{ref}}',
+                    self._authenticated(self.handle_outcome)),
+            web.post(f'{SHARD_PREFIX}/stop',
+                     self._authenticated(self.handle_stop)),
+        ]
+
+    def _authenticated(self, handler):
+        ''' Wraps a handler to require the secret of the front server. '''
+        async def check_secret(request):
+            secret = request.headers.get(X_SHARD_SECRET_KEY, '')
+            if not hmac.compare_digest(secret.encode('utf-8'), self.secret):
+                raise web.HTTPForbidden()
+            return await handler(request)
+        return check_secret
+
+    async def handle_ping(self, request):
+        return web.json_response({'shard': self.shard})
+
+    async def handle_command(self, request):
+        data = await request.json()
+        addr = LibraAddress.from_encoded_str(data['addr'])
+        if shard_of(addr, self.shards) != self.shard:
+            raise web.HTTPBadRequest(reason=f'Not the shard of {data["addr"]}')
+
+        command = JSONSerializable.parse(data['command'], JSONFlag.STORE)
+        result = await self.vasp.new_command_async(addr, command)
+        if isinstance(result, bool):
+            return web.json_response({'result': result})
+        # The request to retransmit after a network failure.
+        return web.json_response({'request': result})
+
+    async def handle_payment(self, request):
+        try:
+            payment = await self.vasp.get_payment_by_ref_async(
+                request.match_info['ref'])
+        except KeyError:
+            raise web.HTTPNotFound()
+        return web.json_response(payment.get_json_data_dict(JSONFlag.STORE))
+
+    async def handle_history(self, request):
+        try:
+            history = await self.vasp.get_payment_history_by_ref_async(
+                request.match_info['ref'])
+        except KeyError:
+            raise web.HTTPNotFound()
+        return web.json_response(
+            [payment.get_json_data_dict(JSONFlag.STORE) for payment in history])
+
+    async def handle_outcome(self, request):
+        # Wait for a bounded time, so that waits the front server gave up
+        # on do not stay pending here.
+        timeout = request.query.get('timeout')
+        timeout = self.max_outcome_wait if timeout is None else \
+            min(float(timeout), self.max_outcome_wait)
+        try:
+            payment = await self.vasp.wait_for_payment_outcome_async(
+                request.match_info['ref'], timeout)
+        except (VASPPaymentTimeout, KeyError):
+            raise web.HTTPGatewayTimeout()
+        return web.json_response(payment.get_json_data_dict(JSONFlag.STORE))
+
+    async def handle_stop(self, request):
+        loop = asyncio.get_running_loop()
+        # Close once the response is sent.
+        loop.call_later(0.1, loop.create_task, self.vasp.close_async())
+        return web.json_response({'shard': self.shard})
+
+
+def _worker_main(vasp_factory, shard, shards, host, port, secret):
+    ''' The main function of a worker process. '''
+    loop = asyncio.new_event_loop()
+    vasp = vasp_factory(shard, host, port)
+    worker = ShardWorker(vasp, shard, shards, secret)
+    vasp.net_handler.app.add_routes(worker.routes())
+
+    vasp.set_loop(loop)
+    vasp.start_services()
+    logger.info(f'Shard {shard} serving on {host}:{port}')
+    try:
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+class ShardedVasp:
+    """ Runs the channels of a VASP in several worker processes, each one
+    owning the channels with the other VASPs of its shard (see `shard_of`),
+    to use several cores.
+
+    Each worker runs its own Vasp, made by `vasp_factory`, listening on
+    `worker_host` (by default on the loopback interface) and the port
+    `worker_port` + shard. The Vasp of each worker must use its own
+    database, and send requests to other VASPs directly. A front server,
+    listening on `host` and `port`, forwards the requests of each other
+    VASP to the worker that owns its channel, and commands, payment
+    lookups and outcomes are routed to the workers in the same way, with
+    a secret made for each ShardedVasp (see `ShardWorker`).
+
+    The Vasp of a worker is made in the worker process, so `vasp_factory`
+    must be picklable (for example a module level function) with the
+    'spawn' start method.
+
+    Args:
+        my_addr (LibraAddress): The address of the VASP.
+        host (str): The host name the front server listens on.
+        port (int): The port the front server listens on.
+        vasp_factory (callable): Returns the Vasp of a worker, given its
+            shard, host and port.
+        shards (int, optional): The number of worker processes.
+            Defaults to 2.
+        worker_host (str, optional): The host name workers listen on.
+            Defaults to '127.0.0.1'.
+        worker_port (int, optional): The port of the first worker.
+            Defaults to `port` + 1.
+        start_method (str, optional): The multiprocessing start method.
+            Defaults to 'spawn'.
+    """
+
+    def __init__(self, my_addr, host, port, vasp_factory, shards=2,
+                 worker_host='127.0.0.1', worker_port=None,
+                 start_method='spawn'):
+        self.my_addr = my_addr
+        self.host = host
+        self.port = port
+        self.vasp_factory = vasp_factory
+        self.shards = shards
+        self.worker_host = worker_host
+        self.worker_port = worker_port if worker_port else port + 1
+        self.context = multiprocessing.get_context(start_method)
+
+        # The secret that authenticates the control requests to workers.
+        self.secret = secrets.token_urlsafe(32)
+        self.control_headers = {X_SHARD_SECRET_KEY: self.secret}
+
+        self.processes = []
+        self.session = None
+        self.runner = None
+        self.site = None
+
+        self.app = web.Application()
+        route = f'/v1/{self.my_addr.as_str()}/{{other_addr}}/{{end_point}}'
+        self.app.add_routes([web.post(route, self.handle_request)])
+
+    def get_worker_url(self, shard):
+        ''' Returns the base URL of the worker of a shard. '''
+        return f'http://{self.worker_host}:{self.worker_port + shard}'
+
+    def shard_of(self, other_addr):
+        ''' Returns the shard that owns the channel with another VASP. '''
+        return shard_of(other_addr, self.shards)
+
+    async def start_async(self, timeout=30.0):
+        ''' Starts the worker processes, waits until they serve requests,
+            and starts the front server.
+
+        Args:
+            timeout (float, optional): The time in seconds to wait for the
+                workers. Defaults to 30.0.
+        '''
+        for shard in range(self.shards):
+            process = self.context.Process(
+                target=_worker_main,
+                args=(self.vasp_factory, shard, self.shards,
+                      self.worker_host, self.worker_port + shard,
+                      self.secret),
+                daemon=True,
+            )
+            process.start()
+            self.processes += [process]
+
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0))
+        await asyncio.wait_for(
+            asyncio.gather(*[self._wait_for_worker(shard)
+                             for shard in range(self.shards)]),
+            timeout)
+
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        self.site = web.TCPSite(self.runner, self.host, self.port)
+        await self.site.start()
+        logger.info(
+            f'Sharded VASP serving on {self.host}:{self.port} '
+            f'with {self.shards} workers')
+
+    async def _wait_for_worker(self, shard):
+        url = f'{self.get_worker_url(shard)}{SHARD_PREFIX}/ping'
+        while True:
+            if not self.processes[shard].is_alive():
+                raise RuntimeError(f'Worker of shard {shard} exited')
+            try:
+                async with self.session.get(
+                        url, headers=self.control_headers) as response:
+                    if response.status == 200:
+                        return
+            except ClientError:
+                pass
+            await asyncio.sleep(0.05)
+
+    async def close_async(self, timeout=5.0):
+        ''' Stops the front server and the worker processes. '''
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+        for shard in range(len(self.processes)):
+            url = f'{self.get_worker_url(shard)}{SHARD_PREFIX}/stop'
+            try:
+                async with self.session.post(
+                        url, headers=self.control_headers) as response:
+                    await response.read()
+            except ClientError:
+                pass
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+    async def handle_request(self, request):
+        """ Forwards a request of another VASP to the worker that owns
+        its channel, and returns the response of the worker.
+
+        Args:
+            request (aiohttp.web.Request): The request from the other VASP.
+
+        Raises:
+            aiohttp.web.HTTPBadRequest: An exception for 400 Bad Request.
+            aiohttp.web.HTTPBadGateway: If the worker is unreachable.
+
+        Returns:
+            aiohttp.web.Response: The response of the worker.
+        """
+        try:
+            other_addr = LibraAddress.from_encoded_str(
+                request.match_info['other_addr'])
+        except LibraAddressError:
+            raise web.HTTPBadRequest(reason='Invalid address')
+
+        shard = self.shard_of(other_addr)
+        url = f'{self.get_worker_url(shard)}{request.rel_url}'
+        headers = {k: v for k, v in get_headers(request).items()
+                   if k in FORWARDED_HEADERS}
+        try:
+            async with self.session.post(
+                    url, data=await request.read(), headers=headers
+            ) as response:
+                body = await response.read()
+                response_headers = {
+                    k: v for k, v in get_headers(response).items()
+                    if k in FORWARDED_HEADERS}
+                return web.Response(
+                    status=response.status, body=body,
+                    headers=response_headers)
+        except ClientError as e:
+            logger.error(f'Worker of shard {shard} unreachable: {e}')
+            raise web.HTTPBadGateway()
+
+    async def _get(self, shard, path):
+        url = f'{self.get_worker_url(shard)}{SHARD_PREFIX}/{path}'
+        async with self.session.get(
+                url, headers=self.control_headers) as response:
+            if response.status == 404:
+                return None
+            if response.status == 504:
+                raise asyncio.TimeoutError()
+            response.raise_for_status()
+            return await response.json()
+
+    async def new_command_async(self, addr, cmd):
+        ''' Sends a new command to the other VASP, through the worker that
+            owns its channel (see `Vasp.new_command_async`).
+
+            Parameters:
+                addr (LibraAddress) : The address of the VASP to which to
+                    send the command.
+                cmd (PaymentCommand) : A payment command instance.
+
+            Returns:
+                A Bool indicating whether the sequenced command was
+                successful or not, or in case of a network failure the
+                signed request to be retransmitted.
+        '''
+        shard = self.shard_of(addr)
+        url = f'{self.get_worker_url(shard)}{SHARD_PREFIX}/command'
+        data = {
+            'addr': addr.as_str(),
+            'command': cmd.get_json_data_dict(JSONFlag.STORE),
+        }
+        async with self.session.post(
+                url, json=data, headers=self.control_headers) as response:
+            response.raise_for_status()
+            result = await response.json()
+        if 'result' in result:
+            return result['result']
+        return result['request']
+
+    async def get_payment_by_ref_async(self, reference_id):
+        """ Returns the latest version of the PaymentObject with the given
+            reference ID, from the worker that stores it.
+
+            Raises:
+                KeyError: In case a payment with the given reference
+                    does not exist.
+        """
+        shard, data = await self._find_payment(reference_id)
+        if data is None:
+            raise KeyError(reference_id)
+        return PaymentObject.parse(data, JSONFlag.STORE)
+
+    async def get_payment_history_by_ref_async(self, reference_id):
+        """ Returns the list of versions of the PaymentObjects with the
+            given reference ID, newest first (see
+            `Vasp.get_payment_history_by_ref`).
+
+            Raises:
+                KeyError: In case a payment with the given reference
+                    does not exist.
+        """
+        shard, data = await self._find_payment(reference_id)
+        if data is None:
+            raise KeyError(reference_id)
+        history = await self._get(shard, f'history/{quote(reference_id, safe="")}')
+        return [PaymentObject.parse(data, JSONFlag.STORE) for data in history]
+
+    async def wait_for_payment_outcome_async(self, reference_id, timeout=None):
+        ''' Awaits until the payment with the given reference_id is
+        ready_for_settlement or aborted and returns the payment object
+        at that version (see `Vasp.wait_for_payment_outcome_async`).
+
+        The outcome is awaited in the worker that stores the payment, or
+        in all workers if no worker stores it yet. Workers wait for at most
+        MAX_OUTCOME_WAIT seconds per request, and are asked again until
+        the timeout.
+
+        Raises:
+            VASPPaymentTimeout: On timeout, with the latest version of
+                the payment, if any.
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        shard, _ = await self._find_payment(reference_id)
+        shards = [shard] if shard is not None else range(self.shards)
+        tasks = [asyncio.ensure_future(
+            self._poll_outcome(s, reference_id, deadline)) for s in shards]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=timeout):
+                try:
+                    data = await next_done
+                except asyncio.TimeoutError:
+                    break
+                if data is not None:
+                    return PaymentObject.parse(data, JSONFlag.STORE)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        logger.info(f'Timeout for payment {reference_id}')
+        try:
+            latest_version = await self.get_payment_by_ref_async(reference_id)
+        except KeyError:
+            latest_version = None
+        raise VASPPaymentTimeout(latest_version)
+
+    async def _poll_outcome(self, shard, reference_id, deadline):
+        ''' Asks the worker of a shard for the outcome of a payment until
+            it has one, or until the deadline (in loop time) if any. '''
+        loop = asyncio.get_running_loop()
+        path = f'outcome/{quote(reference_id, safe="")}'
+        while True:
+            query = ''
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                query = f'?timeout={remaining}'
+            try:
+                return await self._get(shard, path + query)
+            except asyncio.TimeoutError:
+                continue
+
+    async def _find_payment(self, reference_id):
+        ''' Returns the shard storing a payment and its latest version,
+            or (None, None) if no worker stores it. '''
+        results = await asyncio.gather(*[
+            self._get(shard, f'payment/{quote(reference_id, safe="")}')
+            for shard in range(self.shards)])
+        for shard, data in enumerate(results):
+            if data is not None:
+                return shard, data
+        return None, None
@@ -18,38 +18,58 @@ class SharedObject(JSONSerializable):
     Once stored an object with a specific version must never change, rather
     a command should be defined and sequenced that takes this object as
     input and generated a new version of this object or other objects.
+
+    Subclasses that define `__slots__` must include slots for `version` and
+    `previous_version`.
     """
 
+    __slots__ = ()
+
     def __init__(self):
         ''' All objects have a version number and their commit status. '''
         self.version = get_unique_string()
         self.previous_version = None  # Stores previous version of the object.
 
-    def new_version(self, new_version=None, store=None):
-        """ Make a deep copy of an object with a new version number.
+    def copy(self, store=None):
+        """ Make a copy of the object, that can be changed without changing
+        this object. Subclasses may override this with a cheaper copy.
 
         Args:
-            new_version (str, optional): a specific new version string
-                  to use otherwise a fresh random new version is used.
-                  Defaults to None.
-            store (dict-like, optional): a persistant store that given
+            store (StorableDict, optional): a persistant store that given
                   a version number key, returns a *fresh* instance of
-                  the object.
+                  the object through ``try_get(version, fresh=True)``.
 
         Returns:
-            SharedObject: The new shared obeject.
+            SharedObject: The copy of the object.
         """
 
         # This is an optimization: it turns out python deepcopy is EXTREMELY slow.
-        # Whereas json parsing with ujson is relatively fast. So if we have a store,
-        # and are creating a new version of the object, we can copy the full state
-        # from the store. If not we do the slower deep copy.
+        # Whereas json parsing (see codec) is relatively fast. So if we have a store,
+        # we can copy the full state from the store. If not we do the slower
+        # deep copy.
         clone = None
         if store is not None:
-            clone = store.try_get(self.version)
+            clone = store.try_get(self.version, fresh=True)
 
         if not clone:
             clone = deepcopy(self)
+        return clone
+
+    def new_version(self, new_version=None, store=None):
+        """ Make a copy of an object with a new version number.
+
+        Args:
+            new_version (str, optional): a specific new version string
+                  to use otherwise a fresh random new version is used.
+                  Defaults to None.
+            store (StorableDict, optional): a persistant store that given
+                  a version number key, returns a *fresh* instance of
+                  the object (see ``copy``).
+
+        Returns:
+            SharedObject: The new shared obeject.
+        """
+        clone = self.copy(store)
 
         clone.previous_version = self.get_version()
         clone.version = new_version
@@ -0,0 +1,164 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from .database import Database
+
+import sqlite3
+
+
+# The values accepted by the SQLite `synchronous` pragma, from fastest
+# (least durable) to slowest (most durable).
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# All statements are kept as module constants: the sqlite3 module caches
+# prepared statements by their SQL text, so each is only compiled once
+# per connection.
+_CREATE_TABLE = '''CREATE TABLE IF NOT EXISTS kv (
+    prefix TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (prefix, key)
+)'''
+_CREATE_INDEX = 'CREATE INDEX IF NOT EXISTS kv_prefix ON kv (prefix)'
+
+_GET = 'SELECT value FROM kv WHERE prefix = ? AND key = ?'
+_PUT = '''INSERT INTO kv (prefix, key, value) VALUES (?, ?, ?)
+    ON CONFLICT (prefix, key) DO UPDATE SET value = excluded.value'''
+_DELETE = 'DELETE FROM kv WHERE prefix = ? AND key = ?'
+_ISIN = 'SELECT 1 FROM kv WHERE prefix = ? AND key = ?'
+_GETKEYS = 'SELECT key FROM kv WHERE prefix = ? ORDER BY rowid'
+_COUNT = 'SELECT COUNT(*) FROM kv WHERE prefix = ?'
+
+# The bulk reads look up keys in chunks of at most _MANY_CHUNK keys, with
+# one statement per chunk size, below the default limit of 999 variables.
+_MANY_CHUNK = 256
+_GET_MANY = 'SELECT key, value FROM kv WHERE prefix = ? AND key IN ({})'
+_ISIN_MANY = 'SELECT key FROM kv WHERE prefix = ? AND key IN ({})'
+
+
+class SQLiteDB(Database):
+    """ A durable implementation of the ``Database`` interface backed by
+    SQLite (using the standard library ``sqlite3`` module).
+
+    All entries live in a single ``(prefix, key, value)`` table. The primary
+    key serves point lookups and a separate index on ``prefix`` serves
+    ``getkeys`` and ``count``, so neither scans other prefixes. Keys of a
+    prefix are returned in insertion order. The bulk operations look up
+    keys with one statement per chunk of keys, and write them with a single
+    ``executemany``.
+
+    The database runs in WAL mode, so that readers do not block the writer
+    and each commit is a sequential append to the log. Outside a
+    transaction each write is committed on its own; use ``transaction()``
+    to commit a group of writes at once.
+
+    Args:
+        path (str): The file holding the database. Defaults to
+            ``':memory:'``, a private in-memory database (WAL mode does
+            not apply to in-memory databases).
+        synchronous (str): The SQLite synchronous level, one of
+            ``SYNCHRONOUS_LEVELS``. ``'FULL'`` makes every commit durable
+            against power loss; ``'NORMAL'`` (the default) only guarantees
+            consistency, and may lose the last commits on power loss, but
+            is much faster in WAL mode; ``'OFF'`` leaves syncing to the OS.
+        cached_statements (int): The number of prepared statements that the
+            connection keeps cached. Defaults to 64.
+
+    The connection may be created on one thread and used from another
+    (e.g. the thread running the event loop), but it must only be used by
+    one thread at a time.
+    """
+
+    def __init__(self, path=':memory:', synchronous='NORMAL',
+                 cached_statements=64):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(
+                f'Unknown synchronous level {synchronous}, expected '
+                f'one of: {", ".join(SYNCHRONOUS_LEVELS)}'
+            )
+
+        self.path = path
+        self.synchronous = synchronous
+
+        # Use autocommit mode: we explicitly manage transactions.
+        self.conn = sqlite3.connect(
+            path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=cached_statements
+        )
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(f'PRAGMA synchronous={synchronous}')
+        self.conn.execute(_CREATE_TABLE)
+        self.conn.execute(_CREATE_INDEX)
+
+    def begin(self):
+        self.conn.execute('BEGIN')
+
+    def commit(self):
+        self.conn.execute('COMMIT')
+
+    def rollback(self):
+        self.conn.execute('ROLLBACK')
+
+    def close(self):
+        ''' Closes the underlying connection. '''
+        self.conn.close()
+
+    def get(self, prefix, key):
+        row = self.conn.execute(_GET, (prefix, key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def try_get(self, prefix, key):
+        row = self.conn.execute(_GET, (prefix, key)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def put(self, prefix, key, val):
+        self.conn.execute(_PUT, (prefix, key, val))
+
+    def delete(self, prefix, key):
+        cursor = self.conn.execute(_DELETE, (prefix, key))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def isin(self, prefix, key):
+        return self.conn.execute(_ISIN, (prefix, key)).fetchone() is not None
+
+    def getkeys(self, prefix):
+        return [row[0] for row in self.conn.execute(_GETKEYS, (prefix,))]
+
+    def count(self, prefix):
+        return self.conn.execute(_COUNT, (prefix,)).fetchone()[0]
+
+    def _select_many(self, sql, prefix, keys):
+        ''' Runs a bulk read statement over chunks of keys, and returns
+            its rows. '''
+        keys = list(keys)
+        rows = []
+        for start in range(0, len(keys), _MANY_CHUNK):
+            chunk = keys[start:start + _MANY_CHUNK]
+            statement = sql.format(','.join('?' * len(chunk)))
+            rows += self.conn.execute(statement, [prefix] + chunk).fetchall()
+        return rows
+
+    def get_many(self, prefix, keys):
+        keys = list(keys)
+        values = dict(self._select_many(_GET_MANY, prefix, keys))
+        return [values.get(key) for key in keys]
+
+    def put_many(self, prefix, items):
+        self.conn.executemany(
+            _PUT, [(prefix, key, val) for key, val in items])
+
+    def delete_many(self, prefix, keys):
+        self.conn.executemany(_DELETE, [(prefix, key) for key in keys])
+
+    def contains_many(self, prefix, keys):
+        keys = list(keys)
+        found = {row[0] for row in self._select_many(_ISIN_MANY, prefix, keys)}
+        return [key in found for key in keys]
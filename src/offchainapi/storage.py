@@ -3,10 +3,13 @@
 
 # The main storage interface.
 from hashlib import sha256
-import json
-
+from collections import OrderedDict
+from itertools import islice
+from contextlib import contextmanager, asynccontextmanager
+from inspect import iscoroutine
 from .utils import JSONFlag, JSONSerializable, get_unique_string
-from .database import Database
+from .database import Database, AsyncDatabase
+from . import codec
 
 
 def key_join(strs):
@@ -15,6 +18,32 @@ def key_join(strs):
     return '||'.join([f'[{len(s)}:{s}]' for s in strs])
 
 
+async def maybe_await(value):
+    ''' Awaits a coroutine, such as one returned by an asynchronous
+        storable, and returns any other value as it is. Code written with
+        it works with both synchronous and asynchronous storables. '''
+    if iscoroutine(value):
+        return await value
+    return value
+
+
+def run_sync(coro):
+    ''' Runs a coroutine that never suspends, such as one that only calls
+        synchronous storables, to completion and returns its result.
+
+        Raises:
+            RuntimeError: If the coroutine suspends, since it then needs
+                to run in an event loop.
+    '''
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError(
+        'The coroutine suspended: with an AsyncDatabase it must be awaited.')
+
+
 class Storable:
     """Base class for objects that can be stored.
 
@@ -30,7 +59,7 @@ class Storable:
         """ Pre-processing of objects before storage. By default
             it calls get_json_data_dict for JSONSerializable objects or
             their base type. eg int('10'). The result must be a structure
-            that can be passed to json.dumps.
+            that can be passed to codec.dumps.
         """
         if issubclass(self.xtype, JSONSerializable):
             return val.get_json_data_dict(JSONFlag.STORE)
@@ -54,13 +83,75 @@ class StorableFactory:
     types that can be stored persistently.
 
     Initialize the ``StorableFactory`` with a persistent key-value
-    store ``db``, which is an implementation of ``Database``.
+    store ``db``, which is an implementation of ``Database``, or of
+    ``AsyncDatabase``. In the latter case the factory makes an
+    ``AsyncStorableDict`` for each dictionary, whose methods are
+    coroutines, and ``transaction_async`` must be used for transactions.
+    Code that accepts either kind awaits storage calls with
+    ``maybe_await``, and is run by ``resolve``.
     '''
 
     def __init__(self, db):
-        assert isinstance(db, Database)
+        assert isinstance(db, (Database, AsyncDatabase))
         self.db = db
+        self.is_async = isinstance(db, AsyncDatabase)
+
+        # The dictionaries with a cache, to clear on rollback.
+        self.cached_dicts = []
+
+        # The pending indexes, to reload on rollback.
+        self.indexes = []
 
+    @contextmanager
+    def transaction(self):
+        ''' Returns a context manager that groups all writes to storables
+            made by this factory into one atomic batch, committed on exit.
+            Transactions may be nested, in which case only the outermost
+            one commits.
+
+            Example:
+                with factory.transaction():
+                    d1['x'] = 10
+                    d2['y'] = 20
+        '''
+        try:
+            with self.db.transaction():
+                yield self
+        except BaseException:
+            # Values read within the transaction may have been rolled back.
+            for storable in self.cached_dicts:
+                storable.cache_clear()
+            for index in self.indexes:
+                index.reload()
+            raise
+
+    @asynccontextmanager
+    async def transaction_async(self):
+        ''' Returns an asynchronous context manager that groups all writes
+            to storables made by this factory into one atomic batch, as
+            ``transaction``, for both kinds of databases. '''
+        if not self.is_async:
+            with self.transaction():
+                yield self
+            return
+
+        try:
+            async with self.db.transaction():
+                yield self
+        except BaseException:
+            for storable in self.cached_dicts:
+                storable.cache_clear()
+            for index in self.indexes:
+                await index.reload()
+            raise
+
+    def resolve(self, coro):
+        ''' Runs a coroutine that makes storage calls through ``maybe_await``
+            to completion, and returns its result, if the database is
+            synchronous. Otherwise returns the coroutine, to be awaited. '''
+        if self.is_async:
+            return coro
+        return run_sync(coro)
 
     def make_dir(self, name, root=None):
         ''' Makes a new value-like storable.
@@ -75,7 +166,7 @@ class StorableFactory:
         v.factory = self
         return v
 
-    def make_dict(self, name, xtype, root):
+    def make_dict(self, name, xtype, root, cache_size=0):
         ''' A new map-like storable object.
             Parameters:
                 * name : a string representing the name of the object.
@@ -84,13 +175,43 @@ class StorableFactory:
                   JSONSerializable. The keys are always strings.
                 * root : another storable object that acts as a logical
                   folder to this one.
+                * cache_size : the number of parsed values to keep in
+                  an LRU cache (see ``StorableDict``). Defaults to 0,
+                  no cache.
+
+        '''
+        if self.is_async:
+            v = AsyncStorableDict(self.db, name, xtype, root, cache_size)
+        else:
+            v = StorableDict(self.db, name, xtype, root, cache_size)
+        v.factory = self
+        if cache_size:
+            self.cached_dicts += [v]
+        return v
+
+    def make_index(self, name, root):
+        ''' A new ordered index of pending keys (see ``PendingIndex``).
+            With an asynchronous database, it must be loaded with
+            ``await index.reload()`` before use.
+            Parameters:
+                * name : a string representing the name of the object.
+                * root : another storable object that acts as a logical
+                  folder to this one.
 
         '''
-        v = StorableDict(self.db, name, xtype, root)
+        v = PendingIndex(self.db, name, root)
         v.factory = self
+        self.indexes += [v]
         return v
 
 
+def _cache_copy(val):
+    ''' Returns a copy of a value to hold in or return from a cache, if it
+        can be copied cheaply, or the value itself. '''
+    cow_copy = getattr(val, 'cow_copy', None)
+    return val if cow_copy is None else cow_copy()
+
+
 class StorableDict(Storable):
     """ Implements a persistent dictionary like type. Entries are stored
         by key directly, and a separate doubly linked list structure is
@@ -104,11 +225,25 @@ class StorableDict(Storable):
             * __len__(self)
             * __contains__(self, item)
             * __delitem__(self, key)
+            * get_many(self, keys), put_many(self, items),
+              delete_many(self, keys) and contains_many(self, keys), which
+              read or write many keys with one call to the database.
 
         Keys should be strings or any object with a unique str representation.
+
+        When ``cache_size`` is positive, up to ``cache_size`` of the most
+        recently read values are kept parsed in an LRU cache, and the next
+        reads of their key return them without parsing. Values with a
+        ``cow_copy`` method (see ``StructureChecker.cow_copy``) are returned
+        as copies, that callers may change without changing the cache; other
+        values are returned as they are, and must be treated as immutable.
+        ``try_get(key, fresh=True)`` parses the value from storage. The cache
+        is invalidated when a key is set or deleted through this dictionary,
+        and the number of cache hits and misses is counted in ``cache_hits``
+        and ``cache_misses``.
         """
 
-    def __init__(self, db, name, xtype, root=None):
+    def __init__(self, db, name, xtype, root=None, cache_size=0):
 
         if root is None:
             self.root = ['']
@@ -120,25 +255,85 @@ class StorableDict(Storable):
 
         self.prefix = key_join(self.base_key())
 
+        # The LRU cache of parsed values: key -> value
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     def base_key(self):
         return self.root + [self.name]
 
-    def try_get(self, key):
+    def cache_clear(self):
+        ''' Removes all values from the cache. '''
+        self.cache.clear()
+
+    def _cache_get(self, key):
+        try:
+            val = self.cache[key]
+        except KeyError:
+            self.cache_misses += 1
+            return None
+        self.cache.move_to_end(key)
+        self.cache_hits += 1
+        return _cache_copy(val)
+
+    def _cache_put(self, key, val):
+        # Keep a copy, as the caller gets the value.
+        self.cache[key] = _cache_copy(val)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def try_get(self, key, fresh=False):
         """
-        Returns value if key exists in storage, otherwise returns None
+        Returns value if key exists in storage, otherwise returns None.
+        If ``fresh`` is True the value is parsed from storage, bypassing
+        the cache.
         """
+        use_cache = self.cache_size and not fresh
+        if use_cache:
+            val = self._cache_get(key)
+            if val is not None:
+                return val
+
         val = self.db.try_get(self.prefix, key)
         if val is None:
             return None
-        return self.post_proc(json.loads(val))
+        val = self.post_proc(codec.loads(val))
+
+        if use_cache:
+            self._cache_put(key, val)
+        return val
 
     def __getitem__(self, key):
-        return self.post_proc(json.loads(self.db.get(self.prefix, key)))
+        if self.cache_size:
+            val = self._cache_get(key)
+            if val is not None:
+                return val
+
+        val = self.post_proc(codec.loads(self.db.get(self.prefix, key)))
+
+        if self.cache_size:
+            self._cache_put(key, val)
+        return val
 
     def __setitem__(self, key, value):
-        data = json.dumps(self.pre_proc(value))
+        data = codec.dumps(self.pre_proc(value))
+        self.cache.pop(key, None)
         self.db.put(self.prefix, key, data)
 
+    def put(self, key, value):
+        ''' Sets the value of a key, as ``self[key] = value``. '''
+        self[key] = value
+
+    def delete(self, key):
+        ''' Deletes a key, as ``del self[key]``. '''
+        del self[key]
+
+    def contains(self, key):
+        ''' Returns whether the key is in storage, as ``key in self``. '''
+        return key in self
+
     def keys(self):
         ''' An iterator over the keys of the dictionary. '''
         return self.db.getkeys(self.prefix)
@@ -151,11 +346,291 @@ class StorableDict(Storable):
         return self.db.count(self.prefix) == 0
 
     def __delitem__(self, key):
+        self.cache.pop(key, None)
         self.db.delete(self.prefix, key)
 
     def __contains__(self, key):
         return self.db.isin(self.prefix, key)
 
+    def get_many(self, keys, fresh=False):
+        """
+        Returns a list of the values of the keys, with None for the keys
+        not in storage. Keys not in the cache are read with one call to
+        the database. ``fresh`` bypasses the cache, as for ``try_get``.
+        """
+        keys = list(keys)
+        use_cache = self.cache_size and not fresh
+        vals = [self._cache_get(key) for key in keys] if use_cache \
+            else [None] * len(keys)
+
+        missing = [i for i, val in enumerate(vals) if val is None]
+        if missing:
+            data = self.db.get_many(self.prefix, [keys[i] for i in missing])
+            for i, val in zip(missing, data):
+                if val is None:
+                    continue
+                val = vals[i] = self.post_proc(codec.loads(val))
+                if use_cache:
+                    self._cache_put(keys[i], val)
+        return vals
+
+    def put_many(self, items):
+        """ Stores the values of many keys, given as a dict or a list of
+            (key, value) pairs. """
+        if isinstance(items, dict):
+            items = items.items()
+        data = []
+        for key, value in items:
+            self.cache.pop(key, None)
+            data += [(key, codec.dumps(self.pre_proc(value)))]
+        self.db.put_many(self.prefix, data)
+
+    def delete_many(self, keys):
+        """ Deletes the keys that are in storage. """
+        keys = list(keys)
+        for key in keys:
+            self.cache.pop(key, None)
+        self.db.delete_many(self.prefix, keys)
+
+    def contains_many(self, keys):
+        """ Returns a list of whether each key is in storage. """
+        return self.db.contains_many(self.prefix, list(keys))
+
+
+class AsyncStorableDict(StorableDict):
+    """ Implements a persistent dictionary like type over an
+        ``AsyncDatabase``, as ``StorableDict`` but with coroutine methods:
+
+            * get(self, key), try_get(self, key, fresh=False)
+            * put(self, key, value), delete(self, key)
+            * contains(self, key), count(self), is_empty(self), keys(self)
+            * get_many(self, keys, fresh=False), put_many(self, items),
+              delete_many(self, keys) and contains_many(self, keys)
+
+        The operators of ``StorableDict`` (such as ``d[key]`` or
+        ``key in d``) cannot be awaited, and raise TypeError.
+        """
+
+    def _not_async(self, *args):
+        raise TypeError(
+            'Use the coroutine methods of an AsyncStorableDict, such as '
+            'get, put, delete, contains and count.')
+
+    __getitem__ = __setitem__ = __delitem__ = __contains__ = __len__ = \
+        _not_async
+
+    async def try_get(self, key, fresh=False):
+        """
+        Returns value if key exists in storage, otherwise returns None.
+        If ``fresh`` is True the value is parsed from storage, bypassing
+        the cache.
+        """
+        use_cache = self.cache_size and not fresh
+        if use_cache:
+            val = self._cache_get(key)
+            if val is not None:
+                return val
+
+        val = await self.db.try_get(self.prefix, key)
+        if val is None:
+            return None
+        val = self.post_proc(codec.loads(val))
+
+        if use_cache:
+            self._cache_put(key, val)
+        return val
+
+    async def get(self, key):
+        ''' Returns the value of a key, or raises KeyError. '''
+        val = await self.try_get(key)
+        if val is None:
+            raise KeyError(key)
+        return val
+
+    async def put(self, key, value):
+        ''' Sets the value of a key. '''
+        data = codec.dumps(self.pre_proc(value))
+        self.cache.pop(key, None)
+        await self.db.put(self.prefix, key, data)
+
+    async def delete(self, key):
+        ''' Deletes a key, or raises KeyError. '''
+        self.cache.pop(key, None)
+        await self.db.delete(self.prefix, key)
+
+    async def contains(self, key):
+        ''' Returns whether the key is in storage. '''
+        return await self.db.isin(self.prefix, key)
+
+    async def keys(self):
+        ''' Returns a list of the keys of the dictionary. '''
+        return await self.db.getkeys(self.prefix)
+
+    async def count(self):
+        ''' Returns the number of keys of the dictionary. '''
+        return await self.db.count(self.prefix)
+
+    async def is_empty(self):
+        ''' Returns True if dict is empty and False if it contains some elements.'''
+        return await self.db.count(self.prefix) == 0
+
+    async def get_many(self, keys, fresh=False):
+        """
+        Returns a list of the values of the keys, with None for the keys
+        not in storage, as ``StorableDict.get_many``.
+        """
+        keys = list(keys)
+        use_cache = self.cache_size and not fresh
+        vals = [self._cache_get(key) for key in keys] if use_cache \
+            else [None] * len(keys)
+
+        missing = [i for i, val in enumerate(vals) if val is None]
+        if missing:
+            data = await self.db.get_many(
+                self.prefix, [keys[i] for i in missing])
+            for i, val in zip(missing, data):
+                if val is None:
+                    continue
+                val = vals[i] = self.post_proc(codec.loads(val))
+                if use_cache:
+                    self._cache_put(keys[i], val)
+        return vals
+
+    async def put_many(self, items):
+        """ Stores the values of many keys, given as a dict or a list of
+            (key, value) pairs. """
+        if isinstance(items, dict):
+            items = items.items()
+        data = []
+        for key, value in items:
+            self.cache.pop(key, None)
+            data += [(key, codec.dumps(self.pre_proc(value)))]
+        await self.db.put_many(self.prefix, data)
+
+    async def delete_many(self, keys):
+        """ Deletes the keys that are in storage. """
+        keys = list(keys)
+        for key in keys:
+            self.cache.pop(key, None)
+        await self.db.delete_many(self.prefix, keys)
+
+    async def contains_many(self, keys):
+        """ Returns a list of whether each key is in storage. """
+        return await self.db.contains_many(self.prefix, list(keys))
+
+
+class PendingIndex:
+    """ Implements a persistent index of pending keys, in insertion order,
+        with the time each one is next due to be retried.
+
+        Each entry is stored under its key as its insertion sequence number
+        and next retry time, and all entries are also held in memory in an
+        ordered dictionary, loaded from storage when the index is made. So:
+
+            * ``add``, ``discard``, ``next_retry``, ``set_next_retry``,
+              ``__contains__`` and ``__len__`` are O(1).
+            * ``peek(k)`` returns the k oldest keys in O(k).
+
+        Retry times are wall clock times (``time.time()``), so that they
+        remain meaningful after a restart.
+
+        With an ``AsyncDatabase``, the index starts empty and ``reload``
+        returns a coroutine to await to load it. The methods that write to
+        storage (``add``, ``discard`` and ``set_next_retry``) update the
+        index in memory at once, and return the coroutine of the write (or
+        None), to await with ``maybe_await``.
+        """
+
+    def __init__(self, db, name, root=None):
+        if root is None:
+            self.root = ['']
+        else:
+            self.root = root.base_key()
+        self.name = name
+        self.db = db
+        self.factory = None
+
+        self.prefix = key_join(self.base_key())
+        self.entries = OrderedDict()
+        self.next_seq = 0
+        if not isinstance(db, AsyncDatabase):
+            self.reload()
+
+    def base_key(self):
+        return self.root + [self.name]
+
+    def reload(self):
+        ''' Loads the index from storage, for example after the writes of a
+            transaction were rolled back. '''
+        coro = self._load()
+        if isinstance(self.db, AsyncDatabase):
+            return coro
+        return run_sync(coro)
+
+    async def _load(self):
+        keys = await maybe_await(self.db.getkeys(self.prefix))
+        data = await maybe_await(self.db.get_many(self.prefix, keys))
+        entries = []
+        for key, val in zip(keys, data):
+            seq, next_retry = codec.loads(val)
+            entries += [(seq, key, next_retry)]
+        entries.sort()
+
+        # Map: key -> [sequence number, next retry time]
+        self.entries = OrderedDict(
+            (key, [seq, next_retry]) for seq, key, next_retry in entries)
+        self.next_seq = entries[-1][0] + 1 if entries else 0
+
+    def add(self, key, next_retry=0.0):
+        ''' Adds a key at the end of the index. A key already in the index
+            keeps its position, and only its next retry time is updated.
+
+            Parameters:
+                * key : the key to add.
+                * next_retry : the time the key is next due to be retried.
+                  Defaults to 0, at once.
+        '''
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [self.next_seq, next_retry]
+            self.next_seq += 1
+        else:
+            entry[1] = next_retry
+        return self.db.put(self.prefix, key, codec.dumps(entry))
+
+    def discard(self, key):
+        ''' Removes a key from the index, if it is there. '''
+        if self.entries.pop(key, None) is not None:
+            return self.db.delete(self.prefix, key)
+
+    def peek(self, number=1):
+        ''' Returns a list of up to ``number`` of the oldest keys. '''
+        return list(islice(self.entries, number))
+
+    def next_retry(self, key):
+        ''' Returns the time a key is next due to be retried. '''
+        return self.entries[key][1]
+
+    def set_next_retry(self, key, next_retry):
+        ''' Sets the time a key in the index is next due to be retried. '''
+        entry = self.entries[key]
+        entry[1] = next_retry
+        return self.db.put(self.prefix, key, codec.dumps(entry))
+
+    def keys(self):
+        ''' Returns a list of the keys, from the oldest. '''
+        return list(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_empty(self):
+        ''' Returns True if the index is empty and False otherwise. '''
+        return not self.entries
+
+    def __contains__(self, key):
+        return key in self.entries
+
 
 class StorableValue:
     """ Implements a cached persistent value. The value is stored to storage
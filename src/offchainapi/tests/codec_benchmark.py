@@ -0,0 +1,70 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+# Benchmark of the available JSON backends of the codec module on the
+# payloads of CommandRequestObject messages carrying payment commands.
+#
+# Run as:
+# $ python -m offchainapi.tests.codec_benchmark [iterations]
+#
+from .. import codec
+from ..payment import PaymentAction, PaymentActor, PaymentObject, \
+    StatusObject, KYCData
+from ..payment_command import PaymentCommand
+from ..protocol_messages import CommandRequestObject
+from ..libra_address import LibraAddress
+from ..status_logic import Status
+from ..utils import JSONFlag
+
+import sys
+import time
+
+
+def make_request():
+    sender_addr = LibraAddress.from_bytes("lbr", b'A'*16, b'a'*8)
+    receiver_addr = LibraAddress.from_bytes("lbr", b'B'*16, b'b'*8)
+    sender = PaymentActor(
+        sender_addr.as_str(), StatusObject(Status.needs_kyc_data), [])
+    sender.add_kyc_data(KYCData({
+        "payload_type": "KYC_DATA",
+        "payload_version": 1,
+        "type": "individual",
+        "given_name": "Alice",
+        "surname": "Smith",
+        "address": {"city": "Paris", "country": "FR", "line1": "1 Rue"},
+        "dob": "01/01/1970",
+    }))
+    receiver = PaymentActor(
+        receiver_addr.as_str(), StatusObject(Status.none), [])
+    action = PaymentAction(10, 'TIK', 'charge', 7784993)
+    ref_id = f'{sender_addr.get_onchain_encoded_str()}_XYZ'
+    payment = PaymentObject(
+        sender, receiver, ref_id, None, 'Human readable description', action)
+    return CommandRequestObject(PaymentCommand(payment))
+
+
+def main(iterations=20000):
+    request = make_request()
+    data = request.get_json_data_dict(JSONFlag.NET)
+    print(f'Payload: {len(codec.dumps_bytes(data))} bytes, '
+          f'{iterations} iterations')
+
+    previous = codec.backend
+    for backend in codec.available_backends():
+        codec.set_backend(backend)
+        for name, func, arg in [
+                ('dumps', codec.dumps, data),
+                ('dumps_bytes', codec.dumps_bytes, data),
+                ('loads', codec.loads, codec.dumps(data)),
+                ('loads_bytes', codec.loads_bytes, codec.dumps_bytes(data))]:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func(arg)
+            elapsed = time.perf_counter() - start
+            print(f'{backend:>8} {name:<12} '
+                  f'{elapsed / iterations * 1e6:8.2f} us/op')
+    codec.set_backend(previous)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -12,6 +12,8 @@ from ..protocol_messages import CommandRequestObject
 from ..utils import JSONFlag
 from ..crypto import ComplianceKey
 from ..sample.sample_db import SampleDB
+from ..memory_db import MemoryDB
+from ..sqlite_db import SQLiteDB
 
 import types
 from unittest.mock import MagicMock
@@ -112,8 +114,12 @@ def two_channels(three_addresses, vasp, store):
 
     return (server, client)
 
-@pytest.fixture
-def db(tmp_path):
+@pytest.fixture(params=['sample', 'memory', 'sqlite'])
+def db(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryDB()
+    if request.param == 'sqlite':
+        return SQLiteDB(str(tmp_path / 'db.sqlite'))
     return SampleDB()
 
 
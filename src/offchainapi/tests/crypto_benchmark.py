@@ -0,0 +1,60 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+# Benchmark of the throughput of signing and verifying messages, on the
+# event loop and in thread and process pools of increasing sizes.
+#
+# Run as:
+# $ python -m offchainapi.tests.crypto_benchmark [messages] [max workers]
+#
+from ..crypto import ComplianceKey
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import sys
+import time
+
+
+async def sign_verify(key, payloads, executor):
+    ''' Signs and verifies all payloads concurrently. '''
+    async def one(payload):
+        sig = await key.sign_message(payload, executor=executor)
+        assert await key.verify_message(sig, executor=executor) == payload
+    await asyncio.gather(*[one(payload) for payload in payloads])
+
+
+def throughput(key, payloads, executor):
+    ''' Returns the number of messages signed and verified per second. '''
+    loop = asyncio.new_event_loop()
+    try:
+        # Warm up the workers.
+        loop.run_until_complete(sign_verify(key, payloads[:100], executor))
+        start = time.perf_counter()
+        loop.run_until_complete(sign_verify(key, payloads, executor))
+        elapsed = time.perf_counter() - start
+    finally:
+        loop.close()
+    return len(payloads) / elapsed
+
+
+def main(messages=20000, max_workers=8):
+    key = ComplianceKey.generate()
+    payloads = [f'{{"cid": "{i}", "command": "{"x" * 1000}"}}'
+                for i in range(messages)]
+    print(f'Messages: {messages}, signed and verified')
+
+    rate = throughput(key, payloads, None)
+    print(f'{"event loop":>16}: {rate:10.0f} msg/s')
+
+    workers = 1
+    while workers <= max_workers:
+        for name, executor_type in [('threads', ThreadPoolExecutor),
+                                    ('processes', ProcessPoolExecutor)]:
+            with executor_type(max_workers=workers) as executor:
+                rate = throughput(key, payloads, executor)
+            print(f'{workers:>6} {name:>9}: {rate:10.0f} msg/s')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -10,9 +10,9 @@ from ..business import VASPInfo
 from ..libra_address import LibraAddress
 from ..payment_logic import PaymentCommand
 from ..status_logic import Status
-from ..sample.sample_db import SampleDB
+from ..memory_db import MemoryDB
 from ..payment import PaymentAction, PaymentActor, PaymentObject, StatusObject
-from ..core import Vasp
+from ..core import Vasp, make_event_loop
 from .basic_business_context import TestBusinessContext
 from ..crypto import ComplianceKey
 
@@ -71,16 +71,16 @@ def start_thread_main(vasp, loop):
     print('VASP loop exit...')
 
 
-def make_new_VASP(Peer_addr, port, reliable=True):
+def make_new_VASP(Peer_addr, port, reliable=True, use_uvloop=False):
     VASPx = Vasp(
         Peer_addr,
         host='localhost',
         port=port,
         business_context=TestBusinessContext(Peer_addr, reliable=reliable),
         info_context=SimpleVASPInfo(Peer_addr),
-        database=SampleDB())
+        database=MemoryDB())
 
-    loop = asyncio.new_event_loop()
+    loop = make_event_loop(use_uvloop)
     VASPx.set_loop(loop)
 
     # Create and launch a thread with the VASP event loop
@@ -94,9 +94,13 @@ def make_new_VASP(Peer_addr, port, reliable=True):
     return (VASPx, loop, t)
 
 
-async def main_perf(messages_num=10, wait_num=0, verbose=False):
-    VASPa, loopA, tA = make_new_VASP(PeerA_addr, port=8091)
-    VASPb, loopB, tB = make_new_VASP(PeerB_addr, port=8092, reliable=False)
+async def main_perf(messages_num=10, wait_num=0, verbose=False,
+                    use_uvloop=False):
+    VASPa, loopA, tA = make_new_VASP(
+        PeerA_addr, port=8091, use_uvloop=use_uvloop)
+    VASPb, loopB, tB = make_new_VASP(
+        PeerB_addr, port=8092, reliable=False, use_uvloop=use_uvloop)
+    print(f'Event loop: {type(loopA).__module__}.{type(loopA).__name__}')
 
     # Get the channel from A -> B
     channelAB = VASPa.vasp.get_channel(PeerB_addr)
@@ -0,0 +1,94 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+# Benchmark of the memory used by each version of a payment, comparing the
+# slotted payment model classes with equivalent classes that keep an
+# instance dictionary (as the payment classes did before using slots).
+#
+# Run as:
+# $ python -m offchainapi.tests.memory_benchmark [versions]
+#
+from ..payment import PaymentAction, PaymentActor, PaymentObject, \
+    StatusObject, KYCData
+from ..libra_address import LibraAddress
+from ..status_logic import Status
+
+import sys
+import tracemalloc
+
+
+def make_dict_classes():
+    ''' Returns a map from each payment model class to a subclass that
+        has an instance dictionary, and whose fields refer to the other
+        subclasses. '''
+    classes = {}
+    for cls in [KYCData, StatusObject, PaymentActor, PaymentAction,
+                PaymentObject]:
+        fields = [(field, classes.get(xtype, xtype), required, write_mode)
+                  for field, xtype, required, write_mode in cls.fields]
+        # No __slots__ in the body: instances get a __dict__.
+        classes[cls] = type(f'Dict{cls.__name__}', (cls, ), {
+            'fields': fields
+        })
+    return classes
+
+
+def make_payment():
+    sender_addr = LibraAddress.from_bytes("lbr", b'A'*16, b'a'*8)
+    receiver_addr = LibraAddress.from_bytes("lbr", b'B'*16, b'b'*8)
+    kyc = KYCData({
+        "payload_type": "KYC_DATA",
+        "payload_version": 1,
+        "type": "individual",
+    })
+    sender = PaymentActor(
+        sender_addr.as_str(), StatusObject(Status.needs_kyc_data), [])
+    sender.add_kyc_data(kyc)
+    receiver = PaymentActor(
+        receiver_addr.as_str(), StatusObject(Status.none), [])
+    action = PaymentAction(10, 'TIK', 'charge', 7784993)
+    ref_id = f'{sender_addr.get_onchain_encoded_str()}_XYZ'
+    return PaymentObject(sender, receiver, ref_id, None, 'Description', action)
+
+
+def bytes_per_version(payment, versions):
+    ''' Returns the bytes allocated per new version of the payment, when
+        each version updates the status of both actors. '''
+    kept = []
+    statuses = [Status.needs_kyc_data, Status.ready_for_settlement]
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    for i in range(versions):
+        payment = payment.new_version()
+        status = statuses[i % 2]
+        payment.sender.status.update({'status': str(status)})
+        payment.receiver.status.update({'status': str(status)})
+        kept += [payment]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return (end - start) / versions
+
+
+def main(versions=10000):
+    payment = make_payment()
+    record = payment.get_full_diff_record()
+    version = payment.version
+
+    dict_payment = make_dict_classes()[PaymentObject].from_full_record(record)
+    dict_payment.version = version
+    dict_payment.previous_version = None
+    dict_payment.notes = {}
+    assert dict_payment.get_full_diff_record() == record
+
+    before = bytes_per_version(dict_payment, versions)
+    after = bytes_per_version(payment, versions)
+    print(f'Versions: {versions}')
+    print(f'With instance dictionaries: {before:.0f} bytes per version')
+    print(f'With slots:                 {after:.0f} bytes per version')
+    print(f'Saving:                     {1 - after / before:.1%}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
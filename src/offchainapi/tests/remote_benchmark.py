@@ -7,10 +7,10 @@ from ..libra_address import LibraAddress
 from ..payment_logic import PaymentCommand, PaymentProcessor
 from ..status_logic import Status
 from ..storage import StorableFactory
-from ..sample.sample_db import SampleDB
+from ..memory_db import MemoryDB
 from ..payment import PaymentAction, PaymentActor, PaymentObject, StatusObject
 from ..asyncnet import Aionet
-from ..core import Vasp
+from ..core import Vasp, make_event_loop
 from ..crypto import ComplianceKey
 from .basic_business_context import TestBusinessContext
 
@@ -73,7 +73,8 @@ def load_configs(configs_path):
     return configs
 
 
-def run_server(my_configs_path, other_configs_path, num_of_commands=10, loop=None):
+def run_server(my_configs_path, other_configs_path, num_of_commands=10, loop=None,
+               use_uvloop=False):
     ''' Run the VASP as server (do not send commands).
 
     The arguments <my_configs_path> and <other_configs_path> are paths to
@@ -97,13 +98,13 @@ def run_server(my_configs_path, other_configs_path, num_of_commands=10, loop=Non
         port=my_configs['port'],
         business_context=AsyncMock(spec=BusinessContext),
         info_context=SimpleVASPInfo(my_configs, other_configs),
-        database=SampleDB(),
+        database=MemoryDB(),
     )
     logging.info(f'Created VASP {my_addr.as_str()}.')
 
     # Run VASP services.
     logging.info(f'Running VASP {my_addr.as_str()}.')
-    loop = asyncio.get_event_loop() if loop is None else loop
+    loop = make_event_loop(use_uvloop) if loop is None else loop
 
     vasp.set_loop(loop)
     vasp.start_services()
@@ -126,7 +127,8 @@ def run_server(my_configs_path, other_configs_path, num_of_commands=10, loop=Non
         loop.close()
 
 
-def run_client(my_configs_path, other_configs_path, num_of_commands=10, port=0):
+def run_client(my_configs_path, other_configs_path, num_of_commands=10, port=0,
+               use_uvloop=False):
     ''' Run the VASP's client to send commands to the other VASP.
 
     The VASP sends <num_of_commands> commands to the other VASP, on port <port>.
@@ -157,7 +159,7 @@ def run_client(my_configs_path, other_configs_path, num_of_commands=10, port=0):
         port=my_configs['port'],
         business_context=TestBusinessContext(my_addr),
         info_context=SimpleVASPInfo(my_configs, other_configs, port),
-        database=SampleDB(),
+        database=MemoryDB(),
     )
     logging.info(f'Created VASP {my_addr.as_str()}.')
 
@@ -171,7 +173,7 @@ def run_client(my_configs_path, other_configs_path, num_of_commands=10, port=0):
             loop.run_until_complete(loop.shutdown_asyncgens())
             loop.close()
 
-    loop = asyncio.new_event_loop()
+    loop = make_event_loop(use_uvloop)
     vasp.set_loop(loop)
     t = Thread(target=start_services, args=(vasp, loop), daemon=True)
     t.start()
@@ -1,11 +1,21 @@
 # Copyright (c) The Libra Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from ..asyncnet import Aionet
-from ..protocol_messages import OffChainException
+from ..asyncnet import Aionet, NetworkException, PoolConfig, PoolStats, \
+    BatchConfig, ByteStats, X_BATCH_KEY, PoolTracker
+from ..protocol_messages import CommandRequestObject
+from ..sample.sample_command import SampleCommand
+from ..protocol_messages import OffChainException, OffChainProtocolError
+from ..protocol import OffChainVASP, LOCK_AVAILABLE
+from ..command_processor import CommandProcessor
+from ..errors import OffChainErrorCode
+from ..storage import StorableFactory
+from ..memory_db import MemoryDB
 from ..business import BusinessNotAuthorized
-from ..utils import get_unique_string
+from ..utils import get_unique_string, JSONFlag
 
+from unittest.mock import MagicMock
+from types import SimpleNamespace
 import pytest
 import aiohttp
 import json
@@ -76,6 +86,37 @@ async def test_handle_request(url, net_handler, key, client, signed_json_request
     assert content['status'] == 'success'
 
 
+async def test_handle_request_byte_stats(url, net_handler, tester_addr, client,
+                                         signed_json_request):
+    assert net_handler.get_byte_stats(tester_addr) == ByteStats(0, 0, 0)
+    headers = {'X-Request-ID': 'abc'}
+    response = await client.post(
+        url, data=signed_json_request.encode('ascii'), headers=headers)
+    assert response.status == 200
+    content = await response.read()
+    assert net_handler.get_byte_stats(tester_addr) == ByteStats(
+        1, len(signed_json_request), len(content))
+
+
+async def test_handle_request_too_large(vasp, key, tester_addr, aiohttp_client,
+                                        signed_json_request):
+    net_handler = Aionet(vasp, max_body_size=len(signed_json_request) - 1)
+    client = await aiohttp_client(net_handler.app)
+    url = net_handler.get_url('/', tester_addr.as_str())
+    headers = {'X-Request-ID': 'abc'}
+    response = await client.post(
+        url, data=signed_json_request, headers=headers)
+    assert response.status == 413
+
+    # Without a Content-Length the body is read up to the limit.
+    async def chunks():
+        yield signed_json_request[:10].encode('ascii')
+        yield signed_json_request[10:].encode('ascii')
+    response = await client.post(url, data=chunks(), headers=headers)
+    assert response.status == 413
+    assert net_handler.get_byte_stats(tester_addr) == ByteStats(0, 0, 0)
+
+
 async def test_handle_request_not_authorised(vasp, url, json_request, client):
     vasp.business_context.open_channel_to.side_effect = BusinessNotAuthorized
     headers = {'X-Request-ID': 'abc'}
@@ -140,6 +181,229 @@ async def test_watchdog_task(net_handler, tester_addr, server, command):
     await net_handler.close()
 
 
+async def test_send_request_pool(net_handler, tester_addr, server, command):
+    base_url = f'http://{server.host}:{server.port}'
+    net_handler.vasp.info_context.get_peer_base_url.return_value = base_url
+    assert net_handler.get_pool_stats(tester_addr) == PoolStats(0, 0, 0)
+
+    req = await net_handler.sequence_command(tester_addr, command)
+    server.side['cid'] = command.get_request_cid()
+    assert await net_handler.send_request(tester_addr, req)
+    # The response to a retransmission of the request is a duplicate.
+    assert await net_handler.send_request(tester_addr, req)
+
+    # The connection is kept open, and reused.
+    assert len(net_handler.sessions) == 1
+    assert net_handler.get_pool_stats(tester_addr) == PoolStats(1, 1, 0)
+
+    session = net_handler.get_session(tester_addr)
+    assert session.connector.limit == net_handler.pool_config.limit_per_peer
+    await net_handler.close()
+    assert net_handler.get_pool_stats(tester_addr) == PoolStats(0, 0, 0)
+
+
+async def test_pool_tracker():
+    now = [0.0]
+    tracker = PoolTracker(keepalive_timeout=10.0, clock=lambda: now[0])
+    assert tracker.stats() == PoolStats(0, 0, 0)
+
+    def response(connection=None, headers={}):
+        return SimpleNamespace(response=SimpleNamespace(
+            connection=connection, headers=headers))
+
+    # A request waits for a connection, and another fails while waiting.
+    ctx1, ctx2 = SimpleNamespace(), SimpleNamespace()
+    await tracker.on_queued_start(None, ctx1, None)
+    await tracker.on_queued_start(None, ctx2, None)
+    assert tracker.stats(window_waiting=1) == PoolStats(0, 0, 3)
+    await tracker.on_queued_end(None, ctx1, None)
+    await tracker.on_request_exception(None, ctx2, None)
+    assert tracker.stats() == PoolStats(0, 0, 0)
+
+    # The first makes a connection, returned to the pool once read.
+    await tracker.on_create_start(None, ctx1, None)
+    await tracker.on_acquired(None, ctx1, None)
+    assert tracker.stats() == PoolStats(1, 0, 0)
+    connection = MagicMock()
+    await tracker.on_request_end(None, ctx1, response(connection))
+    assert tracker.stats() == PoolStats(1, 0, 0)
+    release, = connection.add_callback.call_args[0]
+    release()
+    assert tracker.stats() == PoolStats(1, 1, 0)
+
+    # A request reuses it, and the peer asks to close it.
+    ctx3 = SimpleNamespace()
+    await tracker.on_reuse(None, ctx3, None)
+    assert tracker.stats() == PoolStats(1, 0, 0)
+    await tracker.on_request_end(
+        None, ctx3, response(headers={'Connection': 'close'}))
+    assert tracker.stats() == PoolStats(0, 0, 0)
+
+    # Idle connections expire after the keepalive timeout.
+    ctx4 = SimpleNamespace()
+    await tracker.on_create_start(None, ctx4, None)
+    await tracker.on_acquired(None, ctx4, None)
+    await tracker.on_request_end(None, ctx4, response())
+    assert tracker.stats() == PoolStats(1, 1, 0)
+    now[0] = 11.0
+    assert tracker.stats() == PoolStats(0, 0, 0)
+
+
+async def test_send_request_timeout(vasp, tester_addr, command, aiohttp_server):
+    # The server never responds in time.
+    async def handler(request):
+        await asyncio.sleep(1.0)
+
+    app = aiohttp.web.Application()
+    app.add_routes([aiohttp.web.post('/{tail:.*}', handler)])
+    slow_server = await aiohttp_server(app)
+
+    net_handler = Aionet(vasp, PoolConfig(read_timeout=0.1))
+    base_url = f'http://{slow_server.host}:{slow_server.port}'
+    vasp.info_context.get_peer_base_url.return_value = base_url
+    req = await net_handler.sequence_command(tester_addr, command)
+    with pytest.raises(NetworkException):
+        await net_handler.send_request(tester_addr, req)
+    await net_handler.close()
+
+
+async def test_send_request_wait_congestion(vasp, key, tester_addr,
+                                           aiohttp_server):
+    vasp.info_context.get_my_compliance_signature_key.return_value = key
+    vasp.info_context.get_peer_compliance_verification_key.return_value = key
+
+    # The other VASP does not know the dependency of the command.
+    other_vasp = OffChainVASP(
+        tester_addr, MagicMock(spec=CommandProcessor),
+        StorableFactory(MemoryDB()), vasp.info_context)
+    other_server = await aiohttp_server(Aionet(other_vasp).app)
+    base_url = f'http://{other_server.host}:{other_server.port}'
+    vasp.info_context.get_peer_base_url.return_value = base_url
+
+    net_handler = Aionet(vasp)
+    channel = vasp.get_channel(tester_addr)
+    channel.object_locks['Hello'] = LOCK_AVAILABLE
+    req = await net_handler.sequence_command(
+        tester_addr, SampleCommand('World', deps=['Hello']))
+
+    # The other VASP replies 'wait', which decreases the window.
+    size = net_handler.get_window(tester_addr).stats().size
+    with pytest.raises(OffChainProtocolError) as e:
+        await net_handler.send_request(tester_addr, req)
+    assert e.value.protocol_error.code == OffChainErrorCode.wait
+    stats = net_handler.get_window(tester_addr).stats()
+    assert stats.congestion == 1
+    assert stats.size < size
+    await net_handler.close()
+
+
+@pytest.fixture
+async def batch_server(net_handler, tester_addr, aiohttp_server, key):
+    calls = {'command': 0, 'batch': 0, 'sizes': []}
+
+    async def handler(request):
+        calls['command'] += 1
+        headers = {'X-Request-ID': request.headers['X-Request-ID'],
+                   X_BATCH_KEY: '1'}
+        req = json.loads(await key.verify_message(await request.text()))
+        resp = {"cid": req['cid'], "status": "success"}
+        signed_json_response = await key.sign_message(json.dumps(resp))
+        return aiohttp.web.Response(text=signed_json_response, headers=headers)
+
+    async def batch_handler(request):
+        calls['batch'] += 1
+        headers = {'X-Request-ID': request.headers['X-Request-ID'],
+                   X_BATCH_KEY: '1'}
+        reqs = json.loads(await key.verify_message(await request.text()))
+        calls['sizes'] += [len(reqs['batch'])]
+        resp = {'batch': [{"cid": req['cid'], "status": "success"}
+                          for req in reqs['batch']]}
+        signed_json_response = await key.sign_message(json.dumps(resp))
+        return aiohttp.web.Response(text=signed_json_response, headers=headers)
+
+    app = aiohttp.web.Application()
+    url = net_handler.get_url('/', tester_addr.as_str(), other_is_server=True)
+    app.add_routes([aiohttp.web.post(url, handler)])
+    url = net_handler.get_url(
+        '/', tester_addr.as_str(), other_is_server=True, batch=True)
+    app.add_routes([aiohttp.web.post(url, batch_handler)])
+    server = await aiohttp_server(app)
+    server.calls = calls
+    return server
+
+
+async def test_handle_batch_request(vasp, key, tester_addr, aiohttp_client):
+    vasp.info_context.get_my_compliance_signature_key.return_value = key
+    vasp.info_context.get_peer_compliance_verification_key.return_value = key
+    net_handler = Aionet(vasp, batch_config=BatchConfig())
+    client = await aiohttp_client(net_handler.app)
+
+    # The batch end point is advertised.
+    url = net_handler.get_url('/', tester_addr.as_str())
+    response = await client.post(url, headers={'X-Request-ID': 'abc'})
+    assert response.status == 400
+    assert response.headers[X_BATCH_KEY] == '1'
+
+    url = net_handler.get_url('/', tester_addr.as_str(), batch=True)
+    batch = {'batch': [
+        CommandRequestObject(SampleCommand(item)).get_json_data_dict(
+            JSONFlag.NET) for item in ['Hello', 'World']]}
+    response = await client.post(
+        url, data=await key.sign_message(json.dumps(batch)),
+        headers={'X-Request-ID': 'abc'})
+    assert response.status == 200
+    content = json.loads(await key.verify_message(await response.text()))
+    assert [resp['status'] for resp in content['batch']] == ['success'] * 2
+
+    response = await client.post(
+        url, data='XRandomXJunk', headers={'X-Request-ID': 'abc'})
+    assert response.status == 400
+
+
+async def test_send_request_batch(vasp, key, tester_addr, batch_server):
+    vasp.info_context.get_my_compliance_signature_key.return_value = key
+    vasp.info_context.get_peer_compliance_verification_key.return_value = key
+    base_url = f'http://{batch_server.host}:{batch_server.port}'
+    vasp.info_context.get_peer_base_url.return_value = base_url
+    net_handler = Aionet(vasp, batch_config=BatchConfig(linger=0.05))
+
+    # The first request is sent alone, and learns of the batch end point.
+    req = await net_handler.sequence_command(tester_addr, SampleCommand('A'))
+    assert isinstance(req, str)
+    assert await net_handler.send_request(tester_addr, req)
+    assert net_handler.batching_to(tester_addr)
+
+    # The next requests are sent together.
+    reqs = [await net_handler.sequence_command(tester_addr, SampleCommand(x))
+            for x in 'BCD']
+    assert all(isinstance(req, CommandRequestObject) for req in reqs)
+    results = await asyncio.gather(*[
+        net_handler.send_request(tester_addr, req) for req in reqs])
+    assert results == [True] * 3
+    assert batch_server.calls == {'command': 1, 'batch': 1, 'sizes': [3]}
+
+    channel = net_handler.vasp.get_channel(tester_addr)
+    assert not channel.would_retransmit()
+    await net_handler.close()
+
+
+async def test_send_request_batch_fallback(vasp, key, tester_addr, server):
+    vasp.info_context.get_my_compliance_signature_key.return_value = key
+    vasp.info_context.get_peer_compliance_verification_key.return_value = key
+    base_url = f'http://{server.host}:{server.port}'
+    vasp.info_context.get_peer_base_url.return_value = base_url
+    net_handler = Aionet(vasp, batch_config=BatchConfig())
+
+    # The other VASP is thought to serve the batch end point, but does not.
+    net_handler.batch_peers.add(tester_addr.as_str())
+    command = SampleCommand('Hello')
+    req = await net_handler.sequence_command(tester_addr, command)
+    server.side['cid'] = command.get_request_cid()
+    assert await net_handler.send_request(tester_addr, req)
+    assert not net_handler.batching_to(tester_addr)
+    await net_handler.close()
+
+
 def test_get_url(net_handler, tester_addr, testee_addr):
     base_url = "http://offchain.test.com/offchain"
     expected = f"{base_url}/v1/{tester_addr.as_str()}/{testee_addr.as_str()}/command"
@@ -6,7 +6,9 @@ import pytest
 from ..bech32 import (
     Bech32Error,
     bech32_address_decode,
+    bech32_address_decode_many,
     bech32_address_encode,
+    bech32_address_encode_many,
     LBR,
     PLB,
     TLB,
@@ -158,3 +160,33 @@ def test_bech32_invalid_address() -> None:
     invalid_bech32_libra_address = "abc1p7ujcndcl7nudzwt8fglhx6wxn08kgs5tm6mz4usw5p72t"
     with pytest.raises(Bech32Error):
         bech32_address_decode(invalid_bech32_libra_address)
+
+
+def test_bech32_many() -> None:
+    some_address = bytes(bytearray.fromhex("f72589b71ff4f8d139674a3f7369c69b"))
+    some_sub_address = bytes(bytearray.fromhex("cf64428bdeb62af2"))
+
+    encoded = bech32_address_encode_many(
+        LBR, [(some_address, None), (some_address, some_sub_address)]
+    )
+    assert encoded == [
+        "lbr1p7ujcndcl7nudzwt8fglhx6wxnvqqqqqqqqqqqqqflf8ma",
+        bech32_address_encode(LBR, some_address, some_sub_address),
+    ]
+
+    decoded = bech32_address_decode_many(encoded, LBR)
+    assert decoded == [bech32_address_decode(x) for x in encoded]
+    assert decoded[1][3] == some_sub_address
+
+    invalid = encoded[0][:-1] + "q"
+    with pytest.raises(Bech32Error):
+        bech32_address_decode_many(encoded + [invalid])
+
+    decoded = bech32_address_decode_many(
+        [invalid] + encoded, raise_errors=False
+    )
+    assert isinstance(decoded[0], Bech32Error)
+    assert decoded[1:] == [bech32_address_decode(x) for x in encoded]
+
+    with pytest.raises(Bech32Error):
+        bech32_address_encode_many(LBR, [(some_address[:-1], None)])
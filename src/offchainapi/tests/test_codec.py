@@ -0,0 +1,58 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from .. import codec
+from ..payment import KYCData
+
+from datetime import datetime
+import pytest
+
+
+@pytest.fixture(params=codec.available_backends())
+def backend(request):
+    previous = codec.backend
+    yield codec.set_backend(request.param)
+    codec.set_backend(previous)
+
+
+def test_codec_available_backends():
+    backends = codec.available_backends()
+    assert backends[-1] == 'json'
+    assert codec.backend == backends[0]
+
+
+def test_codec_unknown_backend():
+    with pytest.raises(ValueError):
+        codec.set_backend('xml')
+
+
+def test_codec_roundtrip(backend):
+    obj = {'a': [1, 2, {'b': None}], 'c': 'é/"', 'd': True, 'e': 2**70}
+    data = codec.dumps(obj)
+    assert isinstance(data, str)
+    assert codec.loads(data) == obj
+
+    data = codec.dumps_bytes(obj)
+    assert isinstance(data, bytes)
+    assert codec.loads_bytes(data) == obj
+    assert codec.loads(data) == obj
+
+
+def test_codec_not_serializable(backend):
+    with pytest.raises(TypeError):
+        codec.dumps({'a': object()})
+    with pytest.raises(TypeError):
+        codec.dumps_bytes({'a': object()})
+
+
+@pytest.mark.parametrize('value', [datetime(2020, 1, 1), float('nan')])
+def test_codec_kyc_data_not_standard_json(backend, value):
+    with pytest.raises((TypeError, ValueError)):
+        codec.check_serializable({'a': value})
+    with pytest.raises((TypeError, ValueError)):
+        KYCData({
+            "payload_type": "KYC_DATA",
+            "payload_version": 1,
+            "type": "individual",
+            "other": {"a": value},
+        })
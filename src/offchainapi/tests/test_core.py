@@ -0,0 +1,78 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from ..core import Vasp, make_event_loop
+from ..business import BusinessContext, VASPInfo
+from ..libra_address import LibraAddress
+from ..memory_db import MemoryDB
+
+from unittest.mock import MagicMock
+import asyncio
+import socket
+import sys
+import pytest
+
+
+@pytest.fixture
+def core_vasp():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return Vasp(
+        LibraAddress.from_bytes("lbr", b'A'*16),
+        host='127.0.0.1', port=port,
+        business_context=MagicMock(spec=BusinessContext),
+        info_context=MagicMock(spec=VASPInfo),
+        database=MemoryDB())
+
+
+def test_make_event_loop(monkeypatch):
+    # Without uvloop, the default loop is used.
+    monkeypatch.setitem(sys.modules, 'uvloop', None)
+    loop = make_event_loop()
+    assert isinstance(loop, asyncio.AbstractEventLoop)
+    loop.close()
+
+    uvloop = MagicMock()
+    monkeypatch.setitem(sys.modules, 'uvloop', uvloop)
+    assert make_event_loop() is uvloop.new_event_loop.return_value
+    loop = make_event_loop(use_uvloop=False)
+    assert type(loop) is type(asyncio.new_event_loop())
+    loop.close()
+
+
+def test_set_loop_factory(core_vasp):
+    loop = asyncio.new_event_loop()
+    core_vasp.loop_factory = MagicMock(return_value=loop)
+    core_vasp.set_loop()
+    assert core_vasp.loop is loop
+    loop.close()
+
+
+async def test_start_services_embedded(core_vasp):
+    # The VASP runs in the loop of an application.
+    other_task = asyncio.ensure_future(asyncio.sleep(10))
+    try:
+        await core_vasp.start_services_async(watch_period=0.1)
+        assert core_vasp.loop is asyncio.get_running_loop()
+        assert core_vasp.pp.loop is core_vasp.loop
+        assert await core_vasp._await_start_notifier()
+
+        # Closing the VASP leaves the loop and its other tasks running.
+        await core_vasp.close_async()
+        assert not other_task.done()
+        assert core_vasp.loop.is_running()
+    finally:
+        other_task.cancel()
+        await asyncio.gather(other_task, return_exceptions=True)
+
+
+async def test_start_services_other_loop(core_vasp):
+    other_loop = asyncio.new_event_loop()
+    try:
+        core_vasp.set_loop(other_loop)
+        with pytest.raises(RuntimeError):
+            await core_vasp.start_services_async()
+        assert core_vasp.loop is other_loop
+    finally:
+        other_loop.close()
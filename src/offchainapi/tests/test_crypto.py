@@ -2,8 +2,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from jwcrypto import jwk, jws
+from jwcrypto.common import base64url_encode
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import json
-from ..crypto import ComplianceKey, OffChainInvalidSignature
+from ..crypto import ComplianceKey, OffChainInvalidSignature, JWS_HEADER_B64
 import pytest
 
 def test_init():
@@ -99,6 +101,100 @@ async def test_sign_verif_incorrect():
         assert sig == 'Hello World!'
 
 
+@pytest.mark.parametrize('payload', ['', 'Hello World!', '{"a": "\u00e9"}' * 50])
+async def test_sign_same_as_jwcrypto(payload):
+    key = ComplianceKey.generate()
+    sig = await key.sign_message(payload)
+    assert sig.startswith(JWS_HEADER_B64 + '.')
+    # Ed25519 signatures are deterministic.
+    assert sig == key._jwcrypto_sign_message(payload)
+
+    key_pub = ComplianceKey.from_str(key.export_pub())
+    assert await key_pub.verify_message(sig) == payload
+    assert key_pub._jwcrypto_verify_message(sig) == payload
+
+
+async def test_verify_other_header():
+    key = ComplianceKey.generate()
+    jwstoken = jws.JWS(b'Hello World!')
+    jwstoken.add_signature(key._key, alg=None, protected=json.dumps({
+        "alg": "EdDSA", "kid": key.thumbprint()}))
+    sig = jwstoken.serialize(compact=True)
+    assert await key.verify_message(sig) == 'Hello World!'
+
+
+async def test_verify_bytes():
+    key = ComplianceKey.generate()
+    sig = await key.sign_message('Hello World\u00e9!')
+    assert await key.verify_message(sig.encode('ascii')) == \
+        'Hello World\u00e9!'.encode('utf-8')
+
+    header, payload, signature = sig.split('.')
+    with pytest.raises(OffChainInvalidSignature):
+        await key.verify_message(f'{header}.{payload}.{signature[:-4]}'.encode())
+
+    # Other headers are verified through jwcrypto.
+    jwstoken = jws.JWS(b'Hello World!')
+    jwstoken.add_signature(key._key, alg=None, protected=json.dumps({
+        "alg": "EdDSA", "kid": key.thumbprint()}))
+    sig = jwstoken.serialize(compact=True).encode('ascii')
+    assert await key.verify_message(sig) == b'Hello World!'
+
+
+async def test_verify_non_utf8_payload():
+    key = ComplianceKey.generate()
+    payload = base64url_encode(b'\xff\xfe')
+    signing_input = f'{JWS_HEADER_B64}.{payload}'
+    signature = base64url_encode(
+        key.get_private().sign(signing_input.encode('ascii')))
+    sig = f'{signing_input}.{signature}'
+
+    # The signature is valid, but the payload is not UTF-8.
+    assert await key.verify_message(sig.encode('ascii')) == b'\xff\xfe'
+    with pytest.raises(OffChainInvalidSignature):
+        await key.verify_message(sig)
+
+    jwstoken = jws.JWS(b'\xff\xfe')
+    jwstoken.add_signature(key._key, alg=None, protected=json.dumps({
+        "alg": "EdDSA", "kid": key.thumbprint()}))
+    sig = jwstoken.serialize(compact=True)
+    assert await key.verify_message(sig.encode('ascii')) == b'\xff\xfe'
+    with pytest.raises(OffChainInvalidSignature):
+        await key.verify_message(sig)
+
+
+async def test_verify_invalid_format():
+    key = ComplianceKey.generate()
+    sig = await key.sign_message('Hello World!')
+    header, payload, signature = sig.split('.')
+
+    for bad_sig in [
+            f'{header}.{payload}',
+            f'{header}.{payload}.{signature}.',
+            f'{header}.{payload}\u00e9.{signature}',
+            f'{header}.{payload}.{signature[:-4]}']:
+        with pytest.raises(OffChainInvalidSignature):
+            await key.verify_message(bad_sig)
+
+    other = await key.sign_message('Hello World?')
+    with pytest.raises(OffChainInvalidSignature):
+        await key.verify_message(f'{header}.{other.split(".")[1]}.{signature}')
+
+
+@pytest.mark.parametrize('executor_type', [ThreadPoolExecutor, ProcessPoolExecutor])
+async def test_sign_verify_executor(executor_type):
+    key = ComplianceKey.generate()
+    key_pub = ComplianceKey.from_str(key.export_pub())
+    with executor_type(max_workers=2) as executor:
+        sig = await key.sign_message('Hello World!', executor=executor)
+        assert sig == await key.sign_message('Hello World!')
+        assert await key_pub.verify_message(sig, executor=executor) == 'Hello World!'
+
+        other = ComplianceKey.generate()
+        with pytest.raises(OffChainInvalidSignature):
+            await other.verify_message(sig, executor=executor)
+
+
 def test_dual_attestation_signing_and_verifying():
     key = ComplianceKey.generate()
     addr_bytes = bytes.fromhex("f72589b71ff4f8d139674a3f7369c69b")
@@ -0,0 +1,235 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from ..memory_db import MemoryDB, AsyncMemoryDB
+from ..sqlite_db import SQLiteDB
+from ..async_db import ThreadPoolDatabase
+from ..sample.sample_db import SampleDB
+
+import asyncio
+import pytest
+
+
+def test_memory_db_prefixes_are_separate():
+    db = MemoryDB()
+    db.put('A', 'x', '1')
+    db.put('A', 'y', '2')
+    db.put('AB', 'x', '3')
+
+    assert db.getkeys('A') == ['x', 'y']
+    assert db.getkeys('AB') == ['x']
+    assert db.count('A') == 2
+    assert db.count('AB') == 1
+    assert db.count('B') == 0
+    assert db.getkeys('B') == []
+
+    assert db.get('A', 'x') == '1'
+    assert db.get('AB', 'x') == '3'
+
+
+def test_memory_db_missing_keys():
+    db = MemoryDB()
+    assert db.try_get('A', 'x') is None
+    assert not db.isin('A', 'x')
+    with pytest.raises(KeyError):
+        db.get('A', 'x')
+    with pytest.raises(KeyError):
+        db.delete('A', 'x')
+
+    db.put('A', 'x', '1')
+    db.delete('A', 'x')
+    assert not db.isin('A', 'x')
+    assert db.count('A') == 0
+    assert 'A' not in db.data
+
+
+def test_memory_db_getkeys_is_a_snapshot():
+    db = MemoryDB()
+    for k in ['x', 'y', 'z']:
+        db.put('A', k, k)
+
+    for k in db.getkeys('A'):
+        db.delete('A', k)
+    assert db.count('A') == 0
+
+
+def test_sqlite_db_basic():
+    db = SQLiteDB()
+    db.put('A', 'x', '1')
+    db.put('A', 'y', '2')
+    db.put('AB', 'x', '3')
+    db.put('A', 'x', '4')
+
+    assert db.get('A', 'x') == '4'
+    assert db.try_get('A', 'z') is None
+    assert db.getkeys('A') == ['x', 'y']
+    assert db.count('A') == 2
+    assert db.count('AB') == 1
+    assert db.isin('AB', 'x')
+    assert not db.isin('B', 'x')
+
+    with pytest.raises(KeyError):
+        db.get('A', 'z')
+    with pytest.raises(KeyError):
+        db.delete('A', 'z')
+
+    db.delete('A', 'x')
+    assert db.getkeys('A') == ['y']
+    assert db.count('A') == 1
+
+
+def test_sqlite_db_persists(tmp_path):
+    path = str(tmp_path / 'db.sqlite')
+    db = SQLiteDB(path, synchronous='full')
+    assert db.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert db.conn.execute('PRAGMA synchronous').fetchone()[0] == 2
+    db.put('A', 'x', '1')
+    db.put('A', 'y', '2')
+    db.close()
+
+    db = SQLiteDB(path)
+    assert db.getkeys('A') == ['x', 'y']
+    assert db.get('A', 'y') == '2'
+
+
+def test_sqlite_db_bad_synchronous():
+    with pytest.raises(ValueError):
+        SQLiteDB(synchronous='SOMETIMES')
+
+
+@pytest.mark.parametrize('make_db', [MemoryDB, SQLiteDB])
+def test_transaction_commit_and_rollback(make_db):
+    db = make_db()
+    db.put('A', 'x', '1')
+    db.put('A', 'y', '2')
+
+    with db.transaction():
+        db.put('A', 'x', '10')
+        db.put('A', 'z', '3')
+    assert db.get('A', 'x') == '10'
+    assert db.get('A', 'z') == '3'
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.put('A', 'x', '100')
+            db.delete('A', 'y')
+            db.put('B', 'w', '4')
+            raise RuntimeError()
+
+    assert db.get('A', 'x') == '10'
+    assert db.get('A', 'y') == '2'
+    assert db.count('A') == 3
+    assert db.count('B') == 0
+
+
+@pytest.mark.parametrize('make_db', [MemoryDB, SQLiteDB])
+def test_transaction_nested(make_db):
+    db = make_db()
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.put('A', 'x', '1')
+            with db.transaction():
+                db.put('A', 'y', '2')
+            # The inner transaction does not commit.
+            raise RuntimeError()
+
+    assert db.count('A') == 0
+
+    with db.transaction():
+        with db.transaction():
+            db.put('A', 'y', '2')
+    assert db.get('A', 'y') == '2'
+
+
+@pytest.mark.parametrize('make_db', [MemoryDB, SQLiteDB, SampleDB])
+def test_bulk_operations(make_db):
+    db = make_db()
+    assert db.get_many('A', ['x', 'y']) == [None, None]
+    assert db.contains_many('A', ['x']) == [False]
+    db.delete_many('A', ['x'])
+
+    db.put_many('A', [('x', '1'), ('y', '2'), ('z', '3')])
+    db.put('B', 'x', '4')
+    assert db.get_many('A', ['z', 'w', 'x']) == ['3', None, '1']
+    assert db.contains_many('A', ['w', 'y']) == [False, True]
+
+    # Missing keys are ignored.
+    db.delete_many('A', ['x', 'w', 'z'])
+    assert db.getkeys('A') == ['y']
+    assert db.get('B', 'x') == '4'
+
+    # Many keys are read in chunks.
+    keys = [str(i) for i in range(1000)]
+    db.put_many('C', [(k, k) for k in keys])
+    assert db.get_many('C', keys) == keys
+    assert all(db.contains_many('C', keys))
+
+
+@pytest.mark.parametrize('make_db', [MemoryDB, SQLiteDB])
+def test_bulk_operations_rollback(make_db):
+    db = make_db()
+    db.put_many('A', [('x', '1'), ('y', '2')])
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.put_many('A', [('x', '10'), ('z', '3')])
+            db.delete_many('A', ['y'])
+            raise RuntimeError()
+
+    assert db.get_many('A', ['x', 'y', 'z']) == ['1', '2', None]
+
+
+@pytest.mark.parametrize('make_db', [
+    AsyncMemoryDB, lambda: ThreadPoolDatabase(SQLiteDB())])
+async def test_async_database(make_db):
+    db = make_db()
+    try:
+        assert await db.try_get('A', 'x') is None
+        with pytest.raises(KeyError):
+            await db.get('A', 'x')
+
+        await db.put('A', 'x', '1')
+        await db.put_many('A', [('y', '2'), ('z', '3')])
+        assert await db.get('A', 'x') == '1'
+        assert await db.isin('A', 'y')
+        assert await db.getkeys('A') == ['x', 'y', 'z']
+        assert await db.get_many('A', ['z', 'w']) == ['3', None]
+        assert await db.contains_many('A', ['w', 'x']) == [False, True]
+
+        await db.delete('A', 'x')
+        await db.delete_many('A', ['y', 'w'])
+        assert await db.count('A') == 1
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize('make_db', [
+    AsyncMemoryDB, lambda: ThreadPoolDatabase(SQLiteDB())])
+async def test_async_database_transaction(make_db):
+    db = make_db()
+    await db.put('A', 'x', '1')
+    seen = []
+
+    async def read():
+        seen.append(await db.get('A', 'x'))
+
+    try:
+        with pytest.raises(RuntimeError):
+            async with db.transaction():
+                await db.put('A', 'x', '10')
+                async with db.transaction():
+                    await db.put('A', 'y', '2')
+                # Other tasks do not see the changes of the transaction.
+                task = asyncio.ensure_future(read())
+                await asyncio.sleep(0.01)
+                assert seen == []
+                raise RuntimeError()
+        await task
+        assert seen == ['1']
+        assert await db.getkeys('A') == ['x']
+
+        async with db.transaction():
+            await db.put('A', 'x', '10')
+        assert await db.get('A', 'x') == '10'
+    finally:
+        db.close()
@@ -0,0 +1,87 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from ..flow_control import InFlightWindow, WindowConfig, WindowStats
+
+import asyncio
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def test_window_admission():
+    window = InFlightWindow(WindowConfig(initial=2))
+    await window.acquire()
+    await window.acquire()
+    assert window.stats() == WindowStats(2, 2, 0, 0)
+
+    # The third request waits for a slot.
+    third = asyncio.ensure_future(window.acquire())
+    await asyncio.sleep(0)
+    assert not third.done()
+    assert window.stats().waiting == 1
+
+    window.release()
+    await asyncio.sleep(0)
+    assert third.done()
+    assert window.stats() == WindowStats(2, 2, 0, 0)
+
+
+async def test_window_cancel_waiting():
+    window = InFlightWindow(WindowConfig(initial=1))
+    await window.acquire()
+
+    waiter = asyncio.ensure_future(window.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert window.stats().waiting == 0
+
+    window.release()
+    assert window.stats().in_flight == 0
+
+
+async def test_window_additive_increase():
+    window = InFlightWindow(WindowConfig(initial=2, maximum=4))
+    for _ in range(2):
+        await window.acquire()
+        window.release(latency=0.1)
+    assert window.size == pytest.approx(2 + 1/2 + 1/2.5)
+
+    for _ in range(100):
+        await window.acquire()
+        window.release(latency=0.1)
+    assert window.limit() == 4
+
+
+async def test_window_multiplicative_decrease():
+    clock = Clock()
+    window = InFlightWindow(WindowConfig(initial=16), clock=clock)
+    await window.acquire()
+    window.release(latency=0.1)
+
+    # Congestion decreases the window, once per smoothed latency.
+    for _ in range(3):
+        await window.acquire()
+        window.release(congested=True)
+    assert window.limit() == 8
+    assert window.stats().congestion == 1
+
+    clock.now = 1.0
+    await window.acquire()
+    window.release(congested=True)
+    assert window.limit() == 4
+
+    # So does a latency much higher than the lowest.
+    clock.now = 2.0
+    for _ in range(10):
+        await window.acquire()
+        window.release(latency=1.0)
+    assert window.limit() == 2
@@ -0,0 +1,83 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from ..business import VASPInfo
+from ..key_cache import KeyCache
+
+from unittest.mock import MagicMock
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def make_info():
+    info = MagicMock(spec=VASPInfo)
+    info.get_peer_compliance_verification_key.side_effect = \
+        lambda addr: MagicMock(name=f'verify-{addr}')
+    info.get_my_compliance_signature_key.side_effect = \
+        lambda addr: MagicMock(name=f'sign-{addr}')
+    return info
+
+
+def test_key_cache_hit():
+    info = make_info()
+    cache = KeyCache(info)
+
+    key = cache.get_peer_compliance_verification_key('A')
+    assert cache.get_peer_compliance_verification_key('A') is key
+    assert info.get_peer_compliance_verification_key.call_count == 1
+    # The key is prepared once.
+    key.get_public.assert_called_once()
+
+    key = cache.get_my_compliance_signature_key('B')
+    assert cache.get_my_compliance_signature_key('B') is key
+    assert info.get_my_compliance_signature_key.call_count == 1
+    key.get_private.assert_called_once()
+
+    assert cache.get_peer_compliance_verification_key('B') is not key
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_key_cache_ttl():
+    clock = Clock()
+    info = make_info()
+    cache = KeyCache(info, ttl=10, clock=clock)
+
+    key = cache.get_peer_compliance_verification_key('A')
+    clock.now = 9
+    assert cache.get_peer_compliance_verification_key('A') is key
+    clock.now = 10
+    assert cache.get_peer_compliance_verification_key('A') is not key
+    assert info.get_peer_compliance_verification_key.call_count == 2
+
+
+def test_key_cache_no_ttl_and_disabled():
+    clock = Clock()
+    cache = KeyCache(make_info(), ttl=None, clock=clock)
+    key = cache.get_peer_compliance_verification_key('A')
+    clock.now = 10**9
+    assert cache.get_peer_compliance_verification_key('A') is key
+
+    cache = KeyCache(make_info(), ttl=0)
+    key = cache.get_peer_compliance_verification_key('A')
+    assert cache.get_peer_compliance_verification_key('A') is not key
+    assert not cache.keys
+
+
+def test_key_cache_invalidate():
+    info = make_info()
+    cache = KeyCache(info)
+
+    key_a = cache.get_peer_compliance_verification_key('A')
+    key_b = cache.get_peer_compliance_verification_key('B')
+    cache.invalidate('A')
+    assert cache.get_peer_compliance_verification_key('A') is not key_a
+    assert cache.get_peer_compliance_verification_key('B') is key_b
+
+    cache.invalidate()
+    assert cache.get_peer_compliance_verification_key('B') is not key_b
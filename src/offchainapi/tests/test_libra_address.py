@@ -186,3 +186,23 @@ def test_GE():
 
     if onchain_address_bytes_one >= onchain_address_bytes_two:
         assert libra_addr_one.greater_than_or_equal(libra_addr_two)
+
+
+def test_libra_address_decode_cache():
+    LibraAddress.cache_clear()
+    encoded_str = LibraAddress.from_bytes(LBR, b'A'*16, b'a'*8).as_str()
+
+    libra_addr = LibraAddress.from_encoded_str(encoded_str)
+    assert LibraAddress.from_encoded_str(encoded_str) is libra_addr
+    info = LibraAddress.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+    # Errors are not cached.
+    with pytest.raises(LibraAddressError):
+        LibraAddress.from_encoded_str(encoded_str[:-1])
+    assert LibraAddress.cache_info().currsize == 1
+
+    onchain = libra_addr.get_onchain()
+    assert onchain.subaddress_bytes is None
+    assert libra_addr.get_onchain() is onchain
+    assert libra_addr.get_onchain_encoded_str() == onchain.as_str()
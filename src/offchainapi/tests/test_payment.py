@@ -6,6 +6,8 @@ from ..utils import StructureException, JSONFlag
 from ..payment_logic import Status
 
 import json
+import copy
+import pickle
 import pytest
 
 
@@ -266,3 +268,122 @@ def test_status_object():
             Status.abort,
             abort_code='XYZ',
             abort_message='Explain XYZ')
+
+
+def test_new_version_shares_unchanged(payment, kyc_data):
+    payment.sender.add_kyc_data(kyc_data)
+    payment.flatten()
+    action = payment.data['action']
+
+    new_payment = payment.new_version('v1')
+    assert new_payment.previous_version == payment.version
+    assert new_payment == payment
+    assert not new_payment.has_changed()
+
+    # Change the status of the sender only.
+    new_payment.sender.change_status(StatusObject(Status.ready_for_settlement))
+    assert new_payment.has_changed()
+    assert not payment.has_changed()
+    assert payment.sender.status.as_status() == Status.none
+    assert new_payment.sender.status.as_status() == Status.ready_for_settlement
+
+    # Untouched sub-objects are shared.
+    assert dict.__getitem__(new_payment.data, 'action') is action
+    assert dict.__getitem__(new_payment.sender.data, 'kyc_data') is \
+        dict.__getitem__(payment.sender.data, 'kyc_data')
+
+    # Changing the original does not change the new version.
+    payment.receiver.add_metadata('hello')
+    assert new_payment.receiver.metadata == []
+    assert payment.has_changed()
+    assert new_payment.get_full_diff_record()['receiver']['metadata'] == []
+
+
+def test_new_version_of_new_version(payment):
+    v1 = payment.new_version('v1')
+    v1.sender.change_status(StatusObject(Status.needs_kyc_data))
+    v2 = v1.new_version('v2')
+    assert not v2.has_changed()
+    assert v1.has_changed()
+
+    v1.sender.add_metadata('v1 only')
+    v2.sender.change_status(StatusObject(Status.ready_for_settlement))
+    assert v1.sender.status.as_status() == Status.needs_kyc_data
+    assert v2.sender.metadata == []
+    assert payment.sender.status.as_status() == Status.none
+    assert payment.sender.metadata == []
+
+    v2.flatten()
+    assert not v2.has_changed()
+    assert v1.has_changed()
+
+
+def test_new_version_pickle(payment, kyc_data):
+    payment.sender.add_kyc_data(kyc_data)
+    payment.flatten()
+    new_payment = payment.cow_copy()
+    new_payment.sender.change_status(StatusObject(Status.needs_kyc_data))
+
+    clone = pickle.loads(pickle.dumps(new_payment))
+    assert clone == new_payment
+    assert clone.get_full_diff_record() == new_payment.get_full_diff_record()
+    assert clone.sender.status.as_status() == Status.needs_kyc_data
+
+    # The clone does not share its values with the original.
+    clone.receiver.add_metadata('clone only')
+    assert new_payment.receiver.metadata == []
+    assert payment.receiver.metadata == []
+
+
+def test_new_version_from_full_record(payment):
+    new_payment = payment.new_version('v1')
+    diff = {'receiver': {'status': {'status': 'ready_for_settlement'}}}
+    PaymentObject.from_full_record(diff, base_instance=new_payment)
+    assert new_payment.has_changed()
+    assert new_payment.receiver.status.as_status() == Status.ready_for_settlement
+    assert payment.receiver.status.as_status() == Status.none
+
+    copied = copy.deepcopy(new_payment)
+    assert copied == new_payment
+    copied.receiver.add_metadata('copy')
+    assert new_payment.receiver.metadata == []
+
+
+def test_field_schema():
+    schema = PaymentActor.field_schema
+    assert set(schema) == PaymentActor.known_fields
+    assert schema['address'].required
+    assert schema['address'].write_once
+    assert schema['status'].is_nested
+    assert 'address' in PaymentActor.required_fields
+    assert 'kyc_data' not in PaymentActor.required_fields
+    assert PaymentActor.parse_map()['status'] == (StatusObject, True)
+
+
+def test_update_errors(sender_actor):
+    with pytest.raises(StructureException, match='Unknown: field xxx'):
+        sender_actor.update({'xxx': 1})
+    with pytest.raises(StructureException, match='Wrong type'):
+        sender_actor.update({'address': 10})
+    with pytest.raises(StructureException, match='cannot be changed'):
+        sender_actor.update({'address': 'C' * 16})
+
+
+def test_payment_slots(payment, kyc_data):
+    payment.sender.add_kyc_data(kyc_data)
+    for obj in [payment.sender, payment.sender.status, kyc_data,
+                payment.action]:
+        assert not hasattr(obj, '__dict__')
+
+    # Setting a field attribute sets the field.
+    payment.description = 'New description'
+    assert payment.data['description'] == 'New description'
+
+    payment.notes['x'] = 1
+    new_payment = payment.new_version('v2')
+    assert new_payment.notes == {'x': 1}
+    assert new_payment.previous_version == payment.version
+
+    pay2 = copy.deepcopy(payment)
+    assert pay2 == payment
+    assert pay2.version == payment.version
@@ -12,12 +12,15 @@ from ..asyncnet import Aionet
 from ..storage import StorableFactory
 from ..payment_logic import PaymentProcessor
 from ..utils import JSONFlag
+from ..memory_db import AsyncMemoryDB
 from ..errors import OffChainErrorCode
 
 from .basic_business_context import TestBusinessContext
 
 from unittest.mock import MagicMock
 from mock import AsyncMock
+import asyncio
+import inspect
 import pytest
 import copy
 
@@ -372,6 +375,36 @@ async def test_process_command_happy_path(payment, loop, db):
     assert other_processor.get_latest_payment_by_ref_id(payment2.reference_id) == payment2
     await fut
 
+def test_payment_history_by_ref_id(payment, processor):
+    cmd = PaymentCommand(payment)
+    processor.object_store[payment.version] = payment
+    processor.store_latest_payment_by_ref_id(cmd)
+
+    new_payment = payment.new_version()
+    new_payment.sender.add_metadata('hello')
+    new_cmd = PaymentCommand(new_payment)
+    processor.object_store[new_payment.version] = new_payment
+    processor.store_latest_payment_by_ref_id(new_cmd)
+
+    history = processor.get_payment_history_by_ref_id(payment.reference_id)
+    assert inspect.isgenerator(history)
+    assert [p.version for p in history] == \
+        [new_payment.version, payment.version]
+
+
+async def test_payment_history_by_ref_id_async(payment):
+    my_addr = LibraAddress.from_bytes("lbr", b'B'*16)
+    processor = PaymentProcessor(
+        TestBusinessContext(my_addr), StorableFactory(AsyncMemoryDB()))
+    cmd = PaymentCommand(payment)
+    await processor.object_store.put(payment.version, payment)
+    await processor.store_latest_payment_by_ref_id(cmd)
+
+    history = await processor.get_payment_history_by_ref_id(
+        payment.reference_id)
+    assert [p.version for p in history] == [payment.version]
+
+
 def reset_payment_status(payment):
     payment.sender.status = StatusObject(Status.none)
     payment.receiver.status = StatusObject(Status.none)
@@ -455,3 +488,16 @@ def test_can_change_status(payment, loop, db):
         for new_status in Status:
             if STATUS_HEIGHTS[new_status] < STATUS_HEIGHTS[old_status]:
                 assert not processor.can_change_status(payment, new_status, actor_is_sender=False)
+
+
+async def test_wait_for_payment_outcome_cancelled(payment, processor):
+    processor.loop = asyncio.get_event_loop()
+    ref_id = payment.reference_id
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(
+            processor.wait_for_payment_outcome(ref_id), 0.01)
+
+    # The waits that were given up are forgotten.
+    assert ref_id not in processor.outcome_futures
+    payment.sender.change_status(StatusObject(Status.abort, 'code', 'msg'))
+    processor.set_payment_outcome(payment)
@@ -10,11 +10,13 @@ from ..sample.sample_command import SampleCommand
 from ..command_processor import CommandProcessor
 from ..utils import JSONSerializable, JSONFlag
 from ..storage import StorableFactory
+from ..memory_db import MemoryDB, AsyncMemoryDB
 from ..crypto import OffChainInvalidSignature
 
 from copy import deepcopy
 import random
 from unittest.mock import MagicMock
+import asyncio
 import pytest
 import json
 
@@ -200,6 +202,54 @@ def test_protocol_server_client_benign(two_channels):
     assert client.committed_commands[request.cid].command.item() == 'Hello'
 
 
+class CountingDB(MemoryDB):
+    def __init__(self):
+        MemoryDB.__init__(self)
+        self.commits = 0
+
+    def commit(self):
+        MemoryDB.commit(self)
+        self.commits += 1
+
+
+def test_protocol_one_commit_per_command(three_addresses, vasp):
+    a0, a1, _ = three_addresses
+    db = CountingDB()
+    store = StorableFactory(db)
+    command_processor = MagicMock(spec=CommandProcessor)
+    server = VASPPairChannel(a0, a1, vasp, store, command_processor)
+    client = VASPPairChannel(a1, a0, vasp, store, command_processor)
+
+    request = server.sequence_command_local(SampleCommand('Hello'))
+    assert db.commits == 1
+    reply = client.handle_request(request)
+    assert db.commits == 2
+    assert server.handle_response(reply)
+    assert db.commits == 3
+
+
+def test_protocol_handle_request_rollback(three_addresses, vasp):
+    a0, a1, _ = three_addresses
+    store = StorableFactory(MemoryDB())
+    command_processor = MagicMock(spec=CommandProcessor)
+    server = VASPPairChannel(a0, a1, vasp, store, command_processor)
+    client = VASPPairChannel(a1, a0, vasp, store, command_processor)
+
+    request = server.sequence_command_local(SampleCommand('Hello'))
+    command_processor.process_command.side_effect = RuntimeError('Crash')
+    with pytest.raises(RuntimeError):
+        client.handle_request(request)
+
+    # Neither the request nor its locks were stored.
+    assert len(client.committed_commands) == 0
+    assert len(client.object_locks) == 0
+
+    command_processor.process_command.side_effect = None
+    reply = client.handle_request(request)
+    assert reply.status == 'success'
+    assert len(client.committed_commands) == 1
+
+
 def test_protocol_server_conflicting_sequence(two_channels):
     server, client = two_channels
 
@@ -348,6 +398,148 @@ async def test_protocol_conflict1(two_channels):
     # Now add the response that creates 'hello'
     assert await client.parse_handle_response(msg2)  # success
 
+async def test_protocol_keys_cached(two_channels):
+    server, client = two_channels
+    info_context = server.vasp.info_context
+
+    for item in ['Hello', 'World']:
+        msg = client.sequence_command_local(SampleCommand(item))
+        msg = (await client.package_request(msg)).content
+        msg2 = (await server.parse_handle_request(msg)).content
+        assert await client.parse_handle_response(msg2)
+
+    # Both channels share the key cache of the VASP.
+    assert info_context.get_my_compliance_signature_key.call_count == 2
+    assert info_context.get_peer_compliance_verification_key.call_count == 2
+
+    server.key_cache.invalidate()
+    msg = client.sequence_command_local(SampleCommand('Again'))
+    await client.package_request(msg)
+    assert info_context.get_my_compliance_signature_key.call_count == 3
+
+
+async def test_protocol_batch(two_channels):
+    server, client = two_channels
+
+    requests = [client.sequence_command_local(SampleCommand(item))
+                for item in ['Hello', 'World']]
+    batch = await client.package_request_batch(requests)
+    assert batch.raw == requests
+
+    responses = await server.parse_handle_request_batch(batch.content)
+    assert len(responses.raw) == 2
+    assert not any(resp.is_failure() for resp in responses.raw)
+
+    results = await client.parse_handle_response_batch(responses.content)
+    assert results == [True, True]
+    assert client.would_retransmit() is False
+    assert len(server.committed_commands) == 2
+
+    # Duplicates in a batch get the same responses again.
+    responses2 = await server.parse_handle_request_batch(batch.content)
+    assert responses2.raw == responses.raw
+
+
+async def test_protocol_batch_errors(two_channels):
+    server, client = two_channels
+
+    # A bad batch gets a single error response.
+    response = await server.parse_handle_request_batch('XRandomXJunk')
+    assert response.raw.is_failure()
+    assert response.raw.error.code == OffChainErrorCode.invalid_signature
+
+    key = server.key_cache.get_my_compliance_signature_key(
+        client.get_my_address().as_str())
+    response = await server.parse_handle_request_batch(
+        await key.sign_message(json.dumps({'batch': 'Hello'})))
+    assert response.raw.is_failure()
+
+    # A bad item in a batch gets its own error response.
+    request = client.sequence_command_local(SampleCommand('Hello'))
+    batch = json.dumps({'batch': [
+        {'junk': True}, request.get_json_data_dict(JSONFlag.NET)]})
+    responses = await server.parse_handle_request_batch(
+        await key.sign_message(batch))
+    assert responses.raw[0].is_failure()
+    assert not responses.raw[1].is_failure()
+
+    results = await client.parse_handle_response_batch(responses.content)
+    assert isinstance(results[0], OffChainProtocolError)
+    assert results[1] is True
+
+
+async def test_protocol_signed_request_cached(two_channels, key, monkeypatch):
+    server, client = two_channels
+
+    request = client.sequence_command_local(SampleCommand('Hello'))
+    msg = (await client.package_request(request)).content
+    assert client.my_pending_signed[request.cid] == msg
+
+    # Retransmissions reuse the signed request.
+    async def sign_message(payload):
+        assert False, 'The request is signed again'
+    with monkeypatch.context() as m:
+        m.setattr(key, 'sign_message', sign_message)
+        messages = await client.package_retransmit(number=10)
+    assert [m.content for m in messages] == [msg]
+
+    # The signed request is dropped when the request gets a response.
+    msg2 = (await server.parse_handle_request(msg)).content
+    assert await client.parse_handle_response(msg2)
+    assert request.cid not in client.my_pending_signed
+
+
+async def test_protocol_duplicate_request_cached(two_channels, key, monkeypatch):
+    server, client = two_channels
+
+    request = client.sequence_command_local(SampleCommand('Hello'))
+    msg = (await client.package_request(request)).content
+    response = await server.parse_handle_request(msg)
+    assert request.cid in server.committed_responses
+
+    # The same request is answered without parsing or signing.
+    def fail(*args, **kwargs):
+        assert False, 'The request is handled again'
+    with monkeypatch.context() as m:
+        m.setattr(CommandRequestObject, 'from_json_data_dict', fail)
+        m.setattr(key, 'sign_message', fail)
+        response2 = await server.parse_handle_request(msg)
+    assert response2.content == response.content
+
+    # A different request with the same cid is a conflict.
+    other = CommandRequestObject(SampleCommand('World'))
+    other.cid = request.cid
+    other.command.set_origin(client.get_my_address())
+    msg2 = await key.sign_message(
+        json.dumps(other.get_json_data_dict(JSONFlag.NET)))
+    response3 = await server.parse_handle_request(msg2)
+    assert response3.raw.error.code == OffChainErrorCode.conflict
+
+
+@pytest.mark.parametrize('cid', [12345, ['a', 'b'], {'a': 1}])
+async def test_protocol_duplicate_request_non_str_cid(
+        two_channels, key, monkeypatch, cid):
+    server, client = two_channels
+
+    request = CommandRequestObject(SampleCommand('Hello'))
+    request.command.set_origin(client.get_my_address())
+    data = request.get_json_data_dict(JSONFlag.NET)
+    data['cid'] = cid
+    msg = await key.sign_message(json.dumps(data))
+
+    # The cid is parsed as a str, under which the response is cached.
+    response = await server.parse_handle_request(msg)
+    assert response.raw.status == 'success'
+    assert str(cid) in server.committed_responses
+
+    def fail(*args, **kwargs):
+        assert False, 'The request is handled again'
+    with monkeypatch.context() as m:
+        m.setattr(CommandRequestObject, 'from_json_data_dict', fail)
+        response2 = await server.parse_handle_request(msg)
+    assert response2.content == response.content
+
+
 async def test_protocol_bad_signature(two_channels):
     server, client = two_channels
 
@@ -618,6 +810,27 @@ def test_pending_retransmit_number(channel):
     assert channel.pending_retransmit_number() == 0
 
 
+def test_pending_index_survives_restart(three_addresses, vasp, store):
+    a0, a1, _ = three_addresses
+    command_processor = MagicMock(spec=CommandProcessor)
+    channel = VASPPairChannel(a1, a0, vasp, store, command_processor)
+    requests = [channel.sequence_command_local(SampleCommand(f'Hello{i}'))
+                for i in range(3)]
+    assert channel.get_retransmit(2) == requests[:2]
+
+    channel = VASPPairChannel(a1, a0, vasp, store, command_processor)
+    assert channel.pending_retransmit_number() == 3
+    assert channel.get_retransmit(5) == requests
+
+    # Requests stored without an index are indexed.
+    for cid in channel.my_pending_index.keys():
+        channel.my_pending_index.discard(cid)
+    channel = VASPPairChannel(a1, a0, vasp, store, command_processor)
+    assert channel.would_retransmit()
+    assert sorted(r.cid for r in channel.get_retransmit(5)) == \
+        sorted(r.cid for r in requests)
+
+
 async def test_get_dep_locks(two_channels):
     server, client = two_channels
 
@@ -694,3 +907,37 @@ async def test_get_dep_locks(two_channels):
     assert not s_locked
     with pytest.raises(DependencyException):
         server.sequence_command_local(sw2_request.command)
+
+
+async def test_protocol_async_database(three_addresses, vasp):
+    a0, a1, _ = three_addresses
+    store = StorableFactory(AsyncMemoryDB())
+    command_processor = MagicMock(spec=CommandProcessor)
+    server = VASPPairChannel(a0, a1, vasp, store, command_processor)
+    client = VASPPairChannel(a1, a0, vasp, store, command_processor)
+
+    request = await client.sequence_command_local_async(SampleCommand('Hello'))
+    msg = (await client.package_request(request)).content
+    msg = (await server.parse_handle_request(msg)).content
+    assert await client.parse_handle_response(msg)
+    assert await client.committed_commands.count() == 1
+    assert await server.object_locks.get('Hello') == LOCK_AVAILABLE
+
+    # Commands sequenced at the same time check and take the locks of
+    # their dependencies one after the other.
+    results = await asyncio.gather(*[
+        client.sequence_command_local_async(
+            SampleCommand(item, deps=['Hello']))
+        for item in ['A', 'B']], return_exceptions=True)
+    assert sum(isinstance(r, DependencyException) for r in results) == 1
+    assert await client.my_pending_requests.count() == 1
+    assert client.pending_retransmit_number() == 1
+    assert len(await client.get_retransmit_async(5)) == 1
+
+    # With an asynchronous database the sync methods return coroutines.
+    request, = [r for r in results if isinstance(r, CommandRequestObject)]
+    response = await server.handle_request(request)
+    assert response.status == 'success'
+    assert await client.handle_response(response)
+    assert await client.my_pending_requests.is_empty()
+    assert await server.object_locks.get('Hello') == LOCK_EXPIRED
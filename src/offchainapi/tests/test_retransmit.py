@@ -0,0 +1,231 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from ..retransmit import RetransmitScheduler, RetransmitConfig, \
+    RetransmitStats
+from ..protocol import NetMessage
+from ..libra_address import LibraAddress
+from ..storage import StorableFactory
+from ..memory_db import MemoryDB, AsyncMemoryDB
+
+from unittest.mock import MagicMock
+import asyncio
+import pytest
+import time
+
+
+class FakeChannel:
+    def __init__(self, other_addr):
+        self.other_addr = other_addr
+        storage = StorableFactory(MemoryDB())
+        self.my_pending_requests = storage.make_dict(
+            'my_pending_requests', str, None)
+        self.my_pending_signed = {}
+        self.my_pending_index = storage.make_index('my_pending_index', None)
+
+    def add_pending(self, cid, request):
+        self.my_pending_requests[cid] = request
+        self.my_pending_index.add(cid)
+
+    def remove_pending(self, cid):
+        del self.my_pending_requests[cid]
+        self.my_pending_index.discard(cid)
+
+    def get_other_address(self):
+        return self.other_addr
+
+    async def package_request(self, request):
+        # The requests are their own cid.
+        content = f'signed {request}'
+        self.my_pending_signed[request] = content
+        return NetMessage(None, self.other_addr, None, content, request)
+
+
+class AsyncFakeChannel(FakeChannel):
+    def __init__(self, other_addr):
+        self.other_addr = other_addr
+        self.storage = StorableFactory(AsyncMemoryDB())
+        self.my_pending_requests = self.storage.make_dict(
+            'my_pending_requests', str, None)
+        self.my_pending_signed = {}
+        self.my_pending_index = self.storage.make_index(
+            'my_pending_index', None)
+        self.storage_lock = asyncio.Lock()
+
+    async def _run_exclusive(self, fn, *args):
+        async with self.storage_lock:
+            return await fn(*args)
+
+    async def add_pending(self, cid, request):
+        await self.my_pending_requests.put(cid, request)
+        await self.my_pending_index.add(cid)
+
+    async def _remove_pending(self, cid):
+        async with self.storage.transaction_async():
+            # The response takes a while to process.
+            await asyncio.sleep(0.01)
+            await self.my_pending_requests.delete(cid)
+            await self.my_pending_index.discard(cid)
+
+    async def remove_pending(self, cid):
+        await self._run_exclusive(self._remove_pending, cid)
+
+
+@pytest.fixture
+def other_addr():
+    return LibraAddress.from_bytes("lbr", b'B'*16)
+
+
+@pytest.fixture
+def channel(other_addr):
+    return FakeChannel(other_addr)
+
+
+@pytest.fixture
+def vasp(channel, other_addr):
+    vasp = MagicMock()
+    vasp.channel_store = {other_addr.as_str(): channel}
+    vasp.get_channel.return_value = channel
+    return vasp
+
+
+def test_backoff():
+    config = RetransmitConfig(initial_delay=1.0, max_delay=10.0, jitter=0.5)
+    scheduler = RetransmitScheduler(MagicMock(), None, config)
+    for attempt, delay in enumerate([1.0, 2.0, 4.0, 8.0, 10.0, 10.0]):
+        assert delay / 2 <= scheduler.backoff(attempt) <= delay
+
+    config = RetransmitConfig(initial_delay=1.0, jitter=0)
+    scheduler = RetransmitScheduler(MagicMock(), None, config)
+    assert scheduler.backoff(2) == 4.0
+
+
+async def test_retransmit_until_response(vasp, channel, other_addr):
+    sent = []
+
+    async def send(addr, content):
+        sent.append(content)
+        if len(sent) < 3:
+            raise Exception('Network error')
+        # The request gets a response.
+        channel.remove_pending('cid')
+
+    config = RetransmitConfig(initial_delay=0.01, jitter=0)
+    scheduler = RetransmitScheduler(vasp, send, config)
+    channel.add_pending('cid', 'cid')
+    scheduler.schedule(other_addr, 'cid')
+
+    loop = asyncio.get_event_loop()
+    scheduler.start(loop)
+    # Pending requests are retransmitted at once on start.
+    await asyncio.sleep(0.005)
+    assert len(sent) == 1
+    await asyncio.sleep(0.2)
+    await scheduler.close()
+
+    # The request is signed once, and retried with backoff.
+    assert sent == ['signed cid'] * 3
+    assert scheduler.stats() == RetransmitStats(0, 0, 3, 2, 1)
+
+
+async def test_retransmit_signed_content(vasp, channel, other_addr):
+    sent = []
+
+    async def send(addr, content):
+        sent.append(content)
+        channel.remove_pending('cid')
+
+    config = RetransmitConfig(initial_delay=0.01, jitter=0)
+    scheduler = RetransmitScheduler(vasp, send, config)
+    channel.add_pending('cid', 'request')
+    channel.add_pending('done', 'request')
+    channel.my_pending_signed['cid'] = 'content'
+    scheduler.schedule(other_addr, 'cid')
+    scheduler.schedule(other_addr, 'done')
+
+    # A request that got a response is not sent again.
+    channel.remove_pending('done')
+    scheduler.start(asyncio.get_event_loop())
+    await asyncio.sleep(0.05)
+    await scheduler.close()
+
+    assert sent == ['content']
+    assert scheduler.stats().signed == 0
+
+
+async def test_retransmit_concurrency(vasp, channel, other_addr):
+    in_flight = []
+    max_in_flight = []
+
+    async def send(addr, content):
+        in_flight.append(content)
+        max_in_flight.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(content)
+        channel.remove_pending(content)
+
+    config = RetransmitConfig(concurrency=2)
+    scheduler = RetransmitScheduler(vasp, send, config)
+    for i in range(5):
+        channel.add_pending(f'cid{i}', 'request')
+        channel.my_pending_signed[f'cid{i}'] = f'cid{i}'
+        scheduler.schedule(other_addr, f'cid{i}', delay=0)
+
+    scheduler.start(asyncio.get_event_loop())
+    await asyncio.sleep(0.1)
+    await scheduler.close()
+
+    assert channel.my_pending_requests.is_empty()
+    assert channel.my_pending_index.is_empty()
+    assert max(max_in_flight) == 2
+    assert scheduler.stats() == RetransmitStats(0, 0, 5, 0, 0)
+
+
+async def test_retransmit_next_retry_persisted(vasp, channel, other_addr):
+    sent = []
+
+    async def send(addr, content):
+        sent.append(content)
+
+    config = RetransmitConfig(initial_delay=100.0, max_delay=1000.0, jitter=0)
+    scheduler = RetransmitScheduler(vasp, send, config)
+    channel.add_pending('cid', 'cid')
+    channel.add_pending('later', 'later')
+    channel.my_pending_index.set_next_retry('later', time.time() + 100.0)
+
+    # Requests are scheduled at their recorded next retry time.
+    scheduler.start(asyncio.get_event_loop())
+    await asyncio.sleep(0.05)
+    await scheduler.close()
+    assert sent == ['signed cid']
+
+    # The time of the next retransmission is recorded.
+    next_retry = channel.my_pending_index.next_retry('cid')
+    assert time.time() + 150.0 < next_retry <= time.time() + 200.0
+
+
+async def test_retransmit_response_during_send(vasp, other_addr):
+    channel = AsyncFakeChannel(other_addr)
+    vasp.channel_store = {other_addr.as_str(): channel}
+    vasp.get_channel.return_value = channel
+    responses = []
+
+    async def send(addr, content):
+        # The response arrives while the request is being sent.
+        responses.append(asyncio.ensure_future(channel.remove_pending('cid')))
+        await asyncio.sleep(0.001)
+
+    config = RetransmitConfig(initial_delay=100.0, jitter=0)
+    scheduler = RetransmitScheduler(vasp, send, config)
+    await channel.add_pending('cid', 'cid')
+    scheduler.schedule(other_addr, 'cid')
+
+    scheduler.start(asyncio.get_event_loop())
+    await asyncio.sleep(0.05)
+    await scheduler.close()
+    await asyncio.gather(*responses)
+
+    # The next retry time is not written back for the removed request.
+    assert scheduler.entries == {}
+    await channel.my_pending_index.reload()
+    assert 'cid' not in channel.my_pending_index
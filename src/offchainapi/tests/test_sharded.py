@@ -0,0 +1,170 @@
+# Copyright (c) The Libra Core Contributors
+# SPDX-License-Identifier: Apache-2.0
+
+from ..sharded import ShardedVasp, ShardWorker, shard_of, SHARD_PREFIX, \
+    X_SHARD_SECRET_KEY
+from ..core import VASPPaymentTimeout
+from ..business import VASPInfo
+from ..core import Vasp
+from ..crypto import ComplianceKey
+from ..libra_address import LibraAddress
+from ..memory_db import MemoryDB
+from ..payment import PaymentAction, PaymentActor, PaymentObject, StatusObject
+from ..payment_command import PaymentCommand
+from ..status_logic import Status
+from .basic_business_context import TestBusinessContext
+
+from functools import partial
+from unittest.mock import MagicMock
+from mock import AsyncMock
+import aiohttp
+import socket
+import pytest
+
+
+class StaticVASPInfo(VASPInfo):
+    ''' A VASPInfo with the URLs and keys given (as JWK strings). '''
+
+    def __init__(self, urls, keys):
+        self.urls = urls
+        self.keys = keys
+
+    def get_peer_base_url(self, other_addr):
+        return self.urls[other_addr.as_str()]
+
+    def get_peer_compliance_verification_key(self, other_addr):
+        return ComplianceKey.from_str(
+            ComplianceKey.from_str(self.keys[other_addr]).export_pub())
+
+    def get_my_compliance_signature_key(self, my_addr):
+        return ComplianceKey.from_str(self.keys[my_addr])
+
+    def is_authorised_VASP(self, certificate, other_addr):
+        return True
+
+
+def make_vasp(my_addr_str, urls, keys, shard, host, port):
+    ''' The factory of the Vasp of a worker. '''
+    my_addr = LibraAddress.from_encoded_str(my_addr_str)
+    return Vasp(
+        my_addr, host=host, port=port,
+        business_context=TestBusinessContext(my_addr),
+        info_context=StaticVASPInfo(urls, keys),
+        database=MemoryDB())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_shard_of():
+    addrs = [LibraAddress.from_bytes("lbr", bytes([i])*16) for i in range(64)]
+    shards = [shard_of(addr, 4) for addr in addrs]
+    assert all(0 <= shard < 4 for shard in shards)
+    assert set(shards) == {0, 1, 2, 3}
+
+    # The subaddress does not change the shard.
+    sub = LibraAddress.from_bytes("lbr", bytes([0])*16, b'a'*8)
+    assert shard_of(sub, 4) == shards[0]
+
+
+async def test_shard_worker_secret(aiohttp_client):
+    worker = ShardWorker(MagicMock(), 1, 2, 'secret')
+    app = aiohttp.web.Application()
+    app.add_routes(worker.routes())
+    client = await aiohttp_client(app)
+
+    for headers in [{}, {X_SHARD_SECRET_KEY: 'wrong'}]:
+        response = await client.get(f'{SHARD_PREFIX}/ping', headers=headers)
+        assert response.status == 403
+        response = await client.post(f'{SHARD_PREFIX}/stop', headers=headers)
+        assert response.status == 403
+    worker.vasp.close_async.assert_not_called()
+
+    response = await client.get(
+        f'{SHARD_PREFIX}/ping', headers={X_SHARD_SECRET_KEY: 'secret'})
+    assert response.status == 200
+    assert await response.json() == {'shard': 1}
+
+
+async def test_shard_worker_outcome_wait_bounded(aiohttp_client):
+    vasp = MagicMock()
+    vasp.wait_for_payment_outcome_async = AsyncMock(
+        side_effect=VASPPaymentTimeout(None))
+    worker = ShardWorker(vasp, 0, 1, 'secret', max_outcome_wait=0.5)
+    app = aiohttp.web.Application()
+    app.add_routes(worker.routes())
+    client = await aiohttp_client(app)
+
+    headers = {X_SHARD_SECRET_KEY: 'secret'}
+    for query, timeout in [('', 0.5), ('?timeout=100', 0.5),
+                           ('?timeout=0.1', 0.1)]:
+        response = await client.get(
+            f'{SHARD_PREFIX}/outcome/ref{query}', headers=headers)
+        assert response.status == 504
+        vasp.wait_for_payment_outcome_async.assert_called_with('ref', timeout)
+
+
+async def test_sharded_vasp():
+    a_addr = LibraAddress.from_bytes("lbr", b'A'*16)
+    b_addr = LibraAddress.from_bytes("lbr", b'B'*16)
+    a_port, b_port = free_port(), free_port()
+    urls = {
+        a_addr.as_str(): f'http://127.0.0.1:{a_port}',
+        b_addr.as_str(): f'http://127.0.0.1:{b_port}',
+    }
+    keys = {
+        a_addr.as_str(): ComplianceKey.generate().export_full(),
+        b_addr.as_str(): ComplianceKey.generate().export_full(),
+    }
+
+    # The other VASP runs in this process.
+    vasp_b = make_vasp(b_addr.as_str(), urls, keys, 0, '127.0.0.1', b_port)
+    await vasp_b.start_services_async()
+
+    sharded = ShardedVasp(
+        a_addr, '127.0.0.1', a_port,
+        partial(make_vasp, a_addr.as_str(), urls, keys),
+        shards=2, worker_port=free_port())
+    try:
+        await sharded.start_async()
+
+        # Requests with an invalid address are rejected by the front server.
+        async with aiohttp.ClientSession() as session:
+            url = f'{urls[a_addr.as_str()]}/v1/{a_addr.as_str()}/XYZ/command'
+            async with session.post(url, data='') as response:
+                assert response.status == 400
+
+        sender = PaymentActor(
+            LibraAddress.from_bytes("lbr", b'A'*16, b'a'*8).as_str(),
+            StatusObject(Status.needs_kyc_data), [])
+        receiver = PaymentActor(
+            LibraAddress.from_bytes("lbr", b'B'*16, b'b'*8).as_str(),
+            StatusObject(Status.none), [])
+        action = PaymentAction(10, 'TIK', 'charge', 984736)
+        ref_id = f'{a_addr.as_str()}_ref'
+        payment = PaymentObject(
+            sender, receiver, ref_id, None, 'Description', action)
+        kyc = await TestBusinessContext(a_addr).get_extended_kyc(payment)
+        payment.sender.add_kyc_data(kyc)
+
+        with pytest.raises(KeyError):
+            await sharded.get_payment_by_ref_async(ref_id)
+
+        # The other VASP responds through the front server.
+        assert await sharded.new_command_async(b_addr, PaymentCommand(payment))
+        outcome = await sharded.wait_for_payment_outcome_async(
+            ref_id, timeout=20.0)
+        assert outcome.sender.status.as_status() == Status.ready_for_settlement
+
+        latest = await sharded.get_payment_by_ref_async(ref_id)
+        assert latest.version == outcome.version
+        history = await sharded.get_payment_history_by_ref_async(ref_id)
+        assert history[0].version == latest.version
+        assert vasp_b.get_payment_by_ref(ref_id).version == latest.version
+    finally:
+        await sharded.close_async()
+        await vasp_b.close_async()
+    assert not sharded.processes
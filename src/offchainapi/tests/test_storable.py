@@ -2,12 +2,14 @@
 # SPDX-License-Identifier: Apache-2.0
 
 # Tests for the storage framework
-from ..storage import StorableDict, StorableValue, StorableFactory
+from ..storage import StorableDict, StorableValue, StorableFactory, \
+    PendingIndex
 from ..payment_logic import PaymentCommand
 from ..protocol_messages import make_success_response, CommandRequestObject, \
     make_command_error
 from ..errors import OffChainErrorCode
 from ..sample.sample_db import SampleDB
+from ..memory_db import MemoryDB, AsyncMemoryDB
 
 import pytest
 
@@ -145,3 +147,205 @@ def test_try_get(db):
     store['foo'] = 'bar'
     assert store['foo'] == 'bar'
     assert store.try_get('foo') == 'bar'
+
+def test_dict_keys_order(db):
+    D = StorableDict(db, 'ordered', int)
+    for i, k in enumerate(['z', 'a', 'm', 'b']):
+        D[k] = i
+
+    # Overwrites keep the original position, deletes remove it.
+    D['a'] = 10
+    del D['m']
+    D['c'] = 5
+    assert list(D.keys()) == ['z', 'a', 'b', 'c']
+
+
+def test_storable_factory_transaction(db):
+    store = StorableFactory(db)
+    eg1 = store.make_dict('eg1', int, None)
+    eg2 = store.make_dict('eg2', int, None)
+
+    with store.transaction():
+        eg1['x'] = 10
+        eg2['y'] = 20
+        del eg1['x']
+
+    assert 'x' not in eg1
+    assert eg2['y'] == 20
+
+
+def test_dict_cache(db, payment):
+    D = StorableDict(db, 'cached', payment.__class__, cache_size=2)
+    D['a'] = payment
+    assert D.cache_misses == 0
+
+    p1 = D['a']
+    p2 = D.try_get('a')
+    assert p1 == payment
+    assert p2 == p1 and p2 is not p1
+    assert D.cache_misses == 1
+    assert D.cache_hits == 1
+
+    # Changing a value read does not change the cache.
+    p1.add_recipient_signature('XXX')
+    p2.add_recipient_signature('YYY')
+    assert D['a'] == payment
+    assert D.cache_hits == 2
+
+    # A fresh read bypasses the cache.
+    p3 = D.try_get('a', fresh=True)
+    assert p3 == payment
+    assert D.cache_hits == 2
+
+    # Writes invalidate the cache.
+    D['a'] = payment.new_version('v1')
+    assert D['a'].version == 'v1'
+    assert D.cache_misses == 2
+    del D['a']
+    assert D.try_get('a') is None
+    assert 'a' not in D
+
+
+def test_dict_bulk(db, payment):
+    D = StorableDict(db, 'bulk', payment.__class__, cache_size=2)
+    D.put_many({'a': payment, 'b': payment.new_version('v1')})
+    D.put_many([('c', payment.new_version('v2'))])
+    assert D.contains_many(['a', 'x', 'c']) == [True, False, True]
+
+    D['a']
+    vals = D.get_many(['a', 'x', 'b'])
+    assert vals[0] == D['a'] and vals[1] is None
+    assert vals[2].version == 'v1'
+    assert D.cache_hits == 2
+
+    # Writes invalidate the cache.
+    D.put_many([('a', payment.new_version('v3'))])
+    D.delete_many(['b', 'x'])
+    assert [v and v.version for v in D.get_many(['a', 'b', 'c'])] == \
+        ['v3', None, 'v2']
+    assert list(D.keys()) == ['a', 'c']
+
+
+def test_dict_cache_lru(db):
+    D = StorableDict(db, 'cached', int, cache_size=2)
+    for k in 'xyz':
+        D[k] = 1
+
+    D['x'], D['y'], D['x'], D['z']
+    assert D.cache_misses == 3
+    assert list(D.cache) == ['x', 'z']
+
+    # y was evicted, x stayed as the most recent.
+    D['x'], D['y']
+    assert D.cache_hits == 2
+    assert D.cache_misses == 4
+
+
+def test_storable_factory_cache_cleared_on_rollback():
+    store = StorableFactory(MemoryDB())
+    eg = store.make_dict('eg', int, None, cache_size=10)
+
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            eg['x'] = 10
+            assert eg['x'] == 10
+            raise RuntimeError()
+
+    assert eg.try_get('x') is None
+
+
+def test_pending_index(db):
+    index = PendingIndex(db, 'pending')
+    assert index.is_empty()
+    for k in ['z', 'a', 'm', 'b']:
+        index.add(k)
+
+    # Updates keep the original position, removals remove it.
+    index.add('a', next_retry=10.0)
+    index.discard('m')
+    index.discard('m')
+    index.set_next_retry('b', 20.0)
+    index.add('c')
+    assert index.peek(2) == ['z', 'a']
+    assert index.peek(10) == ['z', 'a', 'b', 'c']
+    assert len(index) == 4 and 'm' not in index and 'b' in index
+    assert index.next_retry('a') == 10.0
+
+    # The index survives a restart.
+    index = PendingIndex(db, 'pending')
+    assert index.keys() == ['z', 'a', 'b', 'c']
+    assert index.next_retry('b') == 20.0
+    index.discard('z')
+    index.add('z')
+    assert PendingIndex(db, 'pending').keys() == ['a', 'b', 'c', 'z']
+
+
+def test_pending_index_reloaded_on_rollback():
+    store = StorableFactory(MemoryDB())
+    index = store.make_index('pending', None)
+    index.add('x')
+
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            index.discard('x')
+            index.add('y')
+            raise RuntimeError()
+
+    assert index.keys() == ['x']
+    index.add('z')
+    assert index.peek(2) == ['x', 'z']
+
+
+async def test_async_dict():
+    store = StorableFactory(AsyncMemoryDB())
+    eg = store.make_dict('eg', int, None, cache_size=10)
+    assert store.is_async
+    assert await eg.is_empty()
+    with pytest.raises(TypeError):
+        eg['x'] = 10
+
+    await eg.put('x', 10)
+    await eg.put_many({'y': 20, 'z': 30})
+    assert await eg.get('x') == 10
+    assert await eg.try_get('w') is None
+    with pytest.raises(KeyError):
+        await eg.get('w')
+    assert await eg.contains('y')
+    assert await eg.keys() == ['x', 'y', 'z']
+    assert await eg.get_many(['z', 'w']) == [30, None]
+    assert await eg.contains_many(['w', 'x']) == [False, True]
+
+    await eg.delete('x')
+    await eg.delete_many(['y'])
+    assert await eg.count() == 1
+
+    # Writes are rolled back with the transaction, and the cache cleared.
+    with pytest.raises(RuntimeError):
+        async with store.transaction_async():
+            await eg.put('z', 300)
+            assert await eg.get('z') == 300
+            raise RuntimeError()
+    assert await eg.get('z') == 30
+
+
+async def test_async_pending_index():
+    db = AsyncMemoryDB()
+    store = StorableFactory(db)
+    index = store.make_index('pending', None)
+    await index.reload()
+    await index.add('x')
+    await index.add('y', next_retry=10.0)
+
+    with pytest.raises(RuntimeError):
+        async with store.transaction_async():
+            await index.discard('x')
+            await index.add('z')
+            raise RuntimeError()
+    assert index.keys() == ['x', 'y']
+
+    # The index is loaded from storage when reloaded.
+    index = StorableFactory(db).make_index('pending', None)
+    assert index.is_empty()
+    await index.reload()
+    assert index.keys() == ['x', 'y']
+    assert index.next_retry('y') == 10.0
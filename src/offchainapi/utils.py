@@ -1,6 +1,7 @@
 # Copyright (c) The Libra Core Contributors
 # SPDX-License-Identifier: Apache-2.0
 
+from collections import namedtuple
 from enum import Enum
 from os import urandom
 import json
@@ -16,6 +17,67 @@ class StructureException(Exception):
     pass
 
 
+""" The compiled description of a field of a StructureChecker. """
+FieldSpec = namedtuple('FieldSpec',
+    ['type',        # The Python type of the field value
+     'required',    # Whether the field is REQUIRED
+     'write_once',  # Whether the field is WRITE_ONCE
+     'is_nested',   # Whether the type is a subclass of StructureChecker
+     ])
+
+
+class CopyOnWriteData(dict):
+    ''' The `data` dictionary of a StructureChecker that shares some of
+    its StructureChecker values with other objects (see
+    `StructureChecker.cow_copy`).
+
+    A shared value is copied, and the copy replaces it in this dictionary,
+    the first time it is accessed through `[]` or `get`, since the caller
+    may then change it. Changing the value of a field through `[]` simply
+    stops sharing the old value.
+
+    The `shared` map records for each shared field whether the changes
+    recorded on the shared value are also changes of this object (True),
+    or whether the value was borrowed unchanged from the base of a new
+    version (False).
+
+    Values reached through `items()` or `values()` are not copied and
+    must not be changed.
+    '''
+
+    __slots__ = ('shared',)
+
+    def __init__(self, data, shared):
+        dict.__init__(self, data)
+        self.shared = shared
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        shared = self.shared
+        if key in shared:
+            value = value.cow_copy(keep_record=shared.pop(key))
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        self.shared.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.shared.pop(key, None)
+        dict.__delitem__(self, key)
+
+    def __reduce__(self):
+        # The default pickling of dict subclasses sets the items before
+        # the `shared` slot, which `__setitem__` needs.
+        return (CopyOnWriteData, (dict(self), dict(self.shared)))
+
+
 class StructureChecker:
     ''' A class that allows us to keep track of objects in terms of
     diffs, namely operations that mutate their fields. Also does
@@ -25,9 +87,48 @@ class StructureChecker:
     The actual fields of this object are held in a dictionary called
     `data`. However direct access through __getattr__ and membership
     quesries through __contains__ are supported, for ease of use.
+
+    The `fields` of each subclass are compiled once, when the subclass is
+    defined, into a map from field name to FieldSpec (`field_schema`) and
+    the sets of `required_fields` and `known_fields`.
+
+    Instances keep their state in `__slots__` rather than an instance
+    dictionary; subclasses should define `__slots__` too (empty, unless
+    they hold other state) to remain compact. Setting an attribute named
+    after a field sets the value of the field in `data` directly, without
+    the checks of `update`.
     '''
 
+    __slots__ = ('data', 'update_record')
+
     fields = {}
+    field_schema = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # All slots of the class, copied by `cow_copy`.
+        slots = []
+        for klass in reversed(cls.__mro__):
+            names = klass.__dict__.get('__slots__', ())
+            if isinstance(names, str):
+                names = (names, )
+            slots += [name for name in names
+                      if name not in ('__dict__', '__weakref__')]
+        cls._slot_names = tuple(slots)
+
+        cls.field_schema = {
+            field: FieldSpec(
+                field_type, required, write_mode,
+                issubclass(field_type, StructureChecker))
+            for field, field_type, required, write_mode in cls.fields
+        }
+        cls.required_fields = frozenset(
+            field for field, spec in cls.field_schema.items() if spec.required)
+        cls.known_fields = frozenset(cls.field_schema)
+        cls._parse_map = {
+            field: (spec.type, spec.is_nested)
+            for field, spec in cls.field_schema.items()
+        }
 
     def __init__(self):
         ''' Initialize the class. Presumes a class level variable
@@ -44,6 +145,13 @@ class StructureChecker:
             return self.data[name]
         raise AttributeError(f"{self.__class__.__name__} does not have attribute {name}")
 
+    def __setattr__(self, name, value):
+        ''' Attributes named after fields are stored in the data. '''
+        if name in self.field_schema:
+            self.data[name] = value
+        else:
+            object.__setattr__(self, name, value)
+
     def __contains__(self, item):
         ''' Allows for `in` boolean queries between attribute names
             and the object itself. '''
@@ -53,50 +161,109 @@ class StructureChecker:
         ''' Record all diffs applied to the object '''
         self.update_record += [diff]
 
+    def borrowed_fields(self):
+        ''' Returns the fields holding values borrowed unchanged from the
+            base of a copy-on-write copy of this object, which are therefore
+            not changed in this object. '''
+        if not isinstance(self.data, CopyOnWriteData):
+            return ()
+        return [field for field, keep in self.data.shared.items() if not keep]
+
     def flatten(self):
         ''' Resets all diffs applied to this object '''
         self.update_record = []
-        for field in self.data:
-            if isinstance(self.data[field], StructureChecker):
+        borrowed = self.borrowed_fields()
+        for field, value in list(dict.items(self.data)):
+            if isinstance(value, StructureChecker) and field not in borrowed:
                 self.data[field].flatten()
 
+    def cow_copy(self, keep_record=False):
+        ''' Returns a copy of this object that shares its StructureChecker
+            values (sub-objects) with this object, rather than copying them.
+            A shared value is only copied when it is next accessed through
+            the `data` of either object, so that changing the copy never
+            changes this object or vice-versa, and making a copy only costs
+            one level of the object.
+
+            Values of other types are shared as they are, and must only be
+            changed by setting a new value through `update`.
+
+            If `keep_record` is False, the copy starts with no recorded diffs
+            (as after `flatten`), otherwise it keeps the recorded diffs of
+            this object.
+        '''
+        data = self.data
+        nested = [field for field, value in dict.items(data)
+                  if isinstance(value, StructureChecker)]
+
+        cls = self.__class__
+        clone = cls.__new__(cls)
+        for name in cls._slot_names:
+            try:
+                object.__setattr__(clone, name, object.__getattribute__(self, name))
+            except AttributeError:
+                pass
+        if hasattr(clone, '__dict__'):
+            clone.__dict__.update(self.__dict__)
+
+        if nested:
+            if isinstance(data, CopyOnWriteData):
+                shared = data.shared
+            else:
+                shared = {}
+                self.data = CopyOnWriteData(data, shared)
+
+            if keep_record:
+                clone_shared = {field: shared.get(field, True)
+                                for field in nested}
+            else:
+                clone_shared = dict.fromkeys(nested, False)
+
+            # Our own values are now shared with the copy.
+            for field in nested:
+                shared.setdefault(field, True)
+
+            clone.data = CopyOnWriteData(data, clone_shared)
+        else:
+            clone.data = dict(data)
+
+        clone.update_record = list(self.update_record) if keep_record else []
+        return clone
+
     @classmethod
     def parse_map(cls):
         ''' Returns a map of fields to their respective type, and whether
-            the type is a subclass of StructureChecker. '''
-        parse_map = {
-                field: (field_type, issubclass(field_type, StructureChecker))
-                for field, field_type, _, _ in cls.fields
-            }
-        return parse_map
+            the type is a subclass of StructureChecker. The map is shared
+            and must not be modified. '''
+        return cls._parse_map
 
     def get_full_diff_record(self, diff=None):
         ''' Returns a hierarchy of diffs applied to this object and children'''
-        parse = self.parse_map()
+        schema = self.field_schema
         if diff is None:
             diff = {}
-        for field in self.data:
-            xtype, parse_more = parse[field]
-            if parse_more:
-                diff[field] = self.data[field].get_full_diff_record()
+        for field, value in dict.items(self.data):
+            spec = schema[field]
+            if spec.is_nested:
+                diff[field] = value.get_full_diff_record()
             else:
-                if xtype in {str, int, list, dict}:
-                    diff[field] = self.data[field]
+                if spec.type in {str, int, list, dict}:
+                    diff[field] = value
                 else:
-                    raise RuntimeError(f'Cannot get diff for type "{xtype}".')
+                    raise RuntimeError(f'Cannot get diff for type "{spec.type}".')
         return diff
 
     def has_changed(self):
         ''' Returns True if the object has been modified.'''
-        parse = self.parse_map()
         for new_diff in self.update_record:
             for field in new_diff:
                 return True
 
-        for field in self.data:
-            _, parse_more = parse[field]
-            if parse_more:
-                if self.data[field].has_changed():
+        schema = self.field_schema
+        borrowed = self.borrowed_fields()
+        for field, value in dict.items(self.data):
+            if schema[field].is_nested and field not in borrowed:
+                if value.has_changed():
                     return True
 
         return False
@@ -107,8 +274,8 @@ class StructureChecker:
             return False
         if set(self.data) != set(other.data):
             return False
-        for field, value in self.data.items():
-            if not value == other.data[field]:
+        for field, value in dict.items(self.data):
+            if not value == dict.__getitem__(other.data, field):
                 return False
         return True
 
@@ -122,13 +289,14 @@ class StructureChecker:
         else:
             self = base_instance
 
-        parse = cls.parse_map()
+        schema = cls.field_schema
         new_diff = {}
         for field in diff:
-            if field in parse:
-                xtype, parse_further = parse[field]
+            if field in schema:
+                spec = schema[field]
+                xtype = spec.type
 
-                if parse_further:
+                if spec.is_nested:
 
                     if field in self.data:
                         # When the instance exists we update it in place, and
@@ -162,42 +330,45 @@ class StructureChecker:
     def update(self, diff):
         ''' Applies changes to the object and checks for validity rules. '''
         # Check all types and write mode before update
-        all_fields = set()
+        schema = self.field_schema
+        data = self.data
         updates = False
-        for field, field_type, required, write_mode in self.fields:
-            all_fields.add(field)
-            if field in diff:
-
-                # Check the type is right
-                value = diff[field]
-                if not isinstance(value, field_type):
-                    actual_type = type(value)
+        for field, value in diff.items():
+            spec = schema.get(field)
+            if spec is None:
+                continue
+
+            # Check the type is right
+            if not isinstance(value, spec.type):
+                actual_type = type(value)
+                raise StructureException(
+                    f'Wrong type: field {field}, expected {spec.type} '
+                    f'but got {actual_type}'
+                )
+
+            # Check you can write again
+            if spec.write_once and field in data:
+                if dict.__getitem__(data, field) != value:
                     raise StructureException(
-                        f'Wrong type: field {field}, expected {field_type} '
-                        f'but got {actual_type}'
+                        f'Wrong update: field {field} cannot be changed'
                     )
 
-                # Check you can write again
-                if field in self.data and write_mode == WRITE_ONCE:
-                    if self.data[field] != diff[field]:
-                        raise StructureException(
-                            f'Wrong update: field {field} cannot be changed'
-                        )
-
         # Check we are not updating unknown fields
-        for key in diff:
-            if key not in all_fields:
-                raise StructureException(f'Unknown: field {key}')
+        if not self.known_fields.issuperset(diff):
+            for key in diff:
+                if key not in schema:
+                    raise StructureException(f'Unknown: field {key}')
 
         # Finally update
-        for key in diff:
-            if key not in self.data or self.data[key] != diff[key]:
-                self.data[key] = diff[key]
+        for key, value in diff.items():
+            if key not in data or dict.__getitem__(data, key) != value:
+                data[key] = value
                 updates = True
 
-        for field, field_type, required, _ in self.fields:
-            if required and field not in self.data:
-                raise StructureException(f'Missing field: {field}')
+        if not self.required_fields.issubset(data):
+            for field, spec in schema.items():
+                if spec.required and field not in data:
+                    raise StructureException(f'Missing field: {field}')
 
         # Do custom checks on object
         self.custom_update_checks(diff)
@@ -224,6 +395,8 @@ class JSONSerializable:
     """ A Class that denotes a subclass is serializable, and
         provdes facilities to serialize and parse that class. """
 
+    __slots__ = ()
+
     # Define a type map for decoding
     # It maps ObjectType attributes to a JSONSerializable subclass
     json_type_map = {}
@@ -32,6 +32,10 @@ if __name__ == '__main__':
     parser.add_argument(
         '-x', '--xprofile', metavar='PROFILE', type=bool, default=False,
         help='Profile this run', dest='xprof')
+    parser.add_argument(
+        '-u', '--uvloop', action='store_true',
+        help='Run the VASPs on uvloop event loops, if installed',
+        dest='uvloop')
 
     args = parser.parse_args()
 
@@ -52,7 +56,8 @@ if __name__ == '__main__':
     asyncio.run(local_benchmark.main_perf(
         messages_num=args.paym,
         wait_num=args.wait,
-        verbose=args.verb))
+        verbose=args.verb,
+        use_uvloop=args.uvloop))
 
     if args.xprof:
 
@@ -6,6 +6,8 @@ A benchmark to measure command throughput between a client and a server.
 
 RUN SERVER: python3 -O src/scripts/run_remote_perf.py src/offchainapi/tests/assets/test_config_A.json
 RUN CLIENT: python3 -O src/scripts/run_remote_perf.py src/offchainapi/tests/assets/test_config_B.json 10
+
+Add --uvloop to run the VASPs on uvloop event loops, if installed.
 '''
 from threading import Thread
 from glob import glob
@@ -20,19 +22,25 @@ from offchainapi.tests import remote_benchmark
 if __name__ == '__main__':
     assets_dir = 'src/offchainapi/tests/assets/'
 
+    use_uvloop = '--uvloop' in sys.argv
+    if use_uvloop:
+        sys.argv.remove('--uvloop')
+
     # Run by tox on same machine
     if len(sys.argv) == 1:
         my_configs_path = join(assets_dir, 'test_config_A.json')
         other_configs_path = join(assets_dir, 'test_config_B.json')
         num_of_commands = 10
-        loop = asyncio.get_event_loop()
+        loop = None if use_uvloop else asyncio.get_event_loop()
         server = Thread(
             target=remote_benchmark.run_server,
-            args=(my_configs_path, other_configs_path, num_of_commands, loop)
+            args=(my_configs_path, other_configs_path, num_of_commands, loop),
+            kwargs={'use_uvloop': use_uvloop}
         )
         client = Thread(
             target=remote_benchmark.run_client,
-            args=(other_configs_path, my_configs_path, num_of_commands)
+            args=(other_configs_path, my_configs_path, num_of_commands),
+            kwargs={'use_uvloop': use_uvloop}
         )
         server.start()
         time.sleep(0.3)
@@ -50,7 +58,9 @@ if __name__ == '__main__':
 
         if num_of_commands > 0:
             remote_benchmark.run_client(
-                my_configs_path, other_configs_path, num_of_commands, port
+                my_configs_path, other_configs_path, num_of_commands, port,
+                use_uvloop=use_uvloop
             )
         else:
-            remote_benchmark.run_server(my_configs_path, other_configs_path)
+            remote_benchmark.run_server(
+                my_configs_path, other_configs_path, use_uvloop=use_uvloop)